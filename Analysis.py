@@ -1,5 +1,6 @@
 import networkx as nx
 import itertools
+from dataset import GraphArrays
 from dataset import ReadMovieGraph
 from networkx.algorithms import bipartite
 from random import shuffle
@@ -256,9 +257,9 @@ Returns a tuple of (proportionSameRace, proportionSameGender)
 ---------------------------------
 """
 def actorDirectorAssortativityHeuristic(graph, directorMovieGraph, graphDict):
-	numSameRaceEdges = 0
-	numSameGenderEdges = 0
-	totalEdges = 0
+	# Collect every movie's director and cast names, then resolve all the names
+	# with a single batched lookup
+	movieCasts = []
 	for mId in directorMovieGraph.nodes():
 		if directorMovieGraph.node[mId]['type'] == 'MOVIE':
 			diredctorId = directorMovieGraph.predecessors(mId)[0]
@@ -266,13 +267,25 @@ def actorDirectorAssortativityHeuristic(graph, directorMovieGraph, graphDict):
 			if directorRace is None:
 				continue
 			directorGender = directorMovieGraph.node[diredctorId]['gender']
-			actorIds = [graphDict[actorName] for actorName in directorMovieGraph.node[mId]['actorNames'] if actorName in graphDict]
-			actorRaces = [graph.node[aId]['race'] for aId in actorIds if aId in graph.node and "race" in graph.node[aId]]
-			actorGenders = [graph.node[aId]['gender'] for aId in actorIds if aId in graph.node and "gender" in graph.node[aId]]
-			numSameRaceEdges += sum(1 for ar in actorRaces 
-				if (ar == 'White' and directorRace == 'White') or (ar != 'White' and directorRace != 'White'))
-			numSameGenderEdges += sum(1 for ag in actorGenders if ag == directorGender)
-			totalEdges += len(actorIds)
+			movieCasts.append((directorRace, directorGender,
+				directorMovieGraph.node[mId]['actorNames']))
+	allNames = [name for _, _, actorNames in movieCasts for name in actorNames]
+	allActorIds, found = GraphArrays.NameIndex(graphDict).resolve(allNames)
+
+	numSameRaceEdges = 0
+	numSameGenderEdges = 0
+	totalEdges = 0
+	start = 0
+	for directorRace, directorGender, actorNames in movieCasts:
+		end = start + len(actorNames)
+		actorIds = allActorIds[start:end][found[start:end]]
+		start = end
+		actorRaces = [graph.node[aId]['race'] for aId in actorIds if aId in graph.node and "race" in graph.node[aId]]
+		actorGenders = [graph.node[aId]['gender'] for aId in actorIds if aId in graph.node and "gender" in graph.node[aId]]
+		numSameRaceEdges += sum(1 for ar in actorRaces 
+			if (ar == 'White' and directorRace == 'White') or (ar != 'White' and directorRace != 'White'))
+		numSameGenderEdges += sum(1 for ag in actorGenders if ag == directorGender)
+		totalEdges += len(actorIds)
 	return (numSameRaceEdges / float(totalEdges), numSameGenderEdges / float(totalEdges))
 
 """
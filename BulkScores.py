@@ -0,0 +1,122 @@
+from dataset import GraphArrays as ga
+import DiversityScore as ds
+import numpy as np
+
+"""
+CLASS: BulkScorer
+------------------
+Scores arrays of names (people, or title+year movie keys) in one vectorized
+call.  All diversity scores are computed once for every node when the scorer is
+created, so each lookup is just a binary search over the names plus a gather
+from the precomputed columns.
+------------------
+"""
+class BulkScorer(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph to score
+		graphDict - a map from names to node IDs in graph
+
+	Returns: a BulkScorer for the given graph.
+	-------------
+	"""
+	def __init__(self, graph, graphDict):
+		self.arrays = ga.GraphArrays.fromGraph(graph)
+		self.index = ga.NameIndex(graphDict)
+
+		arrays = self.arrays
+		movieRacial, movieGender = ds.movieScoreArrays(arrays)
+		directorRacial, directorGender = ds.directorScoreArrays(arrays,
+			movieRacial, movieGender)
+		actorRacial, actorGender = ds.actorScoreArrays(arrays)
+
+		# Scatter the per-movie scores into per-node columns
+		self.movieRacialScore = np.full(arrays.numNodes, np.nan)
+		self.movieGenderScore = np.full(arrays.numNodes, np.nan)
+		self.movieRacialScore[arrays.movieIds] = movieRacial
+		self.movieGenderScore[arrays.movieIds] = movieGender
+		self.directorRacialScore = directorRacial
+		self.directorGenderScore = directorGender
+		self.actorRacialScore = actorRacial
+		self.actorGenderScore = actorGender
+
+		self.castSize = np.zeros(arrays.numNodes, dtype=np.int64)
+		self.castSize[arrays.movieIds] = arrays.castSizes()
+
+	"""
+	METHOD: lookup
+	---------------
+	Parameters:
+		names - a sequence of person names and/or title+year movie keys
+
+	Returns: a dict of columns, each an array parallel to names:
+
+		name, nodeId (-1 if missing), found (bool), type, race, gender,
+		actorRacialScore, actorGenderScore (people only),
+		directorRacialScore, directorGenderScore (directors only),
+		movieRacialScore, movieGenderScore, castSize, releaseYear, budget,
+		gross, imdbScore (movies only)
+
+	Names that are not in the graph have found == False, None attributes and
+	NaN scores rather than raising a KeyError.
+	---------------
+	"""
+	def lookup(self, names):
+		arrays = self.arrays
+		nodeIds, found = self.index.resolve(names)
+
+		# graphDict may still name nodes that were removed from the graph
+		inRange = found & (nodeIds < arrays.numNodes)
+		found[inRange] = arrays.present[nodeIds[inRange]]
+		found &= inRange
+		safeIds = np.where(found, nodeIds, 0)
+		nodeIds = np.where(found, nodeIds, -1)
+
+		def gather(column, missing=np.nan):
+			if len(column) == 0:
+				return np.full(len(safeIds), missing)
+			values = column[safeIds].astype(np.result_type(column, type(missing)))
+			values[~found] = missing
+			return values
+
+		table = {}
+		table["name"] = np.array(list(names), dtype=object)
+		table["nodeId"] = nodeIds
+		table["found"] = found
+		table["type"] = ga.decode(gather(arrays.nodeType, ga.UnknownCode),
+			ga.NodeTypes)
+		table["race"] = ga.decode(gather(arrays.race, ga.UnknownCode), ga.Races)
+		table["gender"] = ga.decode(gather(arrays.gender, ga.UnknownCode),
+			ga.Genders)
+		for column in ["actorRacialScore", "actorGenderScore",
+			"directorRacialScore", "directorGenderScore", "movieRacialScore",
+			"movieGenderScore"]:
+			table[column] = gather(getattr(self, column))
+
+		isMovie = table["type"] == ga.NodeTypeMovie
+		table["castSize"] = np.where(isMovie, gather(self.castSize, 0), 0)
+		table["releaseYear"] = np.where(isMovie,
+			gather(arrays.releaseYear, 0), 0)
+		for column in ["budget", "gross", "imdbScore"]:
+			table[column] = np.where(isMovie, gather(getattr(arrays, column)),
+				np.nan)
+		return table
+
+"""
+FUNCTION: bulkScoreLookup
+--------------------------
+Parameters:
+	graph - the tripartite NetworkX DiGraph to score
+	graphDict - a map from names to node IDs in graph
+	names - a sequence of person names and/or title+year movie keys
+
+Returns: the table of scores and attributes for the given names.  See
+BulkScorer.lookup.  Batch jobs scoring several sets of names against the same
+graph should create a single BulkScorer and reuse it instead.
+--------------------------
+"""
+def bulkScoreLookup(graph, graphDict, names):
+	return BulkScorer(graph, graphDict).lookup(names)
@@ -0,0 +1,333 @@
+import argparse
+import CommunityDetection
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import multiprocessing
+import numpy as np
+from scipy import sparse
+import sys
+
+# Number of pivots whose shortest paths are found together, as the columns of
+# one dense (nodes x pivots) array per BFS level
+PivotBatchSize = 64
+
+# Percentiles reported for each demographic group
+Percentiles = [10, 25, 50, 75, 90]
+
+"""
+FUNCTION: pageRank
+-------------------
+Parameters:
+	matrix - a sparse symmetric weighted adjacency matrix (e.g. the co-star
+			projection from CommunityDetection.costarMatrix)
+	damping - the probability of following an edge rather than jumping
+	tolerance - iteration stops once the L1 change in the scores is below
+				tolerance times the number of nodes (as in networkx.pagerank)
+	maxIterations - the maximum number of power iterations
+
+Returns: an array of each node's weighted PageRank, summing to 1, found by
+power iteration with sparse matrix-vector products.  The scores of nodes with
+no edges are spread evenly over all nodes, as networkx.pagerank does.
+-------------------
+"""
+def pageRank(matrix, damping=0.85, tolerance=1e-10, maxIterations=100):
+	numNodes = matrix.shape[0]
+	if numNodes == 0:
+		return np.zeros(0)
+	strengths = np.asarray(matrix.sum(axis=1)).ravel()
+	dangling = strengths == 0
+	with np.errstate(divide="ignore"):
+		inverseStrengths = np.where(dangling, 0.0, 1.0 / strengths)
+	transitions = sparse.diags(inverseStrengths).dot(matrix).T.tocsr()
+
+	scores = np.full(numNodes, 1.0 / numNodes)
+	for iteration in range(maxIterations):
+		previous = scores
+		scores = damping * (transitions.dot(previous) +
+			previous[dangling].sum() / numNodes) + (1 - damping) / numNodes
+		if np.abs(scores - previous).sum() < numNodes * tolerance:
+			break
+	return scores
+
+"""
+FUNCTION: degreeCentrality
+---------------------------
+Parameters:
+	matrix - a sparse adjacency matrix with no self-loops
+
+Returns: an array of each node's number of neighbours divided by the number of
+other nodes (as networkx.degree_centrality), e.g. the share of all actors an
+actor has co-starred with.
+---------------------------
+"""
+def degreeCentrality(matrix):
+	numNodes = matrix.shape[0]
+	degrees = np.diff(sparse.csr_matrix(matrix).indptr).astype(np.float64)
+	return degrees / (numNodes - 1) if numNodes > 1 else degrees
+
+"""
+FUNCTION: pivotDependencies
+----------------------------
+Parameters:
+	adjacency - a sparse unweighted (0/1) symmetric CSR adjacency matrix
+	pivots - an array of source nodes
+
+Returns: a tuple (sums, squares) of the sums over the pivots of each node's
+Brandes dependency on the pivot (the share of shortest paths from the pivot
+that pass through the node, summed over targets), and of its square.
+
+The pivots are handled PivotBatchSize at a time: shortest path counts are
+found level by level with one sparse x dense product per BFS level for the
+whole batch, and dependencies are accumulated back up the levels the same way.
+----------------------------
+"""
+def pivotDependencies(adjacency, pivots):
+	numNodes = adjacency.shape[0]
+	sums = np.zeros(numNodes)
+	squares = np.zeros(numNodes)
+	for start in range(0, len(pivots), PivotBatchSize):
+		batch = np.asarray(pivots[start:start + PivotBatchSize])
+		columns = np.arange(len(batch))
+		distances = np.full((numNodes, len(batch)), -1, dtype=np.int32)
+		distances[batch, columns] = 0
+		pathCounts = np.zeros((numNodes, len(batch)))
+		pathCounts[batch, columns] = 1
+		frontier = pathCounts.copy()
+
+		# Forward: count shortest paths to each node, level by level
+		depth = 0
+		while True:
+			reached = adjacency.dot(frontier)
+			reached[distances >= 0] = 0
+			newNodes = reached > 0
+			if not newNodes.any():
+				break
+			depth += 1
+			distances[newNodes] = depth
+			pathCounts[newNodes] = reached[newNodes]
+			frontier = np.where(newNodes, reached, 0.0)
+
+		# Backward: each node's dependency is its share of the paths through
+		# each neighbour one level further, times 1 + that neighbour's
+		dependencies = np.zeros((numNodes, len(batch)))
+		for level in range(depth, 0, -1):
+			atLevel = distances == level
+			shares = np.zeros((numNodes, len(batch)))
+			shares[atLevel] = (1 + dependencies[atLevel]) / pathCounts[atLevel]
+			parents = distances == level - 1
+			dependencies[parents] += pathCounts[parents] * \
+				adjacency.dot(shares)[parents]
+		dependencies[batch, columns] = 0
+		sums += dependencies.sum(axis=1)
+		squares += (dependencies ** 2).sum(axis=1)
+	return sums, squares
+
+# The adjacency matrix shared with pool workers, set by initializeWorker
+workerAdjacency = None
+
+"""
+FUNCTION: initializeWorker
+---------------------------
+Parameters:
+	adjacency - the adjacency matrix to find dependencies on
+
+Returns: NA.  Stores the matrix for workerDependencies, so it is sent to each
+pool process once rather than with every batch of pivots.
+---------------------------
+"""
+def initializeWorker(adjacency):
+	global workerAdjacency
+	workerAdjacency = adjacency
+
+"""
+FUNCTION: workerDependencies
+-----------------------------
+Parameters:
+	pivots - an array of source nodes
+
+Returns: pivotDependencies of the pool process's adjacency matrix.
+-----------------------------
+"""
+def workerDependencies(pivots):
+	return pivotDependencies(workerAdjacency, pivots)
+
+"""
+FUNCTION: approximateBetweenness
+---------------------------------
+Parameters:
+	matrix - a sparse symmetric adjacency matrix (weights are ignored: paths
+			are counted in hops, as networkx.betweenness_centrality does
+			without a weight)
+	numSamples - the number of pivots to sample (defaults to every node, which
+				gives exact betweenness)
+	processes - the number of worker processes to spread the pivots over
+	seed - the random seed for choosing pivots
+
+Returns: a tuple (betweenness, standardErrors) of each node's estimated
+normalized betweenness centrality, on the scale of
+networkx.betweenness_centrality (normalized, with k = numSamples), and the
+standard error of each estimate.
+
+The pivots are a uniform sample without replacement, and each node's estimate
+is n times its mean dependency on them (Brandes and Pich), so it is unbiased.
+Its standard error is n times the sample standard deviation of those
+dependencies over sqrt(numSamples), with the finite population correction, so
+it is 0 when every node is a pivot.  estimate +/- 2 standard errors is an
+approximate 95% confidence interval.
+---------------------------------
+"""
+def approximateBetweenness(matrix, numSamples=None, processes=1, seed=0):
+	numNodes = matrix.shape[0]
+	if numNodes < 3:
+		return np.zeros(numNodes), np.zeros(numNodes)
+	numSamples = numNodes if numSamples is None else min(numSamples, numNodes)
+	adjacency = sparse.csr_matrix(matrix, dtype=np.float64, copy=True)
+	adjacency.data[:] = 1
+	pivots = np.random.RandomState(seed).choice(numNodes, numSamples,
+		replace=False)
+
+	batches = [pivots[start:start + PivotBatchSize]
+		for start in range(0, numSamples, PivotBatchSize)]
+	if processes > 1 and len(batches) > 1:
+		pool = multiprocessing.Pool(processes, initializeWorker, (adjacency,))
+		try:
+			results = pool.map(workerDependencies, batches)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		results = [pivotDependencies(adjacency, batch) for batch in batches]
+	sums = sum(result[0] for result in results)
+	squares = sum(result[1] for result in results)
+
+	scale = float(numNodes) / ((numNodes - 1) * (numNodes - 2))
+	means = sums / numSamples
+	if numSamples > 1:
+		variances = np.maximum(squares - numSamples * means ** 2, 0) / \
+			(numSamples - 1)
+	else:
+		variances = np.full(numNodes, np.nan)
+	correction = float(numNodes - numSamples) / (numNodes - 1)
+	return scale * means, scale * np.sqrt(variances / numSamples * correction)
+
+"""
+FUNCTION: actorCentrality
+--------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	numSamples, processes, seed - see approximateBetweenness
+
+Returns: a dict of columns, each an array with one entry per actor with a
+credit (sorted by node ID), of their centrality in the co-star projection
+(see CommunityDetection.costarMatrix):
+
+	nodeId, name, race, gender
+	pageRank - weighted by the number of movies shared
+	degreeCentrality - share of the other actors they have co-starred with
+	betweenness, betweennessStdErr - estimated betweenness and its standard
+		error (see approximateBetweenness)
+--------------------------
+"""
+def actorCentrality(arrays, numSamples=None, processes=1, seed=0):
+	actorIds, matrix = CommunityDetection.costarMatrix(arrays)
+	table = {}
+	table["nodeId"] = actorIds
+	table["name"] = arrays.names[actorIds]
+	table["race"] = ga.decode(arrays.race[actorIds], ga.Races)
+	table["gender"] = ga.decode(arrays.gender[actorIds], ga.Genders)
+	table["pageRank"] = pageRank(matrix)
+	table["degreeCentrality"] = degreeCentrality(matrix)
+	table["betweenness"], table["betweennessStdErr"] = \
+		approximateBetweenness(matrix, numSamples, processes, seed)
+	return table
+
+# Columns of the per-actor centrality table, in display order
+ActorColumns = ["nodeId", "name", "race", "gender", "pageRank",
+	"degreeCentrality", "betweenness", "betweennessStdErr"]
+
+# Centrality measures summarized by group
+Measures = ["pageRank", "degreeCentrality", "betweenness"]
+
+"""
+FUNCTION: groupSummary
+-----------------------
+Parameters:
+	table - a per-actor centrality table from actorCentrality
+	measures - the columns of table to summarize
+
+Returns: a dict of columns with one entry per (measure, attribute, group),
+for every group of actors by race and by gender (actors with an unknown
+value are left out) and for all actors (attribute and group "all"):
+
+	measure, attribute, group
+	numActors - the number of actors in the group
+	mean - the group's mean value of the measure
+	p10, p25, p50, p75, p90 - percentiles of the measure within the group
+	topDecileShare - share of the group's actors in the top 10% of all actors
+		by the measure (0.1 for a group placed like everyone else; lower
+		means the group sits further from the center of the network)
+-----------------------
+"""
+def groupSummary(table, measures=Measures):
+	columns = dict((column, []) for column in SummaryColumns)
+	for measure in measures:
+		values = table[measure]
+		topDecile = values > np.percentile(values, 90) if len(values) else \
+			np.zeros(0, dtype=bool)
+		groups = [("all", "all", np.ones(len(values), dtype=bool))]
+		for attribute, vocabulary in [("race", ga.Races), ("gender", ga.Genders)]:
+			groups.extend((attribute, group, table[attribute] == group)
+				for group in vocabulary)
+
+		for attribute, group, members in groups:
+			if not members.any():
+				continue
+			columns["measure"].append(measure)
+			columns["attribute"].append(attribute)
+			columns["group"].append(group)
+			columns["numActors"].append(members.sum())
+			columns["mean"].append(values[members].mean())
+			for percentile, value in zip(Percentiles,
+				np.percentile(values[members], Percentiles)):
+				columns["p%i" % percentile].append(value)
+			columns["topDecileShare"].append(topDecile[members].mean())
+	return dict((column, np.array(values)) for column, values in
+		columns.iteritems())
+
+# Columns of the group summary table, in display order
+SummaryColumns = ["measure", "attribute", "group", "numActors", "mean"] + \
+	["p%i" % percentile for percentile in Percentiles] + ["topDecileShare"]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Summarize actors' co-star " +
+		"network centrality by race and gender as CSV.")
+	parser.add_argument("--samples", type=int, default=1000,
+		help="number of pivots to estimate betweenness from (0 for exact)")
+	parser.add_argument("--processes", type=int,
+		default=multiprocessing.cpu_count(),
+		help="number of processes to estimate betweenness with")
+	parser.add_argument("--seed", type=int, default=0,
+		help="random seed for choosing pivots")
+	parser.add_argument("--perActor", action="store_true",
+		help="instead write every actor's centrality")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	table = actorCentrality(ga.GraphArrays.fromGraph(graph),
+		args.samples or None, args.processes, args.seed)
+	if args.perActor:
+		columns = ActorColumns
+	else:
+		table, columns = groupSummary(table), SummaryColumns
+
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(columns)
+		writer.writerows(zip(*[table[column].tolist() for column in columns]))
+	finally:
+		if args.output:
+			outFile.close()
@@ -0,0 +1,405 @@
+import argparse
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import numpy as np
+from scipy import sparse
+import sys
+
+# Number of actors whose rows of the co-star projection are computed at a time,
+# to bound the memory of the intermediate sparse products
+ProjectionBlockSize = 4096
+
+# A pass of local moves that improves modularity by less than this ends a level
+# (as in the community package)
+MinModularityGain = 1e-7
+
+"""
+FUNCTION: costarMatrix
+-----------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a tuple (actorIds, matrix).  actorIds are the node IDs of every actor
+with a credit, and matrix is the sparse symmetric (actors x actors) co-star
+projection in CSR form, weighted by the number of movies each pair of actors
+share (as Analysis.multiToWeightedGraph weights Analysis.actorActorGraph),
+with no self-loops.
+
+The projection is the product of the (actors x movies) incidence matrix with
+its transpose, computed ProjectionBlockSize actors at a time.
+-----------------------
+"""
+def costarMatrix(arrays):
+	actorIds, columns = np.unique(arrays.castIds, return_inverse=True)
+	actorMovies = sparse.csr_matrix((np.ones(len(columns)),
+		(columns, arrays.castMoviePositions())),
+		shape=(len(actorIds), len(arrays.movieIds)))
+	movieActors = actorMovies.T.tocsr()
+
+	blocks = []
+	for start in range(0, len(actorIds), ProjectionBlockSize):
+		block = actorMovies[start:start + ProjectionBlockSize].dot(
+			movieActors).tocoo()
+		notSelf = block.row + start != block.col
+		blocks.append(sparse.csr_matrix((block.data[notSelf],
+			(block.row[notSelf], block.col[notSelf])), shape=block.shape))
+	if not blocks:
+		return actorIds, sparse.csr_matrix((0, 0))
+	return actorIds, sparse.vstack(blocks).tocsr()
+
+"""
+FUNCTION: modularity
+---------------------
+Parameters:
+	matrix - a sparse symmetric weighted adjacency matrix, whose diagonal holds
+			twice the weight of each node's self-loop (as produced by
+			aggregating communities, see louvain)
+	labels - the community of each node.  Nodes with a negative label (e.g. an
+			unknown race) are each put in a community of their own.
+	resolution - the resolution parameter (1 is standard modularity)
+
+Returns: the modularity of the partition, as community.modularity would
+compute it on the equivalent weighted Graph.
+---------------------
+"""
+def modularity(matrix, labels, resolution=1.0):
+	labels = singletonUnknowns(labels)
+	degrees = np.asarray(matrix.sum(axis=1)).ravel()
+	totalWeight = degrees.sum()
+	if totalWeight == 0:
+		return float("nan")
+
+	matrix = matrix.tocsr()
+	rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+	internal = matrix.data[labels[rows] == labels[matrix.indices]].sum()
+	totals = np.bincount(labels, weights=degrees)
+	return internal / totalWeight - resolution * \
+		((totals / totalWeight) ** 2).sum()
+
+"""
+FUNCTION: singletonUnknowns
+----------------------------
+Parameters:
+	labels - an array of integer labels, negative for unknown
+
+Returns: a copy of labels where each negative label is replaced by a new label
+of its own, larger than every known label.
+----------------------------
+"""
+def singletonUnknowns(labels):
+	labels = np.array(labels, dtype=np.int64)
+	unknown = np.flatnonzero(labels < 0)
+	if len(unknown):
+		labels[unknown] = max(labels.max() + 1, 0) + np.arange(len(unknown))
+	return labels
+
+"""
+FUNCTION: moveNodes
+--------------------
+Parameters:
+	matrix - a sparse symmetric weighted adjacency matrix (see modularity)
+	resolution - the resolution parameter
+	random - a numpy RandomState, for the order nodes are visited in
+
+Returns: an array of each node's community after the local moving phase of
+Louvain: every node starts in its own community, and nodes are repeatedly
+moved to the neighbouring community that most increases modularity, until a
+pass over all nodes improves modularity by less than MinModularityGain.
+Communities are numbered from 0 with no gaps.
+--------------------
+"""
+def moveNodes(matrix, resolution, random):
+	numNodes = matrix.shape[0]
+	indptr = matrix.indptr.tolist()
+	indices = matrix.indices.tolist()
+	weights = matrix.data.tolist()
+	degrees = np.asarray(matrix.sum(axis=1)).ravel()
+	totalWeight = degrees.sum()
+	labels = np.arange(numNodes)
+	if totalWeight == 0:
+		return labels
+
+	degreeList = degrees.tolist()
+	scaledDegrees = (degrees * resolution / totalWeight).tolist()
+	communityList = labels.tolist()
+	totals = degrees.tolist()
+	order = random.permutation(numNodes).tolist()
+	currentModularity = modularity(matrix, labels, resolution)
+	while True:
+		numMoves = 0
+		for node in order:
+			community = communityList[node]
+			degree = degreeList[node]
+			neighbourWeights = {}
+			for i in range(indptr[node], indptr[node + 1]):
+				neighbour = indices[i]
+				if neighbour != node:
+					neighbourCommunity = communityList[neighbour]
+					neighbourWeights[neighbourCommunity] = \
+						neighbourWeights.get(neighbourCommunity, 0.0) + weights[i]
+
+			# Take the node out of its community, then put it back into the
+			# community with the best modularity gain (its own on ties)
+			scaledDegree = scaledDegrees[node]
+			totals[community] -= degree
+			bestCommunity = community
+			bestGain = neighbourWeights.get(community, 0.0) - \
+				totals[community] * scaledDegree
+			for neighbourCommunity, weight in neighbourWeights.iteritems():
+				gain = weight - totals[neighbourCommunity] * scaledDegree
+				if gain > bestGain:
+					bestCommunity, bestGain = neighbourCommunity, gain
+			totals[bestCommunity] += degree
+			if bestCommunity != community:
+				communityList[node] = bestCommunity
+				numMoves += 1
+
+		newModularity = modularity(matrix, np.array(communityList), resolution)
+		if numMoves == 0 or newModularity - currentModularity < MinModularityGain:
+			break
+		currentModularity = newModularity
+	return np.unique(communityList, return_inverse=True)[1]
+
+"""
+FUNCTION: louvain
+------------------
+Parameters:
+	matrix - a sparse symmetric weighted adjacency matrix (e.g. from
+			costarMatrix)
+	resolution - the resolution parameter (larger finds smaller communities)
+	seed - the random seed for the order nodes are visited in
+
+Returns: the Louvain dendrogram of the graph, as a list of label arrays (like
+community.generate_dendrogram).  The first array gives the community of each
+node, and each later array gives the community of each community of the level
+before it.
+
+Each level moves nodes between communities (see moveNodes), then aggregates
+every community into a single node: the next level's matrix is P^T A P for the
+(nodes x communities) indicator matrix P, so every level works on sparse
+arrays no larger than the one before, rather than on a NetworkX graph.
+------------------
+"""
+def louvain(matrix, resolution=1.0, seed=0):
+	random = np.random.RandomState(seed)
+	matrix = sparse.csr_matrix(matrix)
+	dendrogram = []
+	while True:
+		labels = moveNodes(matrix, resolution, random)
+		numCommunities = labels.max() + 1 if len(labels) else 0
+		if dendrogram and numCommunities == matrix.shape[0]:
+			break
+		dendrogram.append(labels)
+		if numCommunities == matrix.shape[0]:
+			break
+		indicator = sparse.csr_matrix((np.ones(len(labels)),
+			(np.arange(len(labels)), labels)),
+			shape=(len(labels), numCommunities))
+		matrix = indicator.T.dot(matrix).dot(indicator).tocsr()
+	return dendrogram
+
+"""
+FUNCTION: partitionAtLevel
+---------------------------
+Parameters:
+	dendrogram - a dendrogram from louvain
+	level - the level to cut the dendrogram at (defaults to the last, whose
+			communities have the highest modularity)
+
+Returns: the community of each of the original nodes at the given level.
+---------------------------
+"""
+def partitionAtLevel(dendrogram, level=None):
+	level = len(dendrogram) - 1 if level is None else level
+	labels = dendrogram[0]
+	for nextLabels in dendrogram[1:level + 1]:
+		labels = nextLabels[labels]
+	return labels
+
+"""
+FUNCTION: labelCommunities
+---------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	resolution, seed - see louvain
+
+Returns: a tuple (actorIds, matrix, labels) of the actors and co-star
+projection from costarMatrix, and each actor's community.  Communities are
+numbered from 0 in decreasing order of size.  The labels are also written to
+arrays.community, for grouping by community downstream.
+---------------------------
+"""
+def labelCommunities(arrays, resolution=1.0, seed=0):
+	actorIds, matrix = costarMatrix(arrays)
+	labels = partitionAtLevel(louvain(matrix, resolution, seed)) \
+		if len(actorIds) else np.zeros(0, dtype=np.int64)
+
+	# Renumber communities by decreasing size, breaking ties by first actor
+	sizes = np.bincount(labels)
+	firstActor = np.full(len(sizes), len(labels), dtype=np.int64)
+	np.minimum.at(firstActor, labels, np.arange(len(labels)))
+	bySize = np.lexsort((firstActor, -sizes))
+	rank = np.empty(len(sizes), dtype=np.int64)
+	rank[bySize] = np.arange(len(sizes))
+	labels = rank[labels]
+
+	arrays.community[:] = ga.UnknownCode
+	arrays.community[actorIds] = labels
+	return actorIds, matrix, labels
+
+"""
+FUNCTION: communityTable
+-------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	actorIds, labels - the actors and their communities (see labelCommunities)
+
+Returns: a dict of columns, each an array with one entry per community, in
+community order:
+
+	community - the community label
+	numActors - the number of actors in the community
+	nonWhiteShare, femaleShare - shares of its actors of known race (gender)
+		who are non-White (female)
+	race:<race>, gender:<gender> - for every race in GraphArrays.Races and
+		gender in GraphArrays.Genders, the share of its actors of known race
+		(gender) who are of that race (gender)
+
+Shares of communities with no actors of known race (gender) are NaN.
+-------------------------
+"""
+def communityTable(arrays, actorIds, labels):
+	numCommunities = labels.max() + 1 if len(labels) else 0
+	table = {}
+	table["community"] = np.arange(numCommunities)
+	table["numActors"] = np.bincount(labels, minlength=numCommunities)
+
+	for column, vocabulary, codes in [("race", ga.Races, arrays.race[actorIds]),
+		("gender", ga.Genders, arrays.gender[actorIds])]:
+		known = codes != ga.UnknownCode
+		counts = np.zeros((numCommunities, len(vocabulary)))
+		np.add.at(counts, (labels[known], codes[known]), 1)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			shares = counts / counts.sum(axis=1)[:, None]
+		for code, value in enumerate(vocabulary):
+			table["%s:%s" % (column, value)] = shares[:, code]
+	table["nonWhiteShare"] = 1 - table["race:White"]
+	table["femaleShare"] = table["gender:Female"]
+	return table
+
+# Columns of the community table, in display order
+TableColumns = ["community", "numActors", "nonWhiteShare", "femaleShare"] + \
+	["race:%s" % race for race in ga.Races] + \
+	["gender:%s" % gender for gender in ga.Genders]
+
+"""
+FUNCTION: normalizedMutualInformation
+--------------------------------------
+Parameters:
+	first, second - parallel arrays of two labellings of the same nodes.
+				Nodes with a negative label in either are left out.
+
+Returns: the normalized mutual information 2 I(first; second) / (H(first) +
+H(second)) of the labellings, from 0 (independent) to 1 (identical up to
+renaming), or NaN if both have a single label.
+--------------------------------------
+"""
+def normalizedMutualInformation(first, second):
+	known = (first >= 0) & (second >= 0)
+	firstCodes = np.unique(first[known], return_inverse=True)[1]
+	secondCodes = np.unique(second[known], return_inverse=True)[1]
+	if len(firstCodes) == 0:
+		return float("nan")
+
+	def entropy(codes):
+		probabilities = np.bincount(codes) / float(len(codes))
+		probabilities = probabilities[probabilities > 0]
+		return -(probabilities * np.log(probabilities)).sum()
+
+	joint = firstCodes * (secondCodes.max() + 1) + secondCodes
+	firstEntropy, secondEntropy = entropy(firstCodes), entropy(secondCodes)
+	if firstEntropy + secondEntropy == 0:
+		return float("nan")
+	mutualInformation = firstEntropy + secondEntropy - entropy(joint)
+	return 2 * mutualInformation / (firstEntropy + secondEntropy)
+
+"""
+FUNCTION: partitionComparison
+------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	actorIds, matrix, labels - the result of labelCommunities
+
+Returns: a dict of columns comparing the detected communities with the
+attribute partitions of Analysis.actorModularity, with one entry per
+partition ("communities", "race", "blackWhite" - White vs. non-White - and
+"gender"):
+
+	partition - the partition's name
+	numGroups - its number of groups (excluding actors with unknown values)
+	modularity - its modularity on the co-star projection, with each actor of
+		unknown race (gender) in a group of their own
+	nmiWithCommunities - its normalized mutual information with the detected
+		communities, over the actors with known values
+------------------------------
+"""
+def partitionComparison(arrays, actorIds, matrix, labels):
+	race = arrays.race[actorIds].astype(np.int64)
+	blackWhite = np.where(race == ga.UnknownCode, ga.UnknownCode,
+		(race != ga.WhiteCode).astype(np.int64))
+	partitions = [("communities", labels), ("race", race),
+		("blackWhite", blackWhite),
+		("gender", arrays.gender[actorIds].astype(np.int64))]
+
+	table = dict((column, []) for column in ComparisonColumns)
+	for name, partition in partitions:
+		table["partition"].append(name)
+		table["numGroups"].append(len(np.unique(partition[partition >= 0])))
+		table["modularity"].append(modularity(matrix, partition))
+		table["nmiWithCommunities"].append(
+			normalizedMutualInformation(labels, partition))
+	return dict((column, np.array(values)) for column, values in
+		table.iteritems())
+
+# Columns of the partition comparison table, in display order
+ComparisonColumns = ["partition", "numGroups", "modularity",
+	"nmiWithCommunities"]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Detect co-star communities " +
+		"with Louvain and write their racial and gender composition as CSV.")
+	parser.add_argument("--resolution", type=float, default=1.0,
+		help="Louvain resolution (larger finds smaller communities)")
+	parser.add_argument("--seed", type=int, default=0,
+		help="random seed for the order actors are visited in")
+	parser.add_argument("--minSize", type=int, default=1,
+		help="only list communities with at least this many actors")
+	parser.add_argument("--compare", action="store_true",
+		help="instead compare the communities with the race and gender " +
+		"partitions")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	arrays = ga.GraphArrays.fromGraph(graph)
+	actorIds, matrix, labels = labelCommunities(arrays, args.resolution,
+		args.seed)
+	if args.compare:
+		table, columns = partitionComparison(arrays, actorIds, matrix, labels), \
+			ComparisonColumns
+	else:
+		table, columns = communityTable(arrays, actorIds, labels), TableColumns
+		keep = table["numActors"] >= args.minSize
+		table = dict((column, values[keep]) for column, values in
+			table.iteritems())
+
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(columns)
+		writer.writerows(zip(*[table[column].tolist() for column in columns]))
+	finally:
+		if args.output:
+			outFile.close()
@@ -0,0 +1,281 @@
+import argparse
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import numpy as np
+import sys
+
+# Axes of the contingency tensors, in order
+Axes = ["nodeType", "race", "gender", "decade"]
+
+# Label lists for common selections
+ActorTypes = [ga.NodeTypes[ga.ActorCode], ga.NodeTypes[ga.ActorDirectorCode]]
+DirectorTypes = [ga.NodeTypes[ga.DirectorCode],
+	ga.NodeTypes[ga.ActorDirectorCode]]
+NonWhiteRaces = [race for race in ga.Races if race != 'White']
+
+"""
+CLASS: ContingencyTensor
+-------------------------
+Counts of the graph's nodes by node type x race x gender x decade, with
+matching tensors of the sums of their in-degrees and out-degrees, so that any
+marginal or intersection (e.g. the number of Black female actors, or their
+average filmography size) is a slice and a sum.
+
+	counts - the number of nodes in each cell
+	inDegrees, outDegrees - the sums of the in-degrees (out-degrees) of the
+		nodes in each cell.  Edges go director -> movie -> actor, so an actor's
+		in-degree is their number of movies, a director's out-degree the number
+		of movies they directed, and a movie's out-degree its cast size.
+	labels - a dict from axis name to the labels along it.  The last label of
+		the race, gender and decade axes is None, for unknown values.
+
+People's race and gender are their own, and their decade is the decade of
+their first movie (as an actor or director).  A movie's race and gender are
+its director's, so e.g. the share of movies directed by non-White women is
+a slice of the movie counts, and its decade is the decade of its release.
+-------------------------
+"""
+class ContingencyTensor(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the movie graph
+
+	Returns: the ContingencyTensor of the snapshot, built with one bincount per
+	tensor over the cell index of every node.
+	-------------
+	"""
+	def __init__(self, arrays):
+		numNodes = arrays.numNodes
+		nodeIds = np.flatnonzero(arrays.present)
+		hasDirector = arrays.directorIds >= 0
+
+		inDegrees = np.bincount(arrays.castIds, minlength=numNodes)
+		inDegrees[arrays.movieIds] += hasDirector
+		outDegrees = np.bincount(arrays.directorIds[hasDirector],
+			minlength=numNodes)
+		outDegrees[arrays.movieIds] += arrays.castSizes()
+
+		# Movies take their director's race and gender
+		race = arrays.race.copy()
+		gender = arrays.gender.copy()
+		directorIds = arrays.directorIds[hasDirector]
+		race[arrays.movieIds[hasDirector]] = arrays.race[directorIds]
+		gender[arrays.movieIds[hasDirector]] = arrays.gender[directorIds]
+
+		# People take the year of their first movie with a known year
+		years = np.where(arrays.releaseYear > 0, arrays.releaseYear,
+			np.iinfo(np.int32).max).astype(np.int64)
+		movieYears = years[arrays.movieIds]
+		years[~arrays.present | (arrays.nodeType != ga.MovieCode)] = \
+			np.iinfo(np.int32).max
+		np.minimum.at(years, arrays.castIds,
+			np.repeat(movieYears, arrays.castSizes()))
+		np.minimum.at(years, directorIds, movieYears[hasDirector])
+		known = years < np.iinfo(np.int32).max
+		decades = np.where(known, years // 10 * 10, 0)
+		decadeLabels = np.unique(decades[nodeIds][known[nodeIds]])
+
+		self.labels = {
+			"nodeType": list(ga.NodeTypes),
+			"race": list(ga.Races) + [None],
+			"gender": list(ga.Genders) + [None],
+			"decade": decadeLabels.tolist() + [None],
+		}
+		codes = [arrays.nodeType[nodeIds].astype(np.int64),
+			unknownLast(race[nodeIds], len(ga.Races)),
+			unknownLast(gender[nodeIds], len(ga.Genders)),
+			np.where(known[nodeIds], np.searchsorted(decadeLabels,
+				decades[nodeIds]), len(decadeLabels))]
+		shape = tuple(len(self.labels[axis]) for axis in Axes)
+		cells = np.ravel_multi_index(codes, shape)
+		size = int(np.prod(shape))
+		self.counts = np.bincount(cells, minlength=size).reshape(shape)
+		self.inDegrees = np.bincount(cells, weights=inDegrees[nodeIds],
+			minlength=size).astype(np.int64).reshape(shape)
+		self.outDegrees = np.bincount(cells, weights=outDegrees[nodeIds],
+			minlength=size).astype(np.int64).reshape(shape)
+
+	"""
+	CLASS METHOD: fromGraph
+	------------------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph
+
+	Returns: the ContingencyTensor of a new snapshot of the graph.
+	------------------------
+	"""
+	@classmethod
+	def fromGraph(cls, graph):
+		return cls(ga.GraphArrays.fromGraph(graph))
+
+	"""
+	METHOD: index
+	--------------
+	Parameters:
+		criteria - keyword arguments from axis name to a label, or a list of
+					labels, to select along that axis.  Axes not given are
+					selected in full.
+
+	Returns: a tuple of index arrays, one per axis, selecting the matching
+	cells with numpy's np.ix_.
+	--------------
+	"""
+	def index(self, **criteria):
+		for axis in criteria:
+			if axis not in self.labels:
+				raise ValueError("Unknown axis %s (axes: %s)" % (axis,
+					", ".join(Axes)))
+		selection = []
+		for axis in Axes:
+			labels = self.labels[axis]
+			if axis not in criteria:
+				selection.append(np.arange(len(labels)))
+				continue
+			wanted = criteria[axis]
+			if not hasattr(wanted, "__iter__"):
+				wanted = [wanted]
+			selection.append(np.array([i for i, label in enumerate(labels)
+				if label in wanted], dtype=np.int64))
+		return np.ix_(*selection)
+
+	"""
+	METHOD: count
+	--------------
+	Parameters:
+		criteria - see index
+
+	Returns: the number of nodes in the selected cells.
+	--------------
+	"""
+	def count(self, **criteria):
+		return int(self.counts[self.index(**criteria)].sum())
+
+	"""
+	METHOD: degreeSum
+	------------------
+	Parameters:
+		direction - "in" or "out"
+		criteria - see index
+
+	Returns: the sum of the in-degrees (out-degrees) of the nodes in the
+	selected cells.
+	------------------
+	"""
+	def degreeSum(self, direction, **criteria):
+		return int(self.degrees(direction)[self.index(**criteria)].sum())
+
+	"""
+	METHOD: meanDegree
+	-------------------
+	Parameters:
+		direction - "in" or "out"
+		criteria - see index
+
+	Returns: the mean in-degree (out-degree) of the nodes in the selected cells,
+	e.g. meanDegree("in", nodeType=ActorTypes, race="Black", gender="Female")
+	is Black women's average number of movies.  NaN if there are no nodes.
+	-------------------
+	"""
+	def meanDegree(self, direction, **criteria):
+		count = self.count(**criteria)
+		if count == 0:
+			return float("nan")
+		return float(self.degreeSum(direction, **criteria)) / count
+
+	"""
+	METHOD: share
+	--------------
+	Parameters:
+		subset - a dict of criteria (see index) selecting part of the nodes
+		criteria - see index
+
+	Returns: the share of the nodes selected by criteria that are also
+	selected by subset, e.g. share({"race": NonWhiteRaces, "gender":
+	"Female"}, nodeType="MOVIE") is the share of movies directed by
+	non-White women.  NaN if criteria select no nodes.
+	--------------
+	"""
+	def share(self, subset, **criteria):
+		total = self.count(**criteria)
+		if total == 0:
+			return float("nan")
+		both = dict(criteria)
+		both.update(subset)
+		return float(self.count(**both)) / total
+
+	"""
+	METHOD: degrees
+	----------------
+	Parameters:
+		direction - "in" or "out"
+
+	Returns: the in-degree (out-degree) sum tensor.
+	----------------
+	"""
+	def degrees(self, direction):
+		if direction not in ["in", "out"]:
+			raise ValueError("Unknown degree direction %s (in or out)" %
+				direction)
+		return self.inDegrees if direction == "in" else self.outDegrees
+
+	"""
+	METHOD: marginal
+	-----------------
+	Parameters:
+		axes - the names of the axes to keep
+		criteria - see index, to select cells before summing
+
+	Returns: a tuple (counts, inDegrees, outDegrees) of the tensors summed
+	over every axis not in axes, with the kept axes in Axes order.
+	-----------------
+	"""
+	def marginal(self, axes, **criteria):
+		summed = tuple(i for i, axis in enumerate(Axes) if axis not in axes)
+		selection = self.index(**criteria)
+		return tuple(tensor[selection].sum(axis=summed) for tensor in
+			[self.counts, self.inDegrees, self.outDegrees])
+
+"""
+FUNCTION: unknownLast
+----------------------
+Parameters:
+	codes - an array of codes, UnknownCode for unknown values
+	numKnown - the number of known codes
+
+Returns: the codes as int64, with UnknownCode replaced by numKnown.
+----------------------
+"""
+def unknownLast(codes, numKnown):
+	codes = codes.astype(np.int64)
+	codes[codes == ga.UnknownCode] = numKnown
+	return codes
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Write node counts and " +
+		"degree sums by node type, race, gender and decade as CSV.")
+	parser.add_argument("--axes", nargs="+", choices=Axes, default=Axes,
+		help="axes to break the counts down by (the rest are summed over)")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	tensor = ContingencyTensor.fromGraph(graph)
+	axes = [axis for axis in Axes if axis in args.axes]
+	counts, inDegrees, outDegrees = tensor.marginal(axes)
+
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(axes + ["count", "inDegreeSum", "outDegreeSum"])
+		for cell in zip(*np.nonzero(counts)):
+			writer.writerow([tensor.labels[axis][i] for axis, i in
+				zip(axes, cell)] + [counts[cell], inDegrees[cell],
+				outDegrees[cell]])
+	finally:
+		if args.output:
+			outFile.close()
@@ -0,0 +1,358 @@
+import argparse
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import numpy as np
+from scipy import sparse
+import sys
+
+# Modulus of the MinHash hash functions h(x) = (a * x + b) mod MinHashPrime.
+# Items and coefficients are below it, so a * x + b fits in an int64.
+MinHashPrime = (1 << 31) - 1
+
+# Number of hash functions to compute signatures for at a time, to bound the
+# size of the (number of set items x hashes) array of hash values
+HashChunkSize = 16
+
+"""
+CLASS: MinHashIndex
+--------------------
+An approximate Jaccard similarity index over a collection of sets, such as
+each actor's set of movies (forActors) or each movie's cast (forMovies).
+
+Every set gets a MinHash signature of numHashes minimums of random hash
+functions over its items; two sets' signatures agree in each position with
+probability equal to their Jaccard similarity.  The signatures are split into
+bands of bandSize rows, and locality-sensitive hashing buckets the sets by each
+band, so that only sets sharing a bucket in some band are ever compared.
+
+Queries can use fewer than all of the bands: fewer bands means fewer
+candidates to compare (faster) but more similar sets missed (lower recall).
+With b bands of r rows, a set with similarity s to the query is a candidate
+with probability 1 - (1 - s^r)^b.  Candidates are ranked by their exact
+Jaccard similarity, computed from the sets themselves.
+
+	keys - the node ID of each set (e.g. each actor)
+	offsets, items - CSR sets, where set i's items are
+		items[offsets[i]:offsets[i + 1]]
+--------------------
+"""
+class MinHashIndex(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		keys - the node ID of each set
+		offsets, items - the sets in CSR form, with items coded as integers
+						from 0 up to (but not including) numItems
+		numItems - the number of distinct item codes
+		numHashes - the number of hash functions in each signature
+		bandSize - the number of signature rows in each LSH band.  Larger bands
+					make candidates rarer (faster, lower recall).
+		seed - the random seed for the hash functions
+
+	Returns: a MinHashIndex over the given sets.
+	-------------
+	"""
+	def __init__(self, keys, offsets, items, numItems, numHashes=128,
+		bandSize=4, seed=0):
+		self.keys = np.asarray(keys, dtype=np.int64)
+		self.offsets = np.asarray(offsets, dtype=np.int64)
+		self.items = np.asarray(items, dtype=np.int64)
+		self.numItems = numItems
+		self.bandSize = bandSize
+		self.numBands = numHashes // bandSize
+		self.keyPosition = dict((key, i) for i, key in
+			enumerate(self.keys.tolist()))
+		self.setSizes = np.diff(self.offsets)
+
+		# Sets as a sparse (sets x items) matrix, for exact Jaccard similarity
+		self.setMatrix = sparse.csr_matrix((np.ones(len(self.items)),
+			self.items, self.offsets), shape=(len(self.keys), numItems))
+
+		random = np.random.RandomState(seed)
+		self.hashA = random.randint(1, MinHashPrime, self.numBands * bandSize)
+		self.hashB = random.randint(0, MinHashPrime, self.numBands * bandSize)
+		self.bandMultipliers = random.randint(1, 1 << 62, bandSize,
+			dtype=np.int64).astype(np.uint64) | np.uint64(1)
+		self.signatures = self.signaturesFor(self.offsets, self.items)
+
+		# For each band, the sets sorted by their bucket in that band.  Empty
+		# sets are left out of every bucket.
+		self.bandKeys = self.bandKeysFor(self.signatures)
+		nonEmpty = np.flatnonzero(self.setSizes > 0)
+		self.bandOrder = []
+		self.bandSortedKeys = []
+		for band in range(self.numBands):
+			order = nonEmpty[np.argsort(self.bandKeys[nonEmpty, band],
+				kind="mergesort")]
+			self.bandOrder.append(order)
+			self.bandSortedKeys.append(self.bandKeys[order, band])
+
+	"""
+	CLASS METHOD: forActors
+	------------------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the movie graph
+		numHashes, bandSize, seed - see init
+
+	Returns: a MinHashIndex over every actor's set of movies, from the movie ->
+	actor edges, for finding actors who share productions.
+	------------------------
+	"""
+	@classmethod
+	def forActors(cls, arrays, **kwargs):
+		order = np.argsort(arrays.castIds, kind="mergesort")
+		actorIds, counts = np.unique(arrays.castIds[order], return_counts=True)
+		offsets = np.zeros(len(actorIds) + 1, dtype=np.int64)
+		np.cumsum(counts, out=offsets[1:])
+		return cls(actorIds, offsets, arrays.castMoviePositions()[order],
+			len(arrays.movieIds), **kwargs)
+
+	"""
+	CLASS METHOD: forMovies
+	------------------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the movie graph
+		numHashes, bandSize, seed - see init
+
+	Returns: a MinHashIndex over every movie's cast, for finding movies with
+	near-duplicate cast lists.
+	------------------------
+	"""
+	@classmethod
+	def forMovies(cls, arrays, **kwargs):
+		return cls(arrays.movieIds, arrays.castOffsets, arrays.castIds,
+			arrays.numNodes, **kwargs)
+
+	"""
+	METHOD: signaturesFor
+	----------------------
+	Parameters:
+		offsets, items - sets in CSR form
+
+	Returns: a (number of sets x numHashes) int64 array of the sets' MinHash
+	signatures.  Empty sets get MinHashPrime in every position.
+	----------------------
+	"""
+	def signaturesFor(self, offsets, items):
+		numSets = len(offsets) - 1
+		signatures = np.full((numSets, len(self.hashA)), MinHashPrime,
+			dtype=np.int64)
+		nonEmpty = np.flatnonzero(np.diff(offsets) > 0)
+		if len(nonEmpty) == 0:
+			return signatures
+		for start in range(0, len(self.hashA), HashChunkSize):
+			end = start + HashChunkSize
+			hashes = (items[:, None] * self.hashA[start:end] +
+				self.hashB[start:end]) % MinHashPrime
+			signatures[nonEmpty, start:end] = np.minimum.reduceat(hashes,
+				offsets[nonEmpty], axis=0)
+		return signatures
+
+	"""
+	METHOD: bandKeysFor
+	--------------------
+	Parameters:
+		signatures - an array of MinHash signatures, one per row
+
+	Returns: a (number of signatures x numBands) uint64 array of the bucket of
+	each signature in each band: a hash of the band's rows.
+	--------------------
+	"""
+	def bandKeysFor(self, signatures):
+		bands = signatures.reshape(len(signatures), self.numBands,
+			self.bandSize).astype(np.uint64)
+		return (bands * self.bandMultipliers).sum(axis=2, dtype=np.uint64)
+
+	"""
+	METHOD: candidatePairs
+	-----------------------
+	Parameters:
+		queryKeys - a (number of queries x numBands) array of band keys
+		bands - the number of bands to look in (defaults to all of them)
+
+	Returns: a tuple (queries, candidates) of parallel arrays of unique (query
+	index, set index) pairs of each query and every set sharing a bucket with
+	it in any of the first bands bands.
+	-----------------------
+	"""
+	def candidatePairs(self, queryKeys, bands=None):
+		bands = self.numBands if bands is None else min(bands, self.numBands)
+		allQueries = []
+		allCandidates = []
+		for band in range(bands):
+			sortedKeys = self.bandSortedKeys[band]
+			starts = np.searchsorted(sortedKeys, queryKeys[:, band], side="left")
+			ends = np.searchsorted(sortedKeys, queryKeys[:, band], side="right")
+			counts = ends - starts
+			total = int(counts.sum())
+			if total == 0:
+				continue
+			queries = np.repeat(np.arange(len(queryKeys)), counts)
+			withinRun = np.arange(total) - np.repeat(np.cumsum(counts) - counts,
+				counts)
+			allQueries.append(queries)
+			allCandidates.append(self.bandOrder[band][starts[queries] +
+				withinRun])
+
+		if not allQueries:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+		pairs = np.unique(np.concatenate(allQueries) * len(self.keys) +
+			np.concatenate(allCandidates))
+		return pairs // len(self.keys), pairs % len(self.keys)
+
+	"""
+	METHOD: jaccard
+	----------------
+	Parameters:
+		first, second - parallel arrays of set indices
+
+	Returns: the exact Jaccard similarity of each pair of sets.
+	----------------
+	"""
+	def jaccard(self, first, second):
+		if len(first) == 0:
+			return np.zeros(0)
+		intersections = np.asarray(self.setMatrix[first].multiply(
+			self.setMatrix[second]).sum(axis=1)).ravel()
+		unions = self.setSizes[first] + self.setSizes[second] - intersections
+		with np.errstate(divide="ignore", invalid="ignore"):
+			return np.where(unions > 0, intersections / unions, 0.0)
+
+	"""
+	METHOD: queryMany
+	------------------
+	Parameters:
+		keys - the node IDs of the sets to query (e.g. actor node IDs)
+		k - the number of most similar sets to return for each query
+		bands - the number of bands to look for candidates in (defaults to
+				all of them).  Fewer bands is faster, with lower recall.
+		minSimilarity - the smallest Jaccard similarity to return
+
+	Returns: a list parallel to keys of lists of up to k (similarity, node ID)
+	tuples, most similar first, excluding the queried set itself.  Keys that
+	are not in the index get an empty list.
+
+	Candidates for every query are found with one pass over the bands, and
+	ranked with one batch of exact Jaccard similarities.
+	------------------
+	"""
+	def queryMany(self, keys, k=10, bands=None, minSimilarity=0.0):
+		positions = np.array([self.keyPosition.get(key, -1) for key in keys],
+			dtype=np.int64)
+		known = np.flatnonzero(positions >= 0)
+		queries, candidates = self.candidatePairs(
+			self.bandKeys[positions[known]], bands)
+		queries = known[queries]
+		notSelf = positions[queries] != candidates
+		queries = queries[notSelf]
+		candidates = candidates[notSelf]
+
+		similarities = self.jaccard(positions[queries], candidates)
+		keep = similarities >= minSimilarity
+		queries, candidates, similarities = queries[keep], candidates[keep], \
+			similarities[keep]
+
+		# Rank each query's candidates, most similar (then lowest key) first
+		order = np.lexsort((self.keys[candidates], -similarities, queries))
+		queries, candidates, similarities = queries[order], candidates[order], \
+			similarities[order]
+		counts = np.bincount(queries, minlength=len(keys))
+		ranks = np.arange(len(queries)) - np.repeat(np.cumsum(counts) - counts,
+			counts)
+
+		results = [[] for key in keys]
+		for query, candidate, similarity in zip(queries[ranks < k].tolist(),
+			self.keys[candidates[ranks < k]].tolist(),
+			similarities[ranks < k].tolist()):
+			results[query].append((similarity, candidate))
+		return results
+
+	"""
+	METHOD: query
+	--------------
+	Parameters:
+		key - the node ID of the set to query
+		k, bands, minSimilarity - see queryMany
+
+	Returns: a list of up to k (similarity, node ID) tuples of the sets most
+	similar to the given set, most similar first.
+	--------------
+	"""
+	def query(self, key, k=10, bands=None, minSimilarity=0.0):
+		return self.queryMany([key], k, bands, minSimilarity)[0]
+
+	"""
+	METHOD: similarPairs
+	---------------------
+	Parameters:
+		threshold - the smallest Jaccard similarity of the pairs to return
+		bands - the number of bands to look for candidates in (see queryMany)
+
+	Returns: a list of (similarity, first node ID, second node ID) tuples for
+	every pair of sets in the index sharing a bucket with a Jaccard similarity
+	of at least threshold (e.g. movies with near-duplicate casts), most
+	similar first.  Each pair is listed once, with the smaller node ID first.
+	---------------------
+	"""
+	def similarPairs(self, threshold=0.8, bands=None):
+		nonEmpty = np.flatnonzero(self.setSizes > 0)
+		queries, candidates = self.candidatePairs(self.bandKeys[nonEmpty], bands)
+		first = nonEmpty[queries]
+		keep = first < candidates
+		first, second = first[keep], candidates[keep]
+		similarities = self.jaccard(first, second)
+		keep = similarities >= threshold
+		first, second, similarities = first[keep], second[keep], \
+			similarities[keep]
+
+		order = np.lexsort((self.keys[second], self.keys[first], -similarities))
+		return zip(similarities[order].tolist(), self.keys[first[order]].tolist(),
+			self.keys[second[order]].tolist())
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Find actors who share " +
+		"productions, or movies with near-duplicate casts, by approximate " +
+		"Jaccard similarity.")
+	parser.add_argument("actors", nargs="*",
+		help="names of actors to find the most similar actors of")
+	parser.add_argument("--k", type=int, default=10,
+		help="number of similar actors to list per actor")
+	parser.add_argument("--bandSize", type=int, default=4,
+		help="signature rows per LSH band (smaller finds less similar sets)")
+	parser.add_argument("--bands", type=int,
+		help="number of LSH bands to search (fewer is faster, lower recall)")
+	parser.add_argument("--duplicateCasts", type=float, metavar="THRESHOLD",
+		help="instead list pairs of movies whose casts have at least this " +
+		"Jaccard similarity")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	arrays = ga.GraphArrays.fromGraph(graph)
+	if args.duplicateCasts is not None:
+		index = MinHashIndex.forMovies(arrays, bandSize=args.bandSize)
+		header = ["similarity", "firstMovie", "secondMovie"]
+		rows = [(similarity, arrays.names[first], arrays.names[second])
+			for similarity, first, second in
+			index.similarPairs(args.duplicateCasts, args.bands)]
+	else:
+		index = MinHashIndex.forActors(arrays, bandSize=args.bandSize)
+		actorIds = [graphDict.get(name, -1) for name in args.actors]
+		header = ["actor", "rank", "similarActor", "similarity"]
+		rows = [(name, rank + 1, arrays.names[nId], similarity)
+			for name, results in zip(args.actors, index.queryMany(actorIds,
+			args.k, args.bands))
+			for rank, (similarity, nId) in enumerate(results)]
+
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(header)
+		writer.writerows(rows)
+	finally:
+		if args.output:
+			outFile.close()
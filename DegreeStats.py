@@ -0,0 +1,449 @@
+import argparse
+import CommunityDetection
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import DirectorNetwork
+import numpy as np
+import sys
+import TimeSeries
+
+# Smallest number of nodes in the tail (degree >= dMin) a power law is fit to
+MinTailSize = 10
+# Fewest distinct degrees in that tail: a tail of a single degree fits any
+# alpha with a KS distance of 0
+MinTailDegrees = 2
+
+# Bins per factor of 10 in degree for log-binned histograms
+BinsPerDecade = 5
+
+"""
+FUNCTION: degreeSeries
+-----------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a dict from series name to a tuple (nodeIds, degrees) of the nodes
+the series covers and their degrees, all read from the snapshot's CSR arrays
+and sparse projections rather than from the graph:
+
+	movieCast - movies' out-degrees: the size of their casts
+	movieDirectors - movies' in-degrees: 1 with a director, 0 without
+	actorMovies - actors' in-degrees: the size of their filmographies
+	directorMovies - directors' out-degrees: the number of movies directed
+	actorCostars - actors' degrees in the co-star projection: the number of
+		distinct actors they have co-starred with
+	actorDirectors - the number of distinct directors each actor has worked
+		with (in the director x actor collaboration projection)
+	directorActors - the number of distinct actors each director has worked
+		with (ditto)
+
+Actors and directors without any edges are included with degree 0.
+-----------------------
+"""
+def degreeSeries(arrays):
+	numNodes = arrays.numNodes
+	actorIds = np.flatnonzero(arrays.isActor())
+	directorIds = np.flatnonzero(arrays.isDirector())
+	hasDirector = arrays.directorIds >= 0
+
+	credits = np.bincount(arrays.castIds, minlength=numNodes)
+	directed = np.bincount(arrays.directorIds[hasDirector], minlength=numNodes)
+
+	costarIds, costars = CommunityDetection.costarMatrix(arrays)
+	costarDegrees = np.zeros(numNodes, dtype=np.int64)
+	costarDegrees[costarIds] = np.diff(costars.indptr)
+
+	collaboratorDirectorIds, collaboratorActorIds, collaborations = \
+		DirectorNetwork.collaborationMatrix(arrays)
+	directorActors = np.zeros(numNodes, dtype=np.int64)
+	directorActors[collaboratorDirectorIds] = np.diff(collaborations.indptr)
+	actorDirectors = np.zeros(numNodes, dtype=np.int64)
+	actorDirectors[collaboratorActorIds] = np.bincount(collaborations.indices,
+		minlength=len(collaboratorActorIds))
+
+	series = {}
+	series["movieCast"] = (arrays.movieIds, arrays.castSizes())
+	series["movieDirectors"] = (arrays.movieIds, hasDirector.astype(np.int64))
+	series["actorMovies"] = (actorIds, credits[actorIds])
+	series["directorMovies"] = (directorIds, directed[directorIds])
+	series["actorCostars"] = (actorIds, costarDegrees[actorIds])
+	series["actorDirectors"] = (actorIds, actorDirectors[actorIds])
+	series["directorActors"] = (directorIds, directorActors[directorIds])
+	return series
+
+# Degree series names, in display order
+SeriesNames = ["movieCast", "movieDirectors", "actorMovies", "directorMovies",
+	"actorCostars", "actorDirectors", "directorActors"]
+
+"""
+CLASS: DegreeDistribution
+--------------------------
+The degree distribution of one group of nodes, stored as counts[d] = the
+number of nodes of degree d.  Every histogram and fit is computed from the
+counts alone, without going back to the nodes.
+--------------------------
+"""
+class DegreeDistribution(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		counts - an array of the number of nodes of each degree, from 0
+
+	Returns: a DegreeDistribution of the given counts.
+	-------------
+	"""
+	def __init__(self, counts):
+		self.counts = np.trim_zeros(np.asarray(counts, dtype=np.int64), "b")
+		self.degrees = np.arange(len(self.counts))
+		self.numNodes = self.counts.sum()
+
+	"""
+	METHOD: mean
+	-------------
+	Parameters: NA
+
+	Returns: the mean degree (NaN for no nodes).
+	-------------
+	"""
+	def mean(self):
+		if self.numNodes == 0:
+			return float("nan")
+		return float((self.counts * self.degrees).sum()) / self.numNodes
+
+	"""
+	METHOD: median
+	---------------
+	Parameters: NA
+
+	Returns: the (lower) median degree (NaN for no nodes).
+	---------------
+	"""
+	def median(self):
+		if self.numNodes == 0:
+			return float("nan")
+		return int(np.searchsorted(np.cumsum(self.counts),
+			(self.numNodes + 1) // 2))
+
+	"""
+	METHOD: maxDegree
+	------------------
+	Parameters: NA
+
+	Returns: the largest degree of any node (0 for no nodes).
+	------------------
+	"""
+	def maxDegree(self):
+		return max(len(self.counts) - 1, 0)
+
+	"""
+	METHOD: histogram
+	------------------
+	Parameters: NA
+
+	Returns: a tuple (degrees, counts) of every degree from 0 to the maximum and
+	the number of nodes with it.
+	------------------
+	"""
+	def histogram(self):
+		return self.degrees, self.counts
+
+	"""
+	METHOD: logBinnedHistogram
+	---------------------------
+	Parameters:
+		binsPerDecade - the number of bins per factor of 10 in degree
+
+	Returns: a tuple (centers, densities) of logarithmically spaced degree bins
+	from 1 up: the geometric center of each bin, and the share of the nodes
+	(with degree >= 1) per unit of degree in it.  Dividing by the number of
+	degrees in each bin keeps the wide bins comparable to the narrow ones on a
+	log-log plot.  Empty bins are left out.
+	---------------------------
+	"""
+	def logBinnedHistogram(self, binsPerDecade=BinsPerDecade):
+		positive = self.counts[1:].sum()
+		if positive == 0:
+			return np.zeros(0), np.zeros(0)
+		numBins = int(np.ceil(np.log10(len(self.counts)) * binsPerDecade)) or 1
+		edges = np.unique(np.ceil(np.logspace(0, np.log10(len(self.counts)),
+			numBins + 1)).astype(np.int64))
+		edges[-1] = len(self.counts)
+		binCounts = np.add.reduceat(self.counts, edges[:-1])
+		widths = np.diff(edges)
+		centers = np.sqrt(edges[:-1] * (edges[1:] - 1).astype(np.float64))
+		nonEmpty = binCounts > 0
+		return centers[nonEmpty], binCounts[nonEmpty] / \
+			(widths[nonEmpty] * float(positive))
+
+	"""
+	METHOD: ccdf
+	-------------
+	Parameters: NA
+
+	Returns: a tuple (degrees, shares) of every degree from 0 to the maximum
+	and the share of nodes with at least that degree.
+	-------------
+	"""
+	def ccdf(self):
+		if self.numNodes == 0:
+			return self.degrees, np.zeros(0)
+		return self.degrees, np.cumsum(self.counts[::-1])[::-1] / \
+			float(self.numNodes)
+
+	"""
+	METHOD: powerLawFit
+	--------------------
+	Parameters:
+		minTailSize - the fewest nodes to fit a tail to
+
+	Returns: a dict with the maximum likelihood power law P(d) ~ d^-alpha fit to
+	the tail of the distribution, following Clauset, Shalizi and Newman:
+
+		alpha - the exponent, from the discrete approximation
+			1 + n / sum(ln(d / (dMin - 0.5))) over the n tail degrees
+		alphaStdErr - its standard error, (alpha - 1) / sqrt(n)
+		dMin - the start of the tail, chosen to minimize ks
+		numTail - n, the number of nodes with degree >= dMin
+		ks - the Kolmogorov-Smirnov distance between the tail's CCDF and the
+			fitted one
+
+	Every candidate dMin (with at least minTailSize nodes and MinTailDegrees
+	distinct degrees in its tail) is fit at once, from cumulative sums over
+	the counts.  Values are NaN if no candidate qualifies.
+	--------------------
+	"""
+	def powerLawFit(self, minTailSize=MinTailSize):
+		fit = {"alpha": float("nan"), "alphaStdErr": float("nan"),
+			"dMin": float("nan"), "numTail": 0, "ks": float("nan")}
+		if len(self.counts) < 2:
+			return fit
+
+		# Tail sizes, distinct tail degrees and sums of log degrees for every
+		# dMin >= 1
+		degrees = self.degrees[1:].astype(np.float64)
+		counts = self.counts[1:]
+		tailSizes = np.cumsum(counts[::-1])[::-1]
+		tailDegrees = np.cumsum((counts > 0)[::-1])[::-1]
+		logSums = np.cumsum((counts * np.log(degrees))[::-1])[::-1]
+		candidates = np.flatnonzero((tailSizes >= minTailSize) &
+			(tailDegrees >= MinTailDegrees) & (counts > 0))
+		if len(candidates) == 0:
+			return fit
+		dMins = degrees[candidates]
+		numTail = tailSizes[candidates].astype(np.float64)
+		alphas = 1 + numTail / (logSums[candidates] -
+			numTail * np.log(dMins - 0.5))
+
+		# KS distance of each candidate, over a (candidates x degrees) grid
+		with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+			empirical = tailSizes[None, :] / numTail[:, None]
+			fitted = ((degrees[None, :] - 0.5) / (dMins[:, None] - 0.5)) ** \
+				(1 - alphas[:, None])
+			distances = np.where(degrees[None, :] >= dMins[:, None],
+				np.abs(empirical - fitted), 0)
+		ks = distances.max(axis=1)
+		if np.isnan(ks).all():
+			return fit
+
+		best = np.nanargmin(ks)
+		fit["alpha"] = alphas[best]
+		fit["alphaStdErr"] = (alphas[best] - 1) / np.sqrt(numTail[best])
+		fit["dMin"] = int(dMins[best])
+		fit["numTail"] = int(numTail[best])
+		fit["ks"] = ks[best]
+		return fit
+
+"""
+FUNCTION: degreeDistributions
+------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	seriesNames - the degree series to include (see degreeSeries; defaults to
+				all of them)
+
+Returns: a dict from (series, attribute, group) to the DegreeDistribution of
+that group's nodes, for every degree series and every group: attribute and
+group "all" for all of the series' nodes, and attribute "race" ("gender") with
+each race (gender) for nodes of that race (gender).  Movies have no race or
+gender, so only have "all".
+
+The counts of every group of a series come from one bincount over (group,
+degree) codes.
+------------------------------
+"""
+def degreeDistributions(arrays, seriesNames=None):
+	allSeries = degreeSeries(arrays)
+	groups = [("all", "all")] + [("race", race) for race in ga.Races] + \
+		[("gender", gender) for gender in ga.Genders]
+	genderOffset = 1 + len(ga.Races)
+
+	distributions = {}
+	for name in seriesNames or SeriesNames:
+		nodeIds, degrees = allSeries[name]
+		race = arrays.race[nodeIds]
+		gender = arrays.gender[nodeIds]
+		known = [np.ones(len(nodeIds), dtype=bool), race != ga.UnknownCode,
+			gender != ga.UnknownCode]
+		codes = [np.zeros(len(nodeIds), dtype=np.int64),
+			1 + race.astype(np.int64), genderOffset + gender.astype(np.int64)]
+		groupCodes = np.concatenate([code[mask] for code, mask in
+			zip(codes, known)])
+		groupDegrees = np.concatenate([degrees[mask] for mask in known])
+
+		width = int(degrees.max()) + 1 if len(degrees) else 1
+		counts = np.bincount(groupCodes * width + groupDegrees,
+			minlength=len(groups) * width).reshape(len(groups), width)
+		for (attribute, group), groupCounts in zip(groups, counts):
+			if attribute == "all" or groupCounts.any():
+				distributions[(name, attribute, group)] = \
+					DegreeDistribution(groupCounts)
+	return distributions
+
+"""
+FUNCTION: summaryTable
+-----------------------
+Parameters:
+	distributions - a dict of DegreeDistributions from degreeDistributions
+
+Returns: a dict of columns with one entry per distribution, in series order,
+then "all", race and gender groups:
+
+	series, attribute, group
+	numNodes, meanDegree, medianDegree, maxDegree
+	alpha, alphaStdErr, dMin, numTail, ks - the power law fit (see
+		DegreeDistribution.powerLawFit)
+-----------------------
+"""
+def summaryTable(distributions):
+	table = dict((column, []) for column in SummaryColumns)
+	for key in sortedKeys(distributions):
+		distribution = distributions[key]
+		for column, value in zip(["series", "attribute", "group"], key):
+			table[column].append(value)
+		table["numNodes"].append(distribution.numNodes)
+		table["meanDegree"].append(distribution.mean())
+		table["medianDegree"].append(distribution.median())
+		table["maxDegree"].append(distribution.maxDegree())
+		fit = distribution.powerLawFit()
+		for column in ["alpha", "alphaStdErr", "dMin", "numTail", "ks"]:
+			table[column].append(fit[column])
+	return dict((column, np.array(values)) for column, values in
+		table.iteritems())
+
+# Columns of the summary table, in display order
+SummaryColumns = ["series", "attribute", "group", "numNodes", "meanDegree",
+	"medianDegree", "maxDegree", "alpha", "alphaStdErr", "dMin", "numTail", "ks"]
+
+"""
+FUNCTION: histogramTable
+-------------------------
+Parameters:
+	distributions - a dict of DegreeDistributions from degreeDistributions
+
+Returns: a dict of columns in long form, with one row per point of every
+distribution's histograms: series, attribute, group, kind ("linear" for
+DegreeDistribution.histogram, "log" for logBinnedHistogram or "ccdf"), and
+the point's x (degree) and y values.
+-------------------------
+"""
+def histogramTable(distributions):
+	table = dict((column, []) for column in HistogramColumns)
+	for key in sortedKeys(distributions):
+		distribution = distributions[key]
+		for kind, (xs, ys) in [("linear", distribution.histogram()),
+			("log", distribution.logBinnedHistogram()),
+			("ccdf", distribution.ccdf())]:
+			for column, value in zip(["series", "attribute", "group", "kind"],
+				key + (kind,)):
+				table[column].extend([value] * len(xs))
+			table["x"].extend(xs.tolist())
+			table["y"].extend(ys.tolist())
+	return dict((column, np.array(values)) for column, values in
+		table.iteritems())
+
+# Columns of the histogram table, in display order
+HistogramColumns = ["series", "attribute", "group", "kind", "x", "y"]
+
+"""
+FUNCTION: sortedKeys
+---------------------
+Parameters:
+	distributions - a dict of DegreeDistributions from degreeDistributions
+
+Returns: the distributions' keys in display order: by series (SeriesNames
+order), then "all", races and genders in vocabulary order.
+---------------------
+"""
+def sortedKeys(distributions):
+	groupOrder = [("all", "all")] + [("race", race) for race in ga.Races] + \
+		[("gender", gender) for gender in ga.Genders]
+	return sorted(distributions, key=lambda key: (SeriesNames.index(key[0]),
+		groupOrder.index(key[1:])))
+
+"""
+FUNCTION: plotCCDF
+-------------------
+Parameters:
+	distributions - a dict of DegreeDistributions from degreeDistributions
+	series - the degree series to plot
+	attribute - "race" or "gender", to plot one line per group, or "all"
+	filename - if given, the image file to save the plot to.  Otherwise the
+				plot is shown.
+
+Returns: NA.  Plots the CCDFs of the series' groups on log-log axes.
+-------------------
+"""
+def plotCCDF(distributions, series, attribute, filename=None):
+	plt = TimeSeries.loadPyplot()
+	plt.figure()
+	for key in sortedKeys(distributions):
+		if key[0] != series or key[1] != attribute:
+			continue
+		degrees, shares = distributions[key].ccdf()
+		positive = (degrees > 0) & (shares > 0)
+		plt.loglog(degrees[positive], shares[positive], marker=".", label=key[2])
+	plt.title("%s degree CCDF by %s" % (series, attribute))
+	plt.xlabel("Degree")
+	plt.ylabel("P(degree >= x)")
+	plt.legend()
+	if filename:
+		plt.savefig(filename)
+		plt.close()
+	else:
+		plt.show()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Write degree distribution " +
+		"summaries (or histograms) by race and gender as CSV.")
+	parser.add_argument("--series", nargs="+", choices=SeriesNames,
+		help="degree series to include (default: all)")
+	parser.add_argument("--histograms", action="store_true",
+		help="instead write linear, log-binned and CCDF histograms")
+	parser.add_argument("--plot", nargs=3, metavar=("SERIES", "ATTRIBUTE",
+		"FILE"), help="also save a log-log CCDF plot of a series by " +
+		"attribute (race, gender or all) to FILE")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	distributions = degreeDistributions(ga.GraphArrays.fromGraph(graph),
+		args.series)
+	if args.plot:
+		plotCCDF(distributions, *args.plot)
+	if args.histograms:
+		table, columns = histogramTable(distributions), HistogramColumns
+	else:
+		table, columns = summaryTable(distributions), SummaryColumns
+
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(columns)
+		writer.writerows(zip(*[table[column].tolist() for column in columns]))
+	finally:
+		if args.output:
+			outFile.close()
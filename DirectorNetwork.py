@@ -0,0 +1,155 @@
+import argparse
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import DiversityScore as ds
+import numpy as np
+from scipy import sparse
+import sys
+
+"""
+FUNCTION: incidenceMatrices
+----------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a tuple (directorIds, actorIds, directorMovies, movieActors).
+directorIds and actorIds are the node IDs of every director with a movie and
+every actor with a credit, and the matrices are sparse CSR incidence matrices:
+
+	directorMovies - directors x movies, 1 where the director directed the
+					movie (movies in arrays.movieIds order)
+	movieActors - movies x actors, 1 where the actor is in the movie's cast
+----------------------------
+"""
+def incidenceMatrices(arrays):
+	numMovies = len(arrays.movieIds)
+	hasDirector = np.flatnonzero(arrays.directorIds >= 0)
+	directorIds, directorRows = np.unique(arrays.directorIds[hasDirector],
+		return_inverse=True)
+	directorMovies = sparse.csr_matrix((np.ones(len(hasDirector), dtype=np.int32),
+		(directorRows, hasDirector)), shape=(len(directorIds), numMovies))
+
+	actorIds, actorColumns = np.unique(arrays.castIds, return_inverse=True)
+	movieActors = sparse.csr_matrix((np.ones(len(arrays.castIds),
+		dtype=np.int32), (arrays.castMoviePositions(), actorColumns)),
+		shape=(numMovies, len(actorIds)))
+	return directorIds, actorIds, directorMovies, movieActors
+
+"""
+FUNCTION: collaborationMatrix
+------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a tuple (directorIds, actorIds, collaborations), where collaborations
+is the sparse directors x actors product of the incidence matrices (see
+incidenceMatrices): the number of each director's movies each actor is in.
+Actor-directors are not counted as their own collaborators.
+------------------------------
+"""
+def collaborationMatrix(arrays):
+	directorIds, actorIds, directorMovies, movieActors = \
+		incidenceMatrices(arrays)
+	collaborations = directorMovies.dot(movieActors).tocsr()
+
+	# Drop actor-directors' credits in their own movies
+	rows = np.repeat(np.arange(len(directorIds)), np.diff(collaborations.indptr))
+	isSelf = directorIds[rows] == actorIds[collaborations.indices]
+	if isSelf.any():
+		collaborations.data[isSelf] = 0
+		collaborations.eliminate_zeros()
+	return directorIds, actorIds, collaborations
+
+"""
+FUNCTION: directorCollaboratorTable
+------------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a dict of columns, each an array with one entry per director (every
+node that directed a movie, sorted by node ID):
+
+	nodeId, name, race, gender
+	numMovies - number of movies directed
+	avgRacialDiversityScore, avgGenderDiversityScore - the director's scores,
+		as in DiversityScore.directorScoreArrays
+	numCredits - cast credits over all their movies (an actor in three of
+		their movies counts three times)
+	numUniqueActors - distinct actors they have worked with
+	uniqueNonWhiteShare, uniqueFemaleShare - shares of those distinct actors
+		who are non-White or female
+	numRepeatActors - distinct actors they have cast in more than one movie
+	repeatActorShare - numRepeatActors / numUniqueActors
+	recastCreditShare - share of credits going to an actor already cast in
+		another of their movies, (numCredits - numUniqueActors) / numCredits
+	repeatNonWhiteShare, repeatFemaleShare - shares of the repeat actors who
+		are non-White or female
+
+Every column is computed for all directors at once from the collaboration
+matrix (see collaborationMatrix): distinct actors come from a boolean copy of
+it, repeat actors from its entries of 2 or more, and group counts are sparse
+products with per-actor indicator vectors.  Shares over no actors are NaN.
+------------------------------------
+"""
+def directorCollaboratorTable(arrays):
+	directorIds, actorIds, collaborations = collaborationMatrix(arrays)
+	nonWhite = (arrays.race[actorIds] != ga.WhiteCode).astype(np.float64)
+	female = (arrays.gender[actorIds] == ga.FemaleCode).astype(np.float64)
+
+	unique = collaborations.copy()
+	unique.data = np.ones(len(unique.data))
+	repeat = (collaborations >= 2).astype(np.float64)
+
+	numCredits = np.asarray(collaborations.sum(axis=1)).ravel()
+	numUnique = np.diff(unique.indptr).astype(np.float64)
+	numRepeat = np.asarray(repeat.sum(axis=1)).ravel()
+
+	racialScores, genderScores = ds.directorScoreArrays(arrays)
+	table = {}
+	table["nodeId"] = directorIds
+	table["name"] = arrays.names[directorIds]
+	table["race"] = ga.decode(arrays.race[directorIds], ga.Races)
+	table["gender"] = ga.decode(arrays.gender[directorIds], ga.Genders)
+	hasDirector = arrays.directorIds >= 0
+	table["numMovies"] = np.bincount(np.searchsorted(directorIds,
+		arrays.directorIds[hasDirector]), minlength=len(directorIds))
+	table["avgRacialDiversityScore"] = racialScores[directorIds]
+	table["avgGenderDiversityScore"] = genderScores[directorIds]
+	table["numCredits"] = numCredits.astype(np.int64)
+	table["numUniqueActors"] = numUnique.astype(np.int64)
+	table["numRepeatActors"] = numRepeat.astype(np.int64)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		table["uniqueNonWhiteShare"] = unique.dot(nonWhite) / numUnique
+		table["uniqueFemaleShare"] = unique.dot(female) / numUnique
+		table["repeatActorShare"] = numRepeat / numUnique
+		table["recastCreditShare"] = (numCredits - numUnique) / numCredits
+		table["repeatNonWhiteShare"] = repeat.dot(nonWhite) / numRepeat
+		table["repeatFemaleShare"] = repeat.dot(female) / numRepeat
+	return table
+
+# Columns of the director table, in display order
+TableColumns = ["nodeId", "name", "race", "gender", "numMovies",
+	"avgRacialDiversityScore", "avgGenderDiversityScore", "numCredits",
+	"numUniqueActors", "uniqueNonWhiteShare", "uniqueFemaleShare",
+	"numRepeatActors", "repeatActorShare", "recastCreditShare",
+	"repeatNonWhiteShare", "repeatFemaleShare"]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Write the director collaborator table as CSV.")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	table = directorCollaboratorTable(ga.GraphArrays.fromGraph(graph))
+	outFile = open(args.output, 'wb') if args.output else sys.stdout
+	try:
+		writer = csv.writer(outFile)
+		writer.writerow(TableColumns)
+		writer.writerows(zip(*[table[column].tolist()
+			for column in TableColumns]))
+	finally:
+		if args.output:
+			outFile.close()
@@ -1,4 +1,10 @@
 import collections
+import Contingency
+from dataset import GraphArrays as ga
+import numpy as np
+
+# Built-in cast weightings for weighted diversity scores (see castWeightArray)
+WeightSchemes = ["billing", "likes"]
 
 """
 FUNCTIONS: racialScoreForDirector and genderScoreForDirector
@@ -84,15 +90,30 @@ Returns: dicts
 	numDirectors: int,
 	avgRacialDiversityScore: float,
 	avgGenderDiversityScore: float,
+	avgBillingWeightedRacialDiversityScore: float,
+	avgBillingWeightedGenderDiversityScore: float,
+	avgLikesWeightedRacialDiversityScore: float,
+	avgLikesWeightedGenderDiversityScore: float,
 	numWhiteDirectors: int,
 	numNonWhiteDirectors: int,
 	numMaleDirectors: int,
 	numFemaleDirectors: int,
 }
+
+Director scores (weighted and unweighted) are looked up from arrays of every
+director's scores in graph, computed in one vectorized pass.  A GraphArrays
+snapshot of graph can be passed as arrays to avoid taking a new one.
 ---------------------------------
 """
-def directorStats(directorMovieGraph, graph, graphDict):
+def directorStats(directorMovieGraph, graph, graphDict, arrays=None):
 	directorDict = collections.defaultdict()
+	if arrays is None:
+		arrays = ga.GraphArrays.fromGraph(graph)
+	directorScores = {}
+	for scheme, (racial, gender) in weightedMovieScoreArrays(arrays).items():
+		directorScores[scheme] = directorScoreArrays(arrays, racial, gender)
+	weightedScores = dict((scheme, ([], [])) for scheme in WeightSchemes)
+
 	numDirectors = 0
 	race_scores = []
 	gender_scores = []
@@ -105,13 +126,18 @@ def directorStats(directorMovieGraph, graph, graphDict):
 		if node_type == "DIRECTOR" or node_type == "ACTOR-DIRECTOR":
 			if directorMovieGraph.node[node]['race'] is None or directorMovieGraph.node[node]['gender'] is None:
 				continue
-			directorName = directorMovieGraph.node[node]['name']
-			race_score = racialScoreForDirector(graph, graphDict[directorName])
-			gender_score = genderScoreForDirector(graph, graphDict[directorName])
-			if race_score != None:
-				race_scores.append(race_score)
-			if gender_score != None:
-				gender_scores.append(gender_score)
+			directorId = graphDict[directorMovieGraph.node[node]['name']]
+			racial, gender = directorScores[None]
+			if not np.isnan(racial[directorId]):
+				race_scores.append(racial[directorId])
+			if not np.isnan(gender[directorId]):
+				gender_scores.append(gender[directorId])
+			for scheme in WeightSchemes:
+				racial, gender = directorScores[scheme]
+				for scores, score in zip(weightedScores[scheme],
+					[racial[directorId], gender[directorId]]):
+					if not np.isnan(score):
+						scores.append(score)
 			numDirectors += 1
 			if directorMovieGraph.node[node]["gender"] == "Male":
 				numMaleDirectors += 1
@@ -125,6 +151,12 @@ def directorStats(directorMovieGraph, graph, graphDict):
 	directorDict["numDirectors"] = numDirectors
 	directorDict["avgRacialDiversityScore"] = float(sum(race_scores)) / float(len(race_scores))
 	directorDict["avgGenderDiversityScore"] = float(sum(gender_scores)) / float(len(race_scores))
+	for scheme in WeightSchemes:
+		racialScores, genderScores = weightedScores[scheme]
+		directorDict["avg%sWeightedRacialDiversityScore" % scheme.capitalize()] = \
+			averageOrNaN(racialScores)
+		directorDict["avg%sWeightedGenderDiversityScore" % scheme.capitalize()] = \
+			averageOrNaN(genderScores)
 	directorDict["numWhiteDirectors"] = numWhiteDirectors
 	directorDict["numNonWhiteDirectors"] = numNonWhiteDirectors
 	directorDict["numMaleDirectors"] = numMaleDirectors
@@ -142,60 +174,68 @@ Returns: dicts
 	numMovies: int,
 	avgRacialDiversityScore: float,
 	avgGenderDiversityScore: float,
+	avgBillingWeightedRacialDiversityScore: float,
+	avgBillingWeightedGenderDiversityScore: float,
+	avgLikesWeightedRacialDiversityScore: float,
+	avgLikesWeightedGenderDiversityScore: float,
 	numAllWhiteMovies: int,
 	numAllNonWhiteMovies: int,
 	numAllMaleMovies: int,
 	numAllFemaleMovies: int,
 	numHalfFemaleMovies: int,
 }
+
+Scores are computed for every movie in one vectorized pass over an array
+snapshot of the graph (see weightedMovieScoreArrays), which can be passed as
+arrays to avoid taking a new one.  Movies without a cast are left out of the
+averages, and counted as not all-White.
 ---------------------------------
 """
-def movieStats(graph):
+def movieStats(graph, arrays=None):
 	movieDict = collections.defaultdict()
-	numMovies = 0
-	race_scores = []
-	gender_scores = []
-	numAllWhiteMovies = 0
-	numAllNonWhiteMovies = 0
-	numAllMaleMovies = 0
-	numAllFemaleMovies = 0
-	numHalfFemaleMovies = 0
-	for node in graph.nodes():
-		node_type = graph.node[node]["type"]
-		if node_type == "MOVIE":
-			race_score = racialScoreForMovie(graph,node)
-			gender_score = genderScoreForMovie(graph,node)
-			if race_score != None:
-				race_scores.append(race_score)
-			if gender_score != None:
-				gender_scores.append(gender_score)
-			if race_score == 0: # all white cast
-				numAllWhiteMovies += 1
-			else:
-				numAllNonWhiteMovies += 1
-			if gender_score == 0: # all male cast
-				numAllMaleMovies += 1
-			if gender_score == 1: # all female cast
-				numAllFemaleMovies += 1
-			if gender_score >= 0.5:
-				numHalfFemaleMovies += 1
-			numMovies += 1
-
-	movieDict["numMovies"] = numMovies
-	movieDict["avgRacialDiversityScore"] = float(sum(race_scores)) / float(len(race_scores))
-	movieDict["avgGenderDiversityScore"] = float(sum(gender_scores)) / float(len(gender_scores))
-	movieDict["numAllWhiteMovies"] = numAllWhiteMovies
-	movieDict["numAllNonWhiteMovies"] = numAllNonWhiteMovies
-	movieDict["numAllMaleMovies"] = numAllMaleMovies
-	movieDict["numAllFemaleMovies"] = numAllFemaleMovies
-	movieDict["numHalfFemaleMovies"] = numHalfFemaleMovies
+	if arrays is None:
+		arrays = ga.GraphArrays.fromGraph(graph)
+	scores = weightedMovieScoreArrays(arrays)
+	racialScores, genderScores = scores[None]
+	scored = ~np.isnan(racialScores)
+
+	movieDict["numMovies"] = len(arrays.movieIds)
+	movieDict["avgRacialDiversityScore"] = float(sum(racialScores[scored])) / float(np.count_nonzero(scored))
+	movieDict["avgGenderDiversityScore"] = float(sum(genderScores[scored])) / float(np.count_nonzero(scored))
+	for scheme in WeightSchemes:
+		weightedRacial, weightedGender = scores[scheme]
+		movieDict["avg%sWeightedRacialDiversityScore" % scheme.capitalize()] = \
+			averageOrNaN(weightedRacial[~np.isnan(weightedRacial)])
+		movieDict["avg%sWeightedGenderDiversityScore" % scheme.capitalize()] = \
+			averageOrNaN(weightedGender[~np.isnan(weightedGender)])
+	movieDict["numAllWhiteMovies"] = int(np.count_nonzero(racialScores == 0))
+	movieDict["numAllNonWhiteMovies"] = len(arrays.movieIds) - movieDict["numAllWhiteMovies"]
+	movieDict["numAllMaleMovies"] = int(np.count_nonzero(genderScores == 0))
+	movieDict["numAllFemaleMovies"] = int(np.count_nonzero(genderScores == 1))
+	with np.errstate(invalid='ignore'):
+		movieDict["numHalfFemaleMovies"] = int(np.count_nonzero(genderScores >= 0.5))
 	return movieDict
 
+"""
+FUNCTION: averageOrNaN
+-----------------------
+Parameters:
+	scores - a sequence of scores
+
+Returns: the average of the scores, or NaN if there are none.
+-----------------------
+"""
+def averageOrNaN(scores):
+	if len(scores) == 0:
+		return float("nan")
+	return float(sum(scores)) / len(scores)
+
 """
 FUNCTION: actorStats
 ---------------------------------
 Parameters:
 	graph - the tripartite NetworkX DiGraph continaing
+	arrays - an optional GraphArrays snapshot of graph, to avoid taking a new one
 
 Returns: dict 
 {
@@ -220,85 +260,36 @@ Returns: dict
 	'avgNumMoviesForMaleActor': float,
 	'avgNumMoviesForFemaleActor': float,
 }
+
+Every value is a slice of a Contingency.ContingencyTensor of the graph, whose
+counts and degree sums also answer intersectional questions these keys do not
+(e.g. the average number of movies of Black female actors).
 ---------------------------------
 """
-def actorStats(graph):
+def actorStats(graph, arrays=None):
+	tensor = Contingency.ContingencyTensor(
+		arrays if arrays is not None else ga.GraphArrays.fromGraph(graph))
+	actors = Contingency.ActorTypes
 	actorDict = collections.defaultdict()
-
-	numActors = 0
-	numWhite = 0
-	numBlack = 0
-	numHispanic = 0
-	numMultiracial = 0
-	numAsian = 0
-	numAsianIndian = 0
-	numMiddleEastern = 0
-	numAmericanAborigine = 0
-	numNonWhite = 0
-	
-	numMale = 0
-	numFemale = 0
-
-	white_movies = []
-	nonwhite_movies = []
-	male_movies = []
-	female_movies = []
-
-	avgNumMoviesForWhiteActor = 0
-	avgNumMoviesForNonWhiteActor = 0
-	avgNumMoviesForMaleActor = 0
-	avgNumMoviesForFemaleActor = 0
-
-	for node in graph.nodes():
-		node_type = graph.node[node]["type"]
-		if node_type == "ACTOR" or node_type == "ACTOR-DIRECTOR":
-			race = graph.node[node]["race"]
-			gender = graph.node[node]["gender"]
-			if race != None:
-				if race == "White":
-					numWhite += 1
-					white_movies.append(len(graph.predecessors(node)))
-				else:
-					numNonWhite += 1
-					nonwhite_movies.append(len(graph.predecessors(node)))
-			if race == "Black":
-				numBlack += 1
-			if race == "Hispanic":
-				numHispanic += 1
-			if race == "Multiracial":
-				numMultiracial += 1
-			if race == "Asian":
-				numAsian += 1
-			if race == "Asian Indian":
-				numAsianIndian += 1
-			if race == "Middle Eastern":
-				numMiddleEastern += 1
-			if race == "American Aborigine":
-				numAmericanAborigine += 1
-			if gender == "Male":
-				numMale += 1 
-				male_movies.append(len(graph.predecessors(node)))
-			if gender == "Female":
-				numFemale += 1
-				female_movies.append(len(graph.predecessors(node)))
-			numActors += 1
-
-	actorDict["numActors"] = numActors
-	actorDict["numWhite"] = numWhite
-	actorDict["numNonWhite"] = numNonWhite
-	actorDict["numBlack"] = numBlack
-	actorDict["numHispanic"] = numHispanic
-	actorDict["numMultiracial"] = numMultiracial
-	actorDict["numAsian"] = numAsian
-	actorDict["numAsianIndian"] = numAsianIndian
-	actorDict["numMiddleEastern"] = numMiddleEastern
-	actorDict["numAmericanAborigine"] = numAmericanAborigine
-	actorDict["numMale"] = numMale
-	actorDict["numFemale"] = numFemale
-	actorDict["avgNumMoviesForWhiteActor"] = float(sum(white_movies)) / len(white_movies)
-	actorDict['avgNumMoviesForNonWhiteActor'] = float(sum(nonwhite_movies)) / len(nonwhite_movies)
-	actorDict['avgNumMoviesForMaleActor'] = float(sum(male_movies)) / len(male_movies)
-	actorDict['avgNumMoviesForFemaleActor'] = float(sum(female_movies))/ len(female_movies)
+	actorDict["numActors"] = tensor.count(nodeType=actors)
+	actorDict["numWhite"] = tensor.count(nodeType=actors, race="White")
+	actorDict["numNonWhite"] = tensor.count(nodeType=actors,
+		race=Contingency.NonWhiteRaces)
+	for key, race in [("numBlack", "Black"), ("numHispanic", "Hispanic"),
+		("numMultiracial", "Multiracial"), ("numAsian", "Asian"),
+		("numAsianIndian", "Asian/Indian"), ("numMiddleEastern", "Middle Eastern"),
+		("numAmericanAborigine", "American Aborigine")]:
+		actorDict[key] = tensor.count(nodeType=actors, race=race)
+	actorDict["numMale"] = tensor.count(nodeType=actors, gender="Male")
+	actorDict["numFemale"] = tensor.count(nodeType=actors, gender="Female")
+	actorDict["avgNumMoviesForWhiteActor"] = tensor.meanDegree("in",
+		nodeType=actors, race="White")
+	actorDict["avgNumMoviesForNonWhiteActor"] = tensor.meanDegree("in",
+		nodeType=actors, race=Contingency.NonWhiteRaces)
+	actorDict["avgNumMoviesForMaleActor"] = tensor.meanDegree("in",
+		nodeType=actors, gender="Male")
+	actorDict["avgNumMoviesForFemaleActor"] = tensor.meanDegree("in",
+		nodeType=actors, gender="Female")
 	return actorDict
 
 
@@ -318,3 +309,158 @@ def profitStats(graph, node):
 	if graph.node[node]["budget"] != 0:
 		ratio = graph.node[node]["gross"] / float(graph.node[node]["budget"])
 	return (race_score, gender_score, ratio)
+
+
+"""
+FUNCTION: movieScoreArrays
+---------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the graph
+
+Returns: a tuple of (racialScores, genderScores) arrays parallel to
+arrays.movieIds, computed for every movie in one vectorized pass.  Scores match
+racialScoreForMovie and genderScoreForMovie, with NaN in place of None for
+movies without a cast.
+---------------------------------
+"""
+def movieScoreArrays(arrays):
+	return weightedMovieScoreArrays(arrays, [])[None]
+
+"""
+FUNCTION: castWeightArray
+---------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the graph
+	scheme - one of WeightSchemes
+
+Returns: an array parallel to arrays.castIds of the weight of each credit (see
+creditWeightArray).
+---------------------------------
+"""
+def castWeightArray(arrays, scheme):
+	return creditWeightArray(scheme, arrays.castBilling, arrays.castLikes)
+
+"""
+FUNCTION: creditWeightArray
+---------------------------------
+Parameters:
+	scheme - one of WeightSchemes
+	billing - an array of credits' billing positions (-1 if unknown)
+	likes - a parallel array of the credits' Facebook likes (NaN if unknown)
+
+Returns: an array of the weight of each credit:
+
+	billing - 1 / (billing position + 1), so the top-billed actor counts
+			fully, the second half as much, and so on.  Credits with an
+			unknown billing position get no weight.
+	likes - the actor's Facebook likes + 1.  The dataset only records likes
+			for each movie's leads, so the rest of the cast counts as 1, the
+			same as a lead with no likes.
+---------------------------------
+"""
+def creditWeightArray(scheme, billing, likes):
+	if scheme == "billing":
+		billing = np.asarray(billing, dtype=np.float64)
+		return np.where(billing >= 0, 1.0 / np.maximum(billing + 1, 1), 0.0)
+	if scheme == "likes":
+		likes = np.asarray(likes, dtype=np.float64)
+		return np.where(np.isnan(likes), 1.0, likes + 1)
+	raise ValueError("Unknown weight scheme %s" % scheme)
+
+"""
+FUNCTION: weightedMovieScoreArrays
+---------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the graph
+	schemes - the weightings to score movies with: names from WeightSchemes,
+		and/or (name, weights) pairs for custom weightings, where weights is
+		an array parallel to arrays.castIds of each credit's weight
+
+Returns: a dict from each scheme's name to a tuple of (racialScores,
+genderScores) arrays parallel to arrays.movieIds, plus the unweighted scores
+(as in movieScoreArrays) under None.
+
+A weighted score is the weighted share of a movie's cast that is non-White
+(or female), and NaN for movies whose cast has no total weight.  The cast's
+races and genders are gathered once, and every weighting is then a bincount
+over the same gathered arrays.
+---------------------------------
+"""
+def weightedMovieScoreArrays(arrays, schemes=WeightSchemes):
+	numMovies = len(arrays.movieIds)
+	castMovies = arrays.castMoviePositions()
+	castSizes = arrays.castSizes().astype(np.float64)
+	nonWhite = arrays.race[arrays.castIds] != ga.WhiteCode
+	female = arrays.gender[arrays.castIds] == ga.FemaleCode
+
+	def scores(weights, totals):
+		if weights is None:
+			numNonWhite = np.bincount(castMovies, weights=nonWhite,
+				minlength=numMovies)
+			numFemale = np.bincount(castMovies, weights=female,
+				minlength=numMovies)
+		else:
+			numNonWhite = np.bincount(castMovies, weights=weights * nonWhite,
+				minlength=numMovies)
+			numFemale = np.bincount(castMovies, weights=weights * female,
+				minlength=numMovies)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			return (np.where(totals > 0, numNonWhite / totals, np.nan),
+				np.where(totals > 0, numFemale / totals, np.nan))
+
+	movieScores = {None: scores(None, castSizes)}
+	for scheme in schemes:
+		if isinstance(scheme, tuple):
+			name, weights = scheme
+			weights = np.asarray(weights, dtype=np.float64)
+		else:
+			name, weights = scheme, castWeightArray(arrays, scheme)
+		totals = np.bincount(castMovies, weights=weights, minlength=numMovies)
+		movieScores[name] = scores(weights, totals)
+	return movieScores
+
+"""
+FUNCTION: directorScoreArrays
+---------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the graph
+	racialScores, genderScores - optional per-movie scores from
+		movieScoreArrays, to avoid recomputing them
+
+Returns: a tuple of (racialScores, genderScores) arrays indexed by node ID.
+Scores match racialScoreForDirector and genderScoreForDirector, with NaN in
+place of None (including for every non-director node).
+---------------------------------
+"""
+def directorScoreArrays(arrays, racialScores=None, genderScores=None):
+	if racialScores is None or genderScores is None:
+		racialScores, genderScores = movieScoreArrays(arrays)
+
+	def averageByDirector(movieScores):
+		valid = (arrays.directorIds >= 0) & ~np.isnan(movieScores)
+		directorIds = arrays.directorIds[valid]
+		counts = np.bincount(directorIds, minlength=arrays.numNodes)
+		sums = np.bincount(directorIds, weights=movieScores[valid],
+			minlength=arrays.numNodes)
+		scores = np.full(arrays.numNodes, np.nan)
+		scores[counts > 0] = sums[counts > 0] / counts[counts > 0]
+		return scores
+
+	return averageByDirector(racialScores), averageByDirector(genderScores)
+
+"""
+FUNCTION: actorScoreArrays
+---------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the graph
+
+Returns: a tuple of (racialScores, genderScores) arrays indexed by node ID,
+matching racialScoreForActor and genderScoreForActor for every person node, and
+NaN for movie nodes and missing IDs.
+---------------------------------
+"""
+def actorScoreArrays(arrays):
+	isPerson = arrays.present & (arrays.nodeType != ga.MovieCode)
+	racialScores = np.where(isPerson, arrays.race != ga.WhiteCode, np.nan)
+	genderScores = np.where(isPerson, arrays.gender == ga.FemaleCode, np.nan)
+	return racialScores, genderScores
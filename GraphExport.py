@@ -0,0 +1,269 @@
+import argparse
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import DiversityScore as ds
+import gzip
+import itertools
+import numpy as np
+from xml.sax.saxutils import quoteattr
+
+# Number of nodes or edges to build rows for at a time.  Only one chunk of rows
+# is ever held in memory while writing.
+ChunkSize = 65536
+
+# Size in bytes of the output file buffers
+BufferSize = 1 << 20
+
+# Optional per-node columns that can be exported
+OptionalColumns = ["race", "gender", "year", "score"]
+
+"""
+FUNCTION: nodeLabels
+---------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	nodeIds - an array of node IDs
+
+Returns: a list of display labels for the given nodes: the title for movies
+(their graphDict key without the release year) and the name for people.
+---------------------
+"""
+def nodeLabels(arrays, nodeIds):
+	labels = []
+	for nodeId, nodeType, year in zip(nodeIds, arrays.nodeType[nodeIds],
+		arrays.releaseYear[nodeIds]):
+		name = arrays.names[nodeId]
+		if nodeType == ga.MovieCode:
+			name = name[:len(name) - len(str(year))]
+		labels.append(name)
+	return labels
+
+"""
+FUNCTION: nodeColumns
+----------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	columns - the optional columns to include (see OptionalColumns)
+
+Returns: a tuple (header, columnFunc).  header is the list of column names for
+the node table, and columnFunc is a function taking an array of node IDs and
+returning the list of columns for those nodes, in header order.
+
+The "score" column is two columns, the racial and gender diversity scores of
+each node: a movie's score for movies, the average of their movies' scores for
+directors (and actor-directors), and their own score for actors.  Scores are
+computed once for every node, up front.
+----------------------
+"""
+def nodeColumns(arrays, columns):
+	header = ["Id", "Label", "Classification"]
+	valueFuncs = [
+		lambda nodeIds: nodeIds.tolist(),
+		lambda nodeIds: nodeLabels(arrays, nodeIds),
+		lambda nodeIds: ga.decode(arrays.nodeType[nodeIds], ga.NodeTypes),
+	]
+
+	if "race" in columns:
+		header.append("Race")
+		valueFuncs.append(lambda nodeIds:
+			ga.decode(arrays.race[nodeIds], ga.Races))
+	if "gender" in columns:
+		header.append("Gender")
+		valueFuncs.append(lambda nodeIds:
+			ga.decode(arrays.gender[nodeIds], ga.Genders))
+	if "year" in columns:
+		header.append("Year")
+		isMovie = arrays.nodeType == ga.MovieCode
+		valueFuncs.append(lambda nodeIds: np.where(isMovie[nodeIds],
+			arrays.releaseYear[nodeIds], None))
+	if "score" in columns:
+		header.extend(["RacialScore", "GenderScore"])
+		racialScores, genderScores = ds.actorScoreArrays(arrays)
+		movieRacial, movieGender = ds.movieScoreArrays(arrays)
+		directorRacial, directorGender = ds.directorScoreArrays(arrays,
+			movieRacial, movieGender)
+		isDirector = arrays.isDirector()
+		racialScores = np.where(isDirector, directorRacial, racialScores)
+		genderScores = np.where(isDirector, directorGender, genderScores)
+		racialScores[arrays.movieIds] = movieRacial
+		genderScores[arrays.movieIds] = movieGender
+		for scores in [racialScores, genderScores]:
+			valueFuncs.append(lambda nodeIds, scores=scores:
+				np.where(np.isnan(scores[nodeIds]), None, scores[nodeIds]))
+
+	def columnFunc(nodeIds):
+		return [valueFunc(nodeIds) for valueFunc in valueFuncs]
+	return header, columnFunc
+
+"""
+FUNCTION: nodeChunks
+---------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a generator of arrays of the IDs of the nodes in the graph, in order,
+at most ChunkSize at a time.
+---------------------
+"""
+def nodeChunks(arrays):
+	for start in range(0, arrays.numNodes, ChunkSize):
+		chunk = np.arange(start, min(start + ChunkSize, arrays.numNodes))
+		yield chunk[arrays.present[chunk]]
+
+"""
+FUNCTION: edgeChunks
+---------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+
+Returns: a generator of (sources, targets) arrays of node IDs for every edge
+in the graph, at most ChunkSize edges at a time: director -> movie edges
+first, then movie -> actor edges.
+---------------------
+"""
+def edgeChunks(arrays):
+	hasDirector = np.flatnonzero(arrays.directorIds >= 0)
+	for start in range(0, len(hasDirector), ChunkSize):
+		positions = hasDirector[start:start + ChunkSize]
+		yield arrays.directorIds[positions], arrays.movieIds[positions]
+
+	castMovies = arrays.castMoviePositions()
+	for start in range(0, len(arrays.castIds), ChunkSize):
+		end = start + ChunkSize
+		yield arrays.movieIds[castMovies[start:end]], arrays.castIds[start:end]
+
+"""
+FUNCTION: exportCSV
+--------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	nodesFilename - the file to write the node table to
+	edgesFilename - the file to write the edge table to
+	columns - the optional node columns to include (see OptionalColumns)
+
+Returns: NA
+
+Writes the graph as node and edge tables in Gephi's CSV import format.  Nodes
+and edges are identified by node ID, with names and titles as labels only, so
+movies with the same title stay separate nodes.
+--------------------
+"""
+def exportCSV(arrays, nodesFilename, edgesFilename, columns=[]):
+	header, columnFunc = nodeColumns(arrays, columns)
+	with open(nodesFilename, 'wb', BufferSize) as csvfile:
+		writer = csv.writer(csvfile)
+		writer.writerow(header)
+		for nodeIds in nodeChunks(arrays):
+			writer.writerows(zip(*columnFunc(nodeIds)))
+
+	with open(edgesFilename, 'wb', BufferSize) as csvfile:
+		writer = csv.writer(csvfile)
+		writer.writerow(["Source", "Target", "Weight", "Type"])
+		for sources, targets in edgeChunks(arrays):
+			writer.writerows(itertools.izip(sources.tolist(), targets.tolist(),
+				itertools.repeat(1), itertools.repeat("Undirected")))
+
+"""
+FUNCTION: exportGEXF
+---------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	filename - the GEXF file to write
+	columns - the optional node columns to include (see OptionalColumns)
+
+Returns: NA
+
+Writes the graph as a directed GEXF graph, with the node type and optional
+columns as node attributes.  The XML is written as it is generated, rather
+than built as a document in memory first.
+---------------------
+"""
+def exportGEXF(arrays, filename, columns=[]):
+	header, columnFunc = nodeColumns(arrays, columns)
+	attributes = header[2:]
+
+	with open(filename, 'wb', BufferSize) as gexfFile:
+		gexfFile.write('<?xml version="1.0" encoding="utf-8"?>\n'
+			'<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+			'<graph defaultedgetype="directed" mode="static">\n'
+			'<attributes class="node">\n')
+		for i, attribute in enumerate(attributes):
+			attributeType = "double" if attribute.endswith("Score") else \
+				"integer" if attribute == "Year" else "string"
+			gexfFile.write('<attribute id="%i" title="%s" type="%s"/>\n' % (
+				i, attribute, attributeType))
+		gexfFile.write('</attributes>\n<nodes>\n')
+
+		for nodeIds in nodeChunks(arrays):
+			for row in zip(*columnFunc(nodeIds)):
+				values = "".join('<attvalue for="%i" value=%s/>' % (i,
+					quoteattr(str(value))) for i, value in enumerate(row[2:])
+					if value is not None)
+				gexfFile.write('<node id="%i" label=%s><attvalues>%s'
+					'</attvalues></node>\n' % (row[0], quoteattr(row[1]), values))
+
+		gexfFile.write('</nodes>\n<edges>\n')
+		edgeId = 0
+		for sources, targets in edgeChunks(arrays):
+			gexfFile.write("".join('<edge id="%i" source="%i" target="%i"/>\n'
+				% (edgeId + i, source, target)
+				for i, (source, target) in enumerate(zip(sources, targets))))
+			edgeId += len(sources)
+		gexfFile.write('</edges>\n</graph>\n</gexf>\n')
+
+"""
+FUNCTION: exportBinaryEdgeList
+-------------------------------
+Parameters:
+	arrays - a GraphArrays snapshot of the movie graph
+	filename - the file to write
+
+Returns: NA
+
+Writes every edge as a pair of little-endian int32 (source, target) node IDs,
+gzip-compressed.  See readBinaryEdgeList.
+-------------------------------
+"""
+def exportBinaryEdgeList(arrays, filename):
+	with gzip.open(filename, 'wb') as edgeFile:
+		for sources, targets in edgeChunks(arrays):
+			edges = np.empty((len(sources), 2), dtype='<i4')
+			edges[:, 0] = sources
+			edges[:, 1] = targets
+			edgeFile.write(edges.tostring())
+
+"""
+FUNCTION: readBinaryEdgeList
+-----------------------------
+Parameters:
+	filename - a file written by exportBinaryEdgeList
+
+Returns: an (numEdges x 2) int32 array of the (source, target) node IDs of
+every edge in the file.
+-----------------------------
+"""
+def readBinaryEdgeList(filename):
+	with gzip.open(filename, 'rb') as edgeFile:
+		return np.frombuffer(edgeFile.read(), dtype='<i4').reshape(-1, 2)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Export the movie graph.")
+	parser.add_argument("--format", choices=["csv", "gexf", "edgelist"],
+		default="csv", help="the format to export to")
+	parser.add_argument("--columns", nargs="*", choices=OptionalColumns,
+		default=[], help="optional node columns to include")
+	parser.add_argument("--output", default="graph",
+		help="output filename prefix")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	arrays = ga.GraphArrays.fromGraph(graph)
+	if args.format == "csv":
+		exportCSV(arrays, args.output + "-nodes.csv",
+			args.output + "-edges.csv", args.columns)
+	elif args.format == "gexf":
+		exportGEXF(arrays, args.output + ".gexf", args.columns)
+	else:
+		exportBinaryEdgeList(arrays, args.output + ".edges.gz")
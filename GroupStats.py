@@ -0,0 +1,398 @@
+import abc
+import argparse
+import CommunityDetection
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import DiversityScore as ds
+import numpy as np
+import sys
+
+"""
+CLASS: GroupKey
+----------------
+Base class for the keys movies can be grouped by.  A key explodes the movies
+into (movie, group) pairs, so a movie can be in any number of groups for one
+key (e.g. one per genre), or in none (e.g. a movie without a budget for budget
+deciles).  Subclasses must implement explode, and a key missing it fails when
+it is created.
+----------------
+"""
+class GroupKey(object):
+	__metaclass__ = abc.ABCMeta
+	name = None
+
+	"""
+	METHOD: explode
+	----------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the movie graph
+
+	Returns: a tuple (positions, codes, labels).  positions and codes are
+	parallel arrays of (movie, group) pairs, where positions are indices into
+	arrays.movieIds sorted in increasing order, and codes index into labels,
+	the list of group labels.
+	----------------
+	"""
+	@abc.abstractmethod
+	def explode(self, arrays):
+		pass
+
+"""
+CLASS: CategoryKey
+-------------------
+Groups movies by a categorical movie attribute of the snapshot (e.g.
+contentRating, with vocabulary contentRatingNames).  Movies without a value
+are left out.
+-------------------
+"""
+class CategoryKey(GroupKey):
+
+	def __init__(self, name, vocabularyName):
+		self.name = name
+		self.vocabularyName = vocabularyName
+
+	def explode(self, arrays):
+		codes = getattr(arrays, self.name)[arrays.movieIds]
+		positions = np.flatnonzero(codes != ga.UnknownCode)
+		return positions, codes[positions], getattr(arrays, self.vocabularyName)
+
+"""
+CLASS: GenreKey
+----------------
+Groups movies by genre, with a movie in one group per genre.  The (movie,
+genre) pairs are the snapshot's CSR genre arrays.
+----------------
+"""
+class GenreKey(GroupKey):
+	name = "genre"
+
+	def explode(self, arrays):
+		return arrays.genreMoviePositions(), arrays.genreCodes, arrays.genreNames
+
+"""
+CLASS: CastCommunityKey
+------------------------
+Groups movies by the co-star communities of their cast (arrays.community),
+with a movie in one group per community among its actors.  If no actor has a
+community yet, they are labelled first with CommunityDetection.labelCommunities.
+------------------------
+"""
+class CastCommunityKey(GroupKey):
+	name = "castCommunity"
+
+	def explode(self, arrays):
+		if (arrays.community[arrays.castIds] == ga.UnknownCode).all():
+			CommunityDetection.labelCommunities(arrays)
+		communities = arrays.community[arrays.castIds].astype(np.int64)
+		known = communities != ga.UnknownCode
+		labels = np.unique(communities[known])
+		if len(labels) == 0:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), []
+		pairs = np.unique(arrays.castMoviePositions()[known] * len(labels) +
+			np.searchsorted(labels, communities[known]))
+		return pairs // len(labels), pairs % len(labels), ["community %i" %
+			community for community in labels]
+
+"""
+CLASS: BinnedKey
+-----------------
+Groups movies by bins of a numeric per-node attribute (e.g. releaseYear or
+imdbScore), with fixed bin edges.  Bin i holds values in [edges[i],
+edges[i + 1]); movies outside every bin are left out.
+-----------------
+"""
+class BinnedKey(GroupKey):
+
+	def __init__(self, name, column, edges):
+		self.name = name
+		self.column = column
+		self.edges = np.asarray(edges)
+
+	def explode(self, arrays):
+		values = getattr(arrays, self.column)[arrays.movieIds]
+		return self.binValues(values, self.edges)
+
+	"""
+	METHOD: binValues
+	------------------
+	Parameters:
+		values - the per-movie values to bin
+		edges - the sorted bin edges
+
+	Returns: the exploded (positions, codes, labels) for the bins, labelled
+	"start-end".
+	------------------
+	"""
+	def binValues(self, values, edges):
+		codes = np.searchsorted(edges, values, side="right") - 1
+		positions = np.flatnonzero((codes >= 0) & (codes < len(edges) - 1))
+		labels = ["%g-%g" % (start, end) for start, end in zip(edges[:-1],
+			edges[1:])]
+		return positions, codes[positions], labels
+
+"""
+CLASS: DecadeKey
+-----------------
+Groups movies by the decade of their release year, labelled e.g. "1990s".
+Only decades with movies get a group.
+-----------------
+"""
+class DecadeKey(GroupKey):
+	name = "decade"
+
+	def explode(self, arrays):
+		decades = arrays.releaseYear[arrays.movieIds] // 10 * 10
+		labels, codes = np.unique(decades, return_inverse=True)
+		return np.arange(len(decades)), codes, ["%is" % decade
+			for decade in labels]
+
+"""
+CLASS: QuantileKey
+-------------------
+Groups movies into numBins equal-count bins (e.g. deciles) of a numeric
+per-node attribute.  Movies with a value of 0 (an unknown budget or gross) are
+left out, and the bin edges are the quantiles of the remaining values.
+-------------------
+"""
+class QuantileKey(BinnedKey):
+
+	def __init__(self, name, column, numBins):
+		self.name = name
+		self.column = column
+		self.numBins = numBins
+
+	def explode(self, arrays):
+		values = getattr(arrays, self.column)[arrays.movieIds]
+		known = np.flatnonzero(values != 0)
+		if len(known) == 0:
+			return known, np.zeros(0, dtype=np.int64), []
+
+		edges = np.percentile(values[known],
+			np.linspace(0, 100, self.numBins + 1))
+		codes = np.searchsorted(edges[1:-1], values[known], side="right")
+		labels = ["%i (%g-%g)" % (i + 1, start, end) for i, (start, end) in
+			enumerate(zip(edges[:-1], edges[1:]))]
+		return known, codes, labels
+
+
+# Map from key name -> function of no arguments creating a new GroupKey
+GroupKeys = {
+	"genre": GenreKey,
+	"castCommunity": CastCommunityKey,
+	"contentRating": lambda: CategoryKey("contentRating", "contentRatingNames"),
+	"language": lambda: CategoryKey("language", "languageNames"),
+	"decade": DecadeKey,
+	"budgetDecile": lambda: QuantileKey("budgetDecile", "budget", 10),
+	"grossDecile": lambda: QuantileKey("grossDecile", "gross", 10),
+	"imdbScore": lambda: BinnedKey("imdbScore", "imdbScore", range(11)),
+}
+
+"""
+FUNCTION: createKey
+--------------------
+Parameters:
+	key - a key name from GroupKeys, or a GroupKey
+
+Returns: a new instance of the named key, or the given GroupKey.
+--------------------
+"""
+def createKey(key):
+	if isinstance(key, GroupKey):
+		return key
+	if key not in GroupKeys:
+		raise ValueError("Unknown group key %s (known keys: %s)" % (key,
+			", ".join(sorted(GroupKeys))))
+	return GroupKeys[key]()
+
+
+"""
+CLASS: MovieGroupBy
+--------------------
+Breaks movie diversity statistics down by any combination of group keys.  The
+per-movie scores and profit ratios are computed once for every movie when the
+engine is created; each groupBy call then explodes the movies by its keys and
+aggregates every statistic for every group with one bincount each.
+--------------------
+"""
+class MovieGroupBy(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the movie graph
+
+	Returns: a MovieGroupBy over every movie in the snapshot.
+	-------------
+	"""
+	def __init__(self, arrays):
+		self.arrays = arrays
+		racialScores, genderScores = ds.movieScoreArrays(arrays)
+		self.scored = arrays.castSizes() > 0
+		self.racialScores = np.where(self.scored, racialScores, 0.0)
+		self.genderScores = np.where(self.scored, genderScores, 0.0)
+		self.allWhite = self.scored & (self.racialScores == 0)
+		self.allMale = self.scored & (self.genderScores == 0)
+
+		budget = arrays.budget[arrays.movieIds]
+		gross = arrays.gross[arrays.movieIds]
+		self.hasProfit = budget != 0
+		self.profitRatios = np.zeros(len(arrays.movieIds))
+		self.profitRatios[self.hasProfit] = gross[self.hasProfit] / \
+			budget[self.hasProfit]
+
+	"""
+	CLASS METHOD: fromGraph
+	------------------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph to group
+
+	Returns: a MovieGroupBy over every movie in the graph.
+	------------------------
+	"""
+	@classmethod
+	def fromGraph(cls, graph):
+		return cls(ga.GraphArrays.fromGraph(graph))
+
+	"""
+	METHOD: explode
+	----------------
+	Parameters:
+		keys - a list of key names and/or GroupKeys
+		positions - the sorted indices into arrays.movieIds of the movies to
+					group
+
+	Returns: a tuple (rows, groupCodes, keyLabels).  rows and groupCodes are
+	parallel arrays with one entry per (movie, group) pair, where rows are
+	movie positions and groupCodes combine the codes of every key (in mixed
+	radix, first key most significant).  keyLabels is the list of each key's
+	labels.
+
+	A movie with several groups for more than one key (e.g. genre x language)
+	gets a pair for every combination of its groups.
+	----------------
+	"""
+	def explode(self, keys, positions):
+		numMovies = len(self.arrays.movieIds)
+		rows = positions
+		groupCodes = np.zeros(len(rows), dtype=np.int64)
+		keyLabels = []
+		for key in keys:
+			keyPositions, keyCodes, labels = key.explode(self.arrays)
+			keyLabels.append(labels)
+
+			# For each current pair, the range of this key's pairs for its movie
+			keyCounts = np.bincount(keyPositions, minlength=numMovies)
+			keyOffsets = np.cumsum(keyCounts) - keyCounts
+			counts = keyCounts[rows]
+			runStarts = np.cumsum(counts) - counts
+			pairs = np.repeat(np.arange(len(rows)), counts)
+			withinRun = np.arange(len(pairs)) - runStarts[pairs]
+
+			rows = rows[pairs]
+			groupCodes = groupCodes[pairs] * max(len(labels), 1) + \
+				keyCodes[keyOffsets[rows] + withinRun]
+		return rows, groupCodes, keyLabels
+
+	"""
+	METHOD: groupBy
+	----------------
+	Parameters:
+		keys - a list of key names (see GroupKeys) and/or GroupKeys
+		movieIds - optional node IDs of the movies to include.  Defaults to
+					every movie.
+
+	Returns: a dict of columns, each an array with one entry per non-empty
+	group, sorted by group:
+
+		one column per key, named after the key, with the group's label
+		numMovies, numScoredMovies (movies with a cast),
+		avgRacialDiversityScore, avgGenderDiversityScore,
+		allWhiteShare, allMaleShare (shares of scored movies),
+		numProfitMovies (movies with a budget), meanProfitRatio
+
+	Averages over no movies are NaN.
+	----------------
+	"""
+	def groupBy(self, keys, movieIds=None):
+		keys = [createKey(key) for key in keys]
+		if movieIds is None:
+			positions = np.arange(len(self.arrays.movieIds))
+		else:
+			positions = self.arrays.moviePosition[np.asarray(movieIds,
+				dtype=np.int64)]
+			positions = np.unique(positions[positions >= 0])
+
+		rows, groupCodes, keyLabels = self.explode(keys, positions)
+		groups, groupIndices = np.unique(groupCodes, return_inverse=True)
+		numGroups = len(groups)
+
+		def total(perMovie=None):
+			weights = None if perMovie is None else perMovie[rows]
+			return np.bincount(groupIndices, weights=weights,
+				minlength=numGroups)
+
+		table = {}
+		dims = [max(len(labels), 1) for labels in keyLabels]
+		if numGroups > 0:
+			keyCodes = np.unravel_index(groups, dims)
+		else:
+			keyCodes = [groups] * len(keys)
+		for key, labels, codes in zip(keys, keyLabels, keyCodes):
+			table[key.name] = np.array(labels, dtype=object)[codes] if labels \
+				else np.zeros(0, dtype=object)
+
+		numScored = total(self.scored)
+		numProfit = total(self.hasProfit)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			table["numMovies"] = total().astype(np.int64)
+			table["numScoredMovies"] = numScored.astype(np.int64)
+			table["avgRacialDiversityScore"] = total(self.racialScores) / numScored
+			table["avgGenderDiversityScore"] = total(self.genderScores) / numScored
+			table["allWhiteShare"] = total(self.allWhite) / numScored
+			table["allMaleShare"] = total(self.allMale) / numScored
+			table["numProfitMovies"] = numProfit.astype(np.int64)
+			table["meanProfitRatio"] = total(self.profitRatios) / numProfit
+		return table
+
+# Statistic columns of a groupBy table, in display order
+StatColumns = ["numMovies", "numScoredMovies", "avgRacialDiversityScore",
+	"avgGenderDiversityScore", "allWhiteShare", "allMaleShare",
+	"numProfitMovies", "meanProfitRatio"]
+
+"""
+FUNCTION: writeTableCSV
+------------------------
+Parameters:
+	table - a table returned by MovieGroupBy.groupBy
+	keyNames - the names of the key columns in the table
+	csvfile - the open file to write the table to
+
+Returns: NA
+------------------------
+"""
+def writeTableCSV(table, keyNames, csvfile):
+	writer = csv.writer(csvfile)
+	columns = keyNames + StatColumns
+	writer.writerow(columns)
+	writer.writerows(zip(*[table[column].tolist() for column in columns]))
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Break movie diversity statistics down by group.")
+	parser.add_argument("keys", nargs="+", choices=sorted(GroupKeys),
+		help="the keys to group movies by")
+	parser.add_argument("--output", help="CSV file to write (default: stdout)")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	keys = [createKey(key) for key in args.keys]
+	table = MovieGroupBy.fromGraph(graph).groupBy(keys)
+	keyNames = [key.name for key in keys]
+	if args.output:
+		with open(args.output, 'wb') as csvfile:
+			writeTableCSV(table, keyNames, csvfile)
+	else:
+		writeTableCSV(table, keyNames, sys.stdout)
@@ -0,0 +1,660 @@
+import abc
+import argparse
+import bisect
+import csv
+from dataset import GraphArrays as ga
+from dataset import ReadMovieGraph
+import DiversityScore as ds
+from graphFunctions import actorAssortativity
+from graphFunctions import actorDirectorAssortativity
+from graphFunctions import actorModularity
+import inspect
+import networkx as nx
+import numpy as np
+import progressbar
+import TimeSeries
+
+"""
+CLASS: Sweep
+-------------
+Per-movie quantities shared by every metric over a whole sweep, computed once
+for every movie in one vectorized pass before the first step.  All arrays are
+parallel to arrays.movieIds.
+
+	graph - the complete graph being swept
+	graphDict - a map from names -> node IDs for the graph
+	arrays - a GraphArrays snapshot of the graph
+	racialScores, genderScores - movie diversity scores (NaN without a cast)
+	scored - whether each movie has a cast (and so, scores)
+	profitRatios - gross/budget (NaN for movies without a budget)
+-------------
+"""
+class Sweep(object):
+
+	def __init__(self, graph, graphDict):
+		self.graph = graph
+		self.graphDict = graphDict
+		self.arrays = ga.GraphArrays.fromGraph(graph)
+		self.racialScores, self.genderScores = ds.movieScoreArrays(self.arrays)
+		self.scored = self.arrays.castSizes() > 0
+
+		budget = self.arrays.budget[self.arrays.movieIds]
+		gross = self.arrays.gross[self.arrays.movieIds]
+		self.profitRatios = np.full(len(self.arrays.movieIds), np.nan)
+		hasBudget = budget != 0
+		self.profitRatios[hasBudget] = gross[hasBudget] / budget[hasBudget]
+
+"""
+CLASS: SweepStep
+-----------------
+One year of a sweep, passed to every metric in turn.  Per-step intermediates
+(the movies entering and leaving, their casts, ...) are computed the first time
+a metric asks for them and shared with every later metric in the same step.
+
+	sweep - the Sweep being stepped through
+	year - the year of this step
+	addedPositions - indices into sweep.arrays.movieIds of the movies released
+					this year
+	removedPositions - indices of the movies that left the window this year
+	graph - the time series graph for this year, if any registered metric
+			needs it (see SweepMetric.needsGraph), and None otherwise
+-----------------
+"""
+class SweepStep(object):
+
+	def __init__(self, sweep, year, addedPositions, removedPositions, graph):
+		self.sweep = sweep
+		self.year = year
+		self.addedPositions = addedPositions
+		self.removedPositions = removedPositions
+		self.graph = graph
+		self.cache = {}
+
+	"""
+	METHOD: shared
+	---------------
+	Parameters:
+		name - the name of a per-step intermediate
+		compute - a function of no arguments that computes it
+
+	Returns: the named intermediate, computed by the first metric to ask for
+	it in this step.
+	---------------
+	"""
+	def shared(self, name, compute):
+		if name not in self.cache:
+			self.cache[name] = compute()
+		return self.cache[name]
+
+	def addedMovieIds(self):
+		return self.shared("addedMovieIds", lambda:
+			self.sweep.arrays.movieIds[self.addedPositions].tolist())
+
+	def removedMovieIds(self):
+		return self.shared("removedMovieIds", lambda:
+			self.sweep.arrays.movieIds[self.removedPositions].tolist())
+
+	"""
+	METHODS: scoredAdded and scoredRemoved
+	---------------------------------------
+	Parameters: NA
+
+	Returns: the positions of the added (or removed) movies that have a cast.
+	---------------------------------------
+	"""
+	def scoredAdded(self):
+		return self.shared("scoredAdded", lambda:
+			self.addedPositions[self.sweep.scored[self.addedPositions]])
+
+	def scoredRemoved(self):
+		return self.shared("scoredRemoved", lambda:
+			self.removedPositions[self.sweep.scored[self.removedPositions]])
+
+	"""
+	METHODS: addedCastIds and removedCastIds
+	-----------------------------------------
+	Parameters: NA
+
+	Returns: the concatenated casts of the added (or removed) movies.
+	-----------------------------------------
+	"""
+	def addedCastIds(self):
+		return self.shared("addedCastIds", lambda:
+			self.sweep.arrays.castIdsFor(self.addedPositions))
+
+	def removedCastIds(self):
+		return self.shared("removedCastIds", lambda:
+			self.sweep.arrays.castIdsFor(self.removedPositions))
+
+
+"""
+CLASS: SweepMetric
+-------------------
+Base class for metrics evaluated by sweepMetrics.  A metric produces one value
+per label at every step.  Metrics that set needsGraph are given the NetworkX
+time series graph at each step; the graph is only built if some metric in the
+sweep needs it.  Subclasses must implement update, and a metric missing it
+fails when it is created rather than partway through a sweep.
+-------------------
+"""
+class SweepMetric(object):
+	__metaclass__ = abc.ABCMeta
+	labels = []
+	needsGraph = False
+
+	"""
+	METHOD: reset
+	--------------
+	Parameters:
+		sweep - the Sweep about to be stepped through
+
+	Returns: NA
+
+	Clears all accumulated state, before the first step of a sweep.
+	--------------
+	"""
+	def reset(self, sweep):
+		pass
+
+	"""
+	METHOD: update
+	---------------
+	Parameters:
+		step - the SweepStep for the next year
+
+	Returns: the list of this metric's values at that step, one per label.
+	---------------
+	"""
+	@abc.abstractmethod
+	def update(self, step):
+		pass
+
+"""
+CLASS: DiversityScoreMetric
+----------------------------
+The four averages of combine (and DiversityScoreAccumulator) - director gender,
+director racial, movie gender and movie racial diversity scores - maintained
+with vectorized updates from the shared movie scores.
+----------------------------
+"""
+class DiversityScoreMetric(SweepMetric):
+	labels = ["Director gender", "Director racial", "Movie gender",
+		"Movie racial"]
+
+	def reset(self, sweep):
+		self.sweep = sweep
+		numNodes = sweep.arrays.numNodes
+		self.numMovies = 0
+		self.movieRacialSum = 0.0
+		self.movieGenderSum = 0.0
+
+		# Per-director score sums and movie counts, and the running totals of
+		# the directors' averages
+		self.directorRacial = np.zeros(numNodes)
+		self.directorGender = np.zeros(numNodes)
+		self.directorCounts = np.zeros(numNodes, dtype=np.int64)
+		self.numDirectors = 0
+		self.directorRacialSum = 0.0
+		self.directorGenderSum = 0.0
+
+	def update(self, step):
+		self.updateMovies(step.scoredRemoved(), -1)
+		self.updateMovies(step.scoredAdded(), 1)
+
+		def average(total, count):
+			return total / count if count > 0 else float("nan")
+		return [average(self.directorGenderSum, self.numDirectors),
+			average(self.directorRacialSum, self.numDirectors),
+			average(self.movieGenderSum, self.numMovies),
+			average(self.movieRacialSum, self.numMovies)]
+
+	"""
+	METHOD: updateMovies
+	---------------------
+	Parameters:
+		positions - the positions of scored movies entering or leaving
+		sign - 1 if they are entering, -1 if they are leaving
+
+	Returns: NA
+
+	Updates the movie totals, and replaces the old averages of every affected
+	director with their new averages in the director totals.
+	---------------------
+	"""
+	def updateMovies(self, positions, sign):
+		if len(positions) == 0:
+			return
+		racial = self.sweep.racialScores[positions]
+		gender = self.sweep.genderScores[positions]
+		self.numMovies += sign * len(positions)
+		self.movieRacialSum += sign * racial.sum()
+		self.movieGenderSum += sign * gender.sum()
+
+		directorIds = self.sweep.arrays.directorIds[positions]
+		hasDirector = directorIds >= 0
+		directorIds = directorIds[hasDirector]
+		affected = np.unique(directorIds)
+		self.addDirectorAverages(affected, -1)
+		np.add.at(self.directorRacial, directorIds, sign * racial[hasDirector])
+		np.add.at(self.directorGender, directorIds, sign * gender[hasDirector])
+		np.add.at(self.directorCounts, directorIds, sign)
+
+		# Clear rounding error left behind by directors with no movies left
+		empty = affected[self.directorCounts[affected] == 0]
+		self.directorRacial[empty] = 0.0
+		self.directorGender[empty] = 0.0
+		self.addDirectorAverages(affected, 1)
+
+	def addDirectorAverages(self, directorIds, sign):
+		counts = self.directorCounts[directorIds]
+		directorIds = directorIds[counts > 0]
+		counts = counts[counts > 0]
+		self.numDirectors += sign * len(directorIds)
+		self.directorRacialSum += sign * (self.directorRacial[directorIds] /
+			counts).sum()
+		self.directorGenderSum += sign * (self.directorGender[directorIds] /
+			counts).sum()
+
+"""
+CLASS: RunningCorrelation
+--------------------------
+Running sums for the Pearson correlation between two variables, over a set of
+(x, y) pairs that can be added and removed in batches.
+--------------------------
+"""
+class RunningCorrelation(object):
+
+	def __init__(self):
+		self.n = 0
+		self.sumX = 0.0
+		self.sumY = 0.0
+		self.sumXX = 0.0
+		self.sumYY = 0.0
+		self.sumXY = 0.0
+
+	"""
+	METHOD: update
+	---------------
+	Parameters:
+		x, y - parallel arrays of the pairs to add or remove
+		sign - 1 to add the pairs, -1 to remove them
+
+	Returns: NA
+	---------------
+	"""
+	def update(self, x, y, sign=1):
+		self.n += sign * len(x)
+		self.sumX += sign * np.sum(x)
+		self.sumY += sign * np.sum(y)
+		self.sumXX += sign * np.dot(x, x)
+		self.sumYY += sign * np.dot(y, y)
+		self.sumXY += sign * np.dot(x, y)
+
+	"""
+	METHOD: correlation
+	--------------------
+	Parameters: NA
+
+	Returns: the correlation coefficient of the current pairs, or NaN if it is
+	undefined (fewer than two pairs, or a variable with no variance).
+	--------------------
+	"""
+	def correlation(self):
+		covariance = self.n * self.sumXY - self.sumX * self.sumY
+		varianceX = self.n * self.sumXX - self.sumX ** 2
+		varianceY = self.n * self.sumYY - self.sumY ** 2
+		if self.n < 2 or varianceX <= 0 or varianceY <= 0:
+			return float("nan")
+		return covariance / np.sqrt(varianceX * varianceY)
+
+"""
+CLASS: ProfitCorrelationMetric
+-------------------------------
+The racial and gender diversity score / profit ratio correlations of combine2
+(Analysis.diversityProfitCorrelation), over movies with a cast and a budget.
+
+By default the correlations are over the movies released in each step, as in
+combine2.  If cumulative, they are over every movie in the time series graph,
+kept as running sums.
+-------------------------------
+"""
+class ProfitCorrelationMetric(SweepMetric):
+
+	def __init__(self, cumulative=False):
+		self.cumulative = cumulative
+		self.labels = ["Race profit correlation", "Gender profit correlation"]
+		if cumulative:
+			self.labels = ["Cumulative " + label.lower() for label in self.labels]
+
+	def reset(self, sweep):
+		self.sweep = sweep
+		self.racial = RunningCorrelation()
+		self.gender = RunningCorrelation()
+
+	def update(self, step):
+		if not self.cumulative:
+			self.reset(self.sweep)
+		else:
+			self.updateMovies(step.scoredRemoved(), -1)
+		self.updateMovies(step.scoredAdded(), 1)
+		return [self.racial.correlation(), self.gender.correlation()]
+
+	def updateMovies(self, positions, sign):
+		profitRatios = self.sweep.profitRatios[positions]
+		positions = positions[~np.isnan(profitRatios)]
+		profitRatios = profitRatios[~np.isnan(profitRatios)]
+		self.racial.update(self.sweep.racialScores[positions], profitRatios, sign)
+		self.gender.update(self.sweep.genderScores[positions], profitRatios, sign)
+
+"""
+CLASS: CastCompositionMetric
+-----------------------------
+The share of cast credits (one per actor per movie) going to non-White and to
+female actors, over every movie in the time series graph.
+-----------------------------
+"""
+class CastCompositionMetric(SweepMetric):
+	labels = ["Non-White cast share", "Female cast share"]
+
+	def reset(self, sweep):
+		self.sweep = sweep
+		self.counts = np.zeros(3)
+
+	def update(self, step):
+		self.counts -= self.castCounts(step.removedCastIds())
+		self.counts += self.castCounts(step.addedCastIds())
+		numCredits, numNonWhite, numFemale = self.counts
+		if numCredits == 0:
+			return [float("nan"), float("nan")]
+		return [numNonWhite / numCredits, numFemale / numCredits]
+
+	def castCounts(self, castIds):
+		arrays = self.sweep.arrays
+		return np.array([len(castIds),
+			np.count_nonzero(arrays.race[castIds] != ga.WhiteCode),
+			np.count_nonzero(arrays.gender[castIds] == ga.FemaleCode)])
+
+"""
+CLASS: GraphFunctionMetric
+---------------------------
+Adapts a timeSeries-style function (taking the time series graph, the movie IDs
+released this step and, optionally, graphDict) to a sweep metric.  Each step,
+the function is called on the time series graph as it was in timeSeries.
+---------------------------
+"""
+class GraphFunctionMetric(SweepMetric):
+	needsGraph = True
+
+	def __init__(self, timeSeriesFunc, labels):
+		self.timeSeriesFunc = timeSeriesFunc
+		self.labels = labels
+		self.takesGraphDict = len(inspect.getargspec(timeSeriesFunc).args) > 2
+
+	def update(self, step):
+		args = [step.graph, step.addedMovieIds()]
+		if self.takesGraphDict:
+			args.append(step.sweep.graphDict)
+		# Functions may return a single value, a list, or a list of one-element
+		# lists (like combine)
+		return np.ravel(self.timeSeriesFunc(*args)).tolist()
+
+"""
+CLASS: AccumulatorMetric
+-------------------------
+Adapts a time series accumulator (see TimeSeries.DiversityScoreAccumulator)
+to a sweep metric.
+-------------------------
+"""
+class AccumulatorMetric(SweepMetric):
+
+	def __init__(self, accumulator, labels):
+		self.accumulator = accumulator
+		self.labels = labels
+
+	def reset(self, sweep):
+		self.graph = sweep.graph
+		self.accumulator.reset()
+
+	def update(self, step):
+		self.accumulator.removeMovies(self.graph, step.removedMovieIds())
+		self.accumulator.addMovies(self.graph, step.addedMovieIds())
+		return list(self.accumulator.values())
+
+
+# ------ METRIC REGISTRY -------
+
+# Map from metric name -> function of no arguments creating a new SweepMetric
+MetricFactories = {}
+
+"""
+FUNCTION: registerMetric
+-------------------------
+Parameters:
+	name - the name to register the metric under
+	factory - a function of no arguments returning a new SweepMetric
+
+Returns: NA
+-------------------------
+"""
+def registerMetric(name, factory):
+	MetricFactories[name] = factory
+
+"""
+FUNCTION: createMetric
+-----------------------
+Parameters:
+	metric - a registered metric name, or a SweepMetric
+
+Returns: a new instance of the named metric, or the given SweepMetric.
+-----------------------
+"""
+def createMetric(metric):
+	if isinstance(metric, SweepMetric):
+		return metric
+	if metric not in MetricFactories:
+		raise ValueError("Unknown metric %s (registered metrics: %s)" % (
+			metric, ", ".join(sorted(MetricFactories))))
+	return MetricFactories[metric]()
+
+registerMetric("diversityScores", DiversityScoreMetric)
+registerMetric("profitCorrelation", ProfitCorrelationMetric)
+registerMetric("cumulativeProfitCorrelation",
+	lambda: ProfitCorrelationMetric(cumulative=True))
+registerMetric("castComposition", CastCompositionMetric)
+registerMetric("actorAssortativity", lambda: GraphFunctionMetric(
+	actorAssortativity, ["Race assortativity", "Gender assortativity"]))
+registerMetric("actorDirectorAssortativity", lambda: GraphFunctionMetric(
+	actorDirectorAssortativity, ["Actor-director same race",
+	"Actor-director same gender"]))
+registerMetric("actorModularity", lambda: GraphFunctionMetric(
+	actorModularity, ["Race modularity", "Gender modularity"]))
+
+
+"""
+CLASS: MetricSeries
+--------------------
+The result of a sweep: a (years x columns) array of metric values, with the
+label of each column.  Can be saved and loaded without any plotting, and
+rendered separately.
+
+	years - the array of years swept
+	labels - the label of each column
+	values - the 2D float array of values, values[i, j] being column j at
+			years[i]
+--------------------
+"""
+class MetricSeries(object):
+
+	def __init__(self, years, labels, values):
+		self.years = np.asarray(years)
+		self.labels = list(labels)
+		self.values = np.asarray(values, dtype=np.float64).reshape(
+			len(self.years), len(self.labels))
+
+	"""
+	METHOD: column
+	---------------
+	Parameters:
+		label - the label of a column
+
+	Returns: the array of the column's values, parallel to years.
+	---------------
+	"""
+	def column(self, label):
+		return self.values[:, self.labels.index(label)]
+
+	"""
+	METHOD: save
+	-------------
+	Parameters:
+		filename - the .npz file to save the series to
+
+	Returns: NA
+	-------------
+	"""
+	def save(self, filename):
+		np.savez(filename, years=self.years, labels=np.array(self.labels),
+			values=self.values)
+
+	"""
+	CLASS METHOD: load
+	-------------------
+	Parameters:
+		filename - a .npz file written by save
+
+	Returns: the saved MetricSeries.
+	-------------------
+	"""
+	@classmethod
+	def load(cls, filename):
+		data = np.load(filename)
+		return cls(data["years"], data["labels"].tolist(), data["values"])
+
+	"""
+	METHOD: saveCSV
+	----------------
+	Parameters:
+		filename - the CSV file to write the series to, one row per year
+
+	Returns: NA
+	----------------
+	"""
+	def saveCSV(self, filename):
+		with open(filename, 'wb') as csvfile:
+			writer = csv.writer(csvfile)
+			writer.writerow(["Year"] + self.labels)
+			for year, row in zip(self.years.tolist(), self.values.tolist()):
+				writer.writerow([year] + row)
+
+	"""
+	METHOD: render
+	---------------
+	Parameters:
+		title - the title of the graph
+		yLabel - the label for the y axis
+		labels - the labels of the columns to plot (defaults to all)
+		filename - if given, the image file to save the plot to, instead of
+					showing it (see TimeSeries.plotTimeSeries)
+
+	Returns: NA
+	---------------
+	"""
+	def render(self, title, yLabel, labels=None, filename=None):
+		labels = labels or self.labels
+		TimeSeries.plotTimeSeries(self.years.tolist(),
+			[self.column(label).tolist() for label in labels], title, yLabel,
+			labels, filename)
+
+"""
+FUNCTION: sweepMetrics
+-----------------------
+Parameters:
+	graph - the NetworkX DiGraph to do the time series on
+	graphDict - a dict from names -> node ids for the given graph
+	metrics - a list of registered metric names and/or SweepMetrics
+	window - optional window of years to include at each step, for a
+				non-cumulative time series (see TimeSeries.timeSeries)
+	showProgress - whether to display a progress bar
+
+Returns: a MetricSeries with a column for every label of every metric, and a
+row for every year with a movie release.
+
+Steps through the years once for all of the metrics.  The per-movie scores are
+computed once up front, each step's intermediates are shared between metrics
+(see SweepStep), and the NetworkX time series graph is only built if some
+metric needs it.  Nothing is plotted, so this runs without a display.
+-----------------------
+"""
+def sweepMetrics(graph, graphDict, metrics, window=None, showProgress=False):
+	metrics = [createMetric(metric) for metric in metrics]
+	labels = [label for metric in metrics for label in metric.labels]
+	if len(set(labels)) != len(labels):
+		raise ValueError("Metric labels must be unique: %s" % labels)
+
+	sweep = Sweep(graph, graphDict)
+	for metric in metrics:
+		metric.reset(sweep)
+
+	# Movie positions sorted by release year, and the range of each year
+	movieYears = sweep.arrays.releaseYear[sweep.arrays.movieIds]
+	order = np.argsort(movieYears, kind="mergesort")
+	sortedYears = movieYears[order].tolist()
+	years = sorted(set(sortedYears))
+
+	timeSeriesGraph = nx.DiGraph() if any(metric.needsGraph
+		for metric in metrics) else None
+	values = np.empty((len(years), len(labels)))
+	startIndex = 0
+	indices = range(len(years))
+	if showProgress:
+		indices = progressbar.ProgressBar()(indices)
+	for i in indices:
+		year = years[i]
+		newStartIndex = bisect.bisect_left(sortedYears,
+			TimeSeries.windowStart(year, window))
+		removedPositions = order[startIndex:newStartIndex]
+		startIndex = newStartIndex
+		addedPositions = order[bisect.bisect_left(sortedYears, year):
+			bisect.bisect_right(sortedYears, year)]
+
+		step = SweepStep(sweep, year, addedPositions, removedPositions,
+			timeSeriesGraph)
+		if timeSeriesGraph is not None:
+			if len(removedPositions):
+				TimeSeries.removeExpiredMovies(timeSeriesGraph,
+					step.removedMovieIds())
+			TimeSeries.generateNextTimeStep(timeSeriesGraph, graph,
+				step.addedMovieIds(), year)
+
+		column = 0
+		for metric in metrics:
+			metricValues = metric.update(step)
+			values[i, column:column + len(metric.labels)] = metricValues
+			column += len(metric.labels)
+
+	return MetricSeries(years, labels, values)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Compute time series metrics in one sweep over the years.")
+	parser.add_argument("metrics", nargs="+", choices=sorted(MetricFactories),
+		help="the registered metrics to compute")
+	parser.add_argument("--window", type=int,
+		help="number of years in a trailing window (default: cumulative)")
+	parser.add_argument("--output", default="timeSeries.npz",
+		help="the .npz (or .csv) file to save the series to")
+	parser.add_argument("--plot", help="also render the series to this image")
+	args = parser.parse_args()
+
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	graph, graphDict = TimeSeries.filterGraph(graph, graphDict)
+	series = sweepMetrics(graph, graphDict, args.metrics, window=args.window,
+		showProgress=True)
+	if args.output.endswith(".csv"):
+		series.saveCSV(args.output)
+	else:
+		series.save(args.output)
+	if args.plot:
+		series.render("Hollywood Diversity Over Time", "Value",
+			filename=args.plot)
@@ -0,0 +1,516 @@
+import collections
+import cPickle as pickle
+from dataset import GraphArrays as ga
+import DiversityScore as ds
+from MetricSweep import RunningCorrelation
+import numpy as np
+import os
+
+# Score schemes kept for every movie and director: None for the unweighted
+# diversity scores, then each of DiversityScore.WeightSchemes
+Schemes = [None] + ds.WeightSchemes
+
+"""
+CLASS: OnlineStats
+-------------------
+Keeps the aggregates of DiversityScore.movieStats, actorStats and directorStats
+and of Analysis.diversityProfitCorrelation up to date as movies are added to
+and removed from a collection, without passes over the graph.  Adding or
+removing a movie costs time proportional to its cast size.
+
+Movies, directors and cast members are given as (nodeId, attributes) pairs,
+like the items of graph.nodes(data=True), with the attributes the graph keeps
+on its nodes (race and gender for people, budget and gross for movies).  A
+cast member can also be a (nodeId, attributes, credit) triple, where credit
+holds the attributes of the movie -> actor edge ("billing" and
+"facebookLikes") for the weighted scores.
+
+People are counted while they have at least one movie in the collection, as
+actors if they are in its cast and as directors if they directed it.  Their
+race and gender are taken from the first movie they appear in.
+
+The state is plain Python data, so an OnlineStats can be pickled; save and load
+write and read it atomically, so it can be kept across restarts.
+-------------------
+"""
+class OnlineStats(object):
+
+	def __init__(self):
+		# Map from movie ID -> (director ID or None, tuple of cast IDs, dict from
+		# scheme -> (racial score, gender score) or None if unscored)
+		self.movies = {}
+		self.numMovies = 0
+		self.numAllWhiteMovies = 0
+		self.numAllMaleMovies = 0
+		self.numAllFemaleMovies = 0
+		self.numHalfFemaleMovies = 0
+
+		# Map from scheme -> [racial score sum, gender score sum, # scored movies]
+		self.movieScoreSums = dict((scheme, [0.0, 0.0, 0]) for scheme in Schemes)
+		self.racialProfit = RunningCorrelation()
+		self.genderProfit = RunningCorrelation()
+
+		# Map from actor ID -> [race, gender, # movies]
+		self.actors = {}
+		self.actorCounts = collections.Counter()
+		self.actorMovieCounts = collections.Counter()
+
+		# Map from director ID -> [race, gender, # movies, dict from scheme ->
+		# [racial score sum, gender score sum, # scored movies]]
+		self.directors = {}
+		self.directorCounts = collections.Counter()
+
+		# Map from scheme -> [sum of director racial scores, sum of director
+		# gender scores, # scored directors], over directors of known race and
+		# gender (as in directorStats)
+		self.directorScoreSums = dict((scheme, [0.0, 0.0, 0])
+			for scheme in Schemes)
+
+	"""
+	CLASS METHOD: fromGraph
+	------------------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph to seed the stats with
+
+	Returns: an OnlineStats holding every movie in graph, with its director,
+	cast and the cast's billing and likes (see GraphArrays.castCredits).
+	------------------------
+	"""
+	@classmethod
+	def fromGraph(cls, graph):
+		stats = cls()
+		for movieId in graph.nodes():
+			movieNode = graph.node[movieId]
+			if movieNode["type"] != "MOVIE":
+				continue
+			directorIds = graph.predecessors(movieId)
+			director = (directorIds[0], graph.node[directorIds[0]]) \
+				if directorIds else None
+			cast, billing, likes = ga.castCredits(graph, movieId, movieNode)
+			stats.addMovie((movieId, movieNode), director, [(actorId,
+				graph.node[actorId], {"billing": position, "facebookLikes": count})
+				for actorId, position, count in zip(cast, billing, likes)])
+		return stats
+
+	"""
+	METHOD: addMovie
+	-----------------
+	Parameters:
+		movie - a (movie ID, movie attributes) pair
+		director - a (director ID, director attributes) pair, or None
+		cast - a list of (actor ID, actor attributes) pairs, or (actor ID, actor
+				attributes, credit attributes) triples
+
+	Returns: NA.  Raises ValueError if the movie is already in the stats.
+	-----------------
+	"""
+	def addMovie(self, movie, director, cast):
+		movieId, movieAttributes = movie
+		if movieId in self.movies:
+			raise ValueError("Movie %s is already in the stats" % movieId)
+
+		castIds = tuple(credit[0] for credit in cast)
+		for credit in cast:
+			self.addActor(credit[0], credit[1])
+		races = [self.actors[actorId][0] for actorId in castIds]
+		genders = [self.actors[actorId][1] for actorId in castIds]
+		credits = [credit[2] if len(credit) > 2 else {} for credit in cast]
+		scores = movieScores(races, genders,
+			[credit.get("billing") for credit in credits],
+			[credit.get("facebookLikes") for credit in credits])
+
+		directorId = None
+		if director is not None:
+			directorId = director[0]
+			self.addDirector(directorId, director[1])
+		self.movies[movieId] = (directorId, castIds, scores,
+			profitRatio(movieAttributes))
+		self.updateMovie(movieId, 1)
+
+	"""
+	METHOD: removeMovie
+	--------------------
+	Parameters:
+		movieId - the ID of a movie in the stats
+
+	Returns: NA.  Raises ValueError if the movie is not in the stats.
+	--------------------
+	"""
+	def removeMovie(self, movieId):
+		if movieId not in self.movies:
+			raise ValueError("Movie %s is not in the stats" % movieId)
+		self.updateMovie(movieId, -1)
+		directorId, castIds, scores, ratio = self.movies.pop(movieId)
+		for actorId in castIds:
+			self.removeActor(actorId)
+		if directorId is not None:
+			self.removeDirector(directorId)
+
+	"""
+	METHOD: updateMovie
+	--------------------
+	Parameters:
+		movieId - the ID of a movie in self.movies
+		sign - 1 to add the movie to the aggregates, -1 to remove it
+
+	Returns: NA
+	--------------------
+	"""
+	def updateMovie(self, movieId, sign):
+		directorId, castIds, scores, ratio = self.movies[movieId]
+		self.numMovies += sign
+		racialScore, genderScore = scores[None] or (None, None)
+		if racialScore is not None:
+			self.numAllWhiteMovies += sign * (racialScore == 0)
+			self.numAllMaleMovies += sign * (genderScore == 0)
+			self.numAllFemaleMovies += sign * (genderScore == 1)
+			self.numHalfFemaleMovies += sign * (genderScore >= 0.5)
+			if ratio is not None:
+				self.racialProfit.update([racialScore], [ratio], sign)
+				self.genderProfit.update([genderScore], [ratio], sign)
+
+		for scheme in Schemes:
+			if scores[scheme] is not None:
+				sums = self.movieScoreSums[scheme]
+				addScores(sums, scores[scheme], sign)
+
+		if directorId is not None:
+			self.updateDirectorScores(directorId, scores, sign)
+
+	"""
+	METHOD: addActor
+	-----------------
+	Parameters:
+		actorId - the ID of an actor credited in a new movie
+		attributes - the actor's attributes, used if they are new
+
+	Returns: NA
+	-----------------
+	"""
+	def addActor(self, actorId, attributes):
+		if actorId not in self.actors:
+			self.actors[actorId] = [attributes.get("race"),
+				attributes.get("gender"), 0]
+			self.updateActorCounts(actorId, 1)
+		self.actors[actorId][2] += 1
+		race, gender, numMovies = self.actors[actorId]
+		self.actorMovieCounts["race", race] += 1
+		self.actorMovieCounts["gender", gender] += 1
+
+	"""
+	METHOD: removeActor
+	--------------------
+	Parameters:
+		actorId - the ID of an actor credited in a removed movie
+
+	Returns: NA
+	--------------------
+	"""
+	def removeActor(self, actorId):
+		race, gender, numMovies = self.actors[actorId]
+		self.actorMovieCounts["race", race] -= 1
+		self.actorMovieCounts["gender", gender] -= 1
+		self.actors[actorId][2] -= 1
+		if numMovies == 1:
+			self.updateActorCounts(actorId, -1)
+			del self.actors[actorId]
+
+	def updateActorCounts(self, actorId, sign):
+		race, gender, numMovies = self.actors[actorId]
+		self.actorCounts["all"] += sign
+		self.actorCounts["race", race] += sign
+		self.actorCounts["gender", gender] += sign
+
+	"""
+	METHOD: addDirector
+	--------------------
+	Parameters:
+		directorId - the ID of the director of a new movie
+		attributes - the director's attributes, used if they are new
+
+	Returns: NA
+	--------------------
+	"""
+	def addDirector(self, directorId, attributes):
+		if directorId not in self.directors:
+			self.directors[directorId] = [attributes.get("race"),
+				attributes.get("gender"), 0,
+				dict((scheme, [0.0, 0.0, 0]) for scheme in Schemes)]
+			self.updateDirectorCounts(directorId, 1)
+		self.directors[directorId][2] += 1
+
+	"""
+	METHOD: removeDirector
+	-----------------------
+	Parameters:
+		directorId - the ID of the director of a removed movie
+
+	Returns: NA
+	-----------------------
+	"""
+	def removeDirector(self, directorId):
+		self.directors[directorId][2] -= 1
+		if self.directors[directorId][2] == 0:
+			self.updateDirectorCounts(directorId, -1)
+			del self.directors[directorId]
+
+	def updateDirectorCounts(self, directorId, sign):
+		race, gender = self.directors[directorId][:2]
+		if race is None or gender is None:
+			return
+		self.directorCounts["all"] += sign
+		self.directorCounts["race", race] += sign
+		self.directorCounts["gender", gender] += sign
+
+	"""
+	METHOD: updateDirectorScores
+	-----------------------------
+	Parameters:
+		directorId - the ID of a director in self.directors
+		scores - the scores of one of their movies (see movieScores)
+		sign - 1 to add the movie to their scores, -1 to remove it
+
+	Returns: NA
+
+	A director's score is the average score of their movies, so their old
+	average is taken out of the director score sums and their new one put in.
+	-----------------------------
+	"""
+	def updateDirectorScores(self, directorId, scores, sign):
+		race, gender, numMovies, directorSums = self.directors[directorId]
+		counted = race is not None and gender is not None
+		for scheme in Schemes:
+			if scores[scheme] is None:
+				continue
+			sums = directorSums[scheme]
+			totals = self.directorScoreSums[scheme]
+			if counted and sums[2] > 0:
+				totals[0] -= sums[0] / sums[2]
+				totals[1] -= sums[1] / sums[2]
+				totals[2] -= 1
+			addScores(sums, scores[scheme], sign)
+			if counted and sums[2] > 0:
+				totals[0] += sums[0] / sums[2]
+				totals[1] += sums[1] / sums[2]
+				totals[2] += 1
+			if totals[2] == 0:
+				totals[0] = totals[1] = 0.0
+
+	"""
+	METHOD: movieStats
+	-------------------
+	Parameters: NA
+
+	Returns: a dict with the keys of DiversityScore.movieStats, for the movies
+	currently in the stats.  Averages over no movies are NaN.
+	-------------------
+	"""
+	def movieStats(self):
+		movieDict = collections.defaultdict()
+		movieDict["numMovies"] = self.numMovies
+		for scheme in Schemes:
+			prefix = "avg%s" % ("" if scheme is None else
+				scheme.capitalize() + "Weighted")
+			racialSum, genderSum, count = self.movieScoreSums[scheme]
+			movieDict[prefix + "RacialDiversityScore"] = ratioOrNaN(racialSum,
+				count)
+			movieDict[prefix + "GenderDiversityScore"] = ratioOrNaN(genderSum,
+				count)
+		movieDict["numAllWhiteMovies"] = self.numAllWhiteMovies
+		movieDict["numAllNonWhiteMovies"] = self.numMovies - self.numAllWhiteMovies
+		movieDict["numAllMaleMovies"] = self.numAllMaleMovies
+		movieDict["numAllFemaleMovies"] = self.numAllFemaleMovies
+		movieDict["numHalfFemaleMovies"] = self.numHalfFemaleMovies
+		return movieDict
+
+	"""
+	METHOD: actorStats
+	-------------------
+	Parameters: NA
+
+	Returns: a dict with the keys of DiversityScore.actorStats, for the actors
+	currently credited in the stats' movies.  Averages over no actors are NaN.
+	-------------------
+	"""
+	def actorStats(self):
+		nonWhiteRaces = [race for race in ga.Races if race != "White"]
+		count = lambda attribute, values: sum(self.actorCounts[attribute, value]
+			for value in values)
+		movies = lambda attribute, values: sum(
+			self.actorMovieCounts[attribute, value] for value in values)
+
+		actorDict = collections.defaultdict()
+		actorDict["numActors"] = self.actorCounts["all"]
+		actorDict["numWhite"] = count("race", ["White"])
+		actorDict["numNonWhite"] = count("race", nonWhiteRaces)
+		for key, race in [("numBlack", "Black"), ("numHispanic", "Hispanic"),
+			("numMultiracial", "Multiracial"), ("numAsian", "Asian"),
+			("numAsianIndian", "Asian/Indian"), ("numMiddleEastern", "Middle Eastern"),
+			("numAmericanAborigine", "American Aborigine")]:
+			actorDict[key] = count("race", [race])
+		actorDict["numMale"] = count("gender", ["Male"])
+		actorDict["numFemale"] = count("gender", ["Female"])
+		for key, attribute, values in [
+			("avgNumMoviesForWhiteActor", "race", ["White"]),
+			("avgNumMoviesForNonWhiteActor", "race", nonWhiteRaces),
+			("avgNumMoviesForMaleActor", "gender", ["Male"]),
+			("avgNumMoviesForFemaleActor", "gender", ["Female"])]:
+			actorDict[key] = ratioOrNaN(movies(attribute, values),
+				count(attribute, values))
+		return actorDict
+
+	"""
+	METHOD: directorStats
+	----------------------
+	Parameters: NA
+
+	Returns: a dict with the keys of DiversityScore.directorStats, for the
+	directors of the stats' movies.  As in directorStats, only directors of
+	known race and gender are counted.  Averages over no directors are NaN.
+	----------------------
+	"""
+	def directorStats(self):
+		directorDict = collections.defaultdict()
+		directorDict["numDirectors"] = self.directorCounts["all"]
+		for scheme in Schemes:
+			prefix = "avg%s" % ("" if scheme is None else
+				scheme.capitalize() + "Weighted")
+			racialSum, genderSum, count = self.directorScoreSums[scheme]
+			directorDict[prefix + "RacialDiversityScore"] = ratioOrNaN(racialSum,
+				count)
+			directorDict[prefix + "GenderDiversityScore"] = ratioOrNaN(genderSum,
+				count)
+		directorDict["numWhiteDirectors"] = self.directorCounts["race", "White"]
+		directorDict["numNonWhiteDirectors"] = self.directorCounts["all"] - \
+			self.directorCounts["race", "White"]
+		directorDict["numMaleDirectors"] = self.directorCounts["gender", "Male"]
+		directorDict["numFemaleDirectors"] = \
+			self.directorCounts["gender", "Female"]
+		return directorDict
+
+	"""
+	METHOD: profitCorrelation
+	--------------------------
+	Parameters: NA
+
+	Returns: a tuple of the correlation coefficients of the movies' racial and
+	gender diversity scores with their profit ratios, over movies with a cast
+	and a budget, as Analysis.diversityProfitCorrelation returns.
+	--------------------------
+	"""
+	def profitCorrelation(self):
+		return (self.racialProfit.correlation(), self.genderProfit.correlation())
+
+	"""
+	METHOD: save
+	-------------
+	Parameters:
+		filename - the file to save the stats to
+
+	Returns: NA
+
+	Pickles the stats to a temporary file that then replaces filename, so a
+	crash while saving leaves the previous save intact (as CheckpointStore does).
+	-------------
+	"""
+	def save(self, filename):
+		tempFilename = filename + ".tmp"
+		with open(tempFilename, 'wb') as statsFile:
+			pickle.dump(self, statsFile, pickle.HIGHEST_PROTOCOL)
+			statsFile.flush()
+			os.fsync(statsFile.fileno())
+		os.rename(tempFilename, filename)
+
+	"""
+	CLASS METHOD: load
+	-------------------
+	Parameters:
+		filename - a file written by save
+
+	Returns: the OnlineStats saved in the file.
+	-------------------
+	"""
+	@classmethod
+	def load(cls, filename):
+		with open(filename, 'rb') as statsFile:
+			return pickle.load(statsFile)
+
+"""
+FUNCTION: movieScores
+----------------------
+Parameters:
+	races, genders - the races and genders of a movie's cast
+	billing, likes - parallel lists of each credit's billing position and
+					Facebook likes (None if unknown)
+
+Returns: a dict from each scheme in Schemes to the movie's (racial score,
+gender score), or None if it has none: the unweighted scores of
+DiversityScore.racialScoreForMovie and genderScoreForMovie, and the weighted
+scores of DiversityScore.weightedMovieScoreArrays.
+----------------------
+"""
+def movieScores(races, genders, billing, likes):
+	nonWhite = np.array([race != "White" for race in races], dtype=np.float64)
+	female = np.array([gender == "Female" for gender in genders],
+		dtype=np.float64)
+	scores = {None: None}
+	if len(races) > 0:
+		scores[None] = (nonWhite.sum() / len(races), female.sum() / len(races))
+
+	billing = [-1 if position is None else position for position in billing]
+	likes = [np.nan if count is None else count for count in likes]
+	for scheme in ds.WeightSchemes:
+		weights = ds.creditWeightArray(scheme, billing, likes)
+		total = weights.sum()
+		scores[scheme] = (np.dot(weights, nonWhite) / total,
+			np.dot(weights, female) / total) if total > 0 else None
+	return scores
+
+"""
+FUNCTION: addScores
+--------------------
+Parameters:
+	sums - a [racial score sum, gender score sum, # scored movies] list
+	scores - a movie's (racial score, gender score)
+	sign - 1 to add the movie's scores to the sums, -1 to remove them
+
+Returns: NA.  Sums over no movies are reset to exactly 0, so rounding errors
+do not build up as movies come and go.
+--------------------
+"""
+def addScores(sums, scores, sign):
+	sums[0] += sign * scores[0]
+	sums[1] += sign * scores[1]
+	sums[2] += sign
+	if sums[2] == 0:
+		sums[0] = sums[1] = 0.0
+
+"""
+FUNCTION: profitRatio
+----------------------
+Parameters:
+	movieAttributes - a movie's attributes, including budget and gross
+
+Returns: the movie's gross / budget (as in DiversityScore.profitStats), or None
+if it has no budget.
+----------------------
+"""
+def profitRatio(movieAttributes):
+	budget = movieAttributes.get("budget")
+	if not budget:
+		return None
+	return movieAttributes.get("gross", 0) / float(budget)
+
+"""
+FUNCTION: ratioOrNaN
+---------------------
+Parameters:
+	numerator, denominator - numbers
+
+Returns: numerator / denominator as a float, or NaN if denominator is 0.
+---------------------
+"""
+def ratioOrNaN(numerator, denominator):
+	if denominator == 0:
+		return float("nan")
+	return float(numerator) / denominator
@@ -0,0 +1,310 @@
+from dataset import GraphArrays as ga
+import DiversityScore as ds
+import numpy as np
+
+"""
+CLASS: TemporalIndex
+---------------------
+A year-indexed summary of every movie in the graph that answers aggregate
+queries over any range of release years in constant time.
+
+The index covers every year from the first to the last release year (years with
+no movies included), and for each per-movie quantity it stores a prefix sum
+over those years, so that the total for years [startYear, endYear] is just
+prefix[end + 1] - prefix[start].  Movies themselves are stored sorted by
+release year, so the movies released in a range of years are a single slice.
+
+Available sums (see rangeSum):
+	numMovies - number of movies
+	numScoredMovies - number of movies with a non-empty cast
+	racialScore, genderScore - sums of movie diversity scores
+	numAllWhiteMovies, numAllMaleMovies, numAllFemaleMovies,
+	numHalfFemaleMovies - movieStats-style counts of movies by cast makeup
+	castSize - number of cast members
+	gross, budget - sums of gross and budget
+	numProfitMovies - movies with a nonzero budget and a non-empty cast
+	profitRatio, profitRatioSquared, racialScoreWithProfit,
+	genderScoreWithProfit, racialScoreSquared, genderScoreSquared,
+	racialProfit, genderProfit - sums over those movies used for profit means
+		and diversity/profit correlations
+---------------------
+"""
+class TemporalIndex(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		arrays - a GraphArrays snapshot of the graph to index
+
+	Returns: a TemporalIndex over every movie in the snapshot.
+	-------------
+	"""
+	def __init__(self, arrays):
+		racialScores, genderScores = ds.movieScoreArrays(arrays)
+		movieYears = arrays.releaseYear[arrays.movieIds]
+
+		# Sort movies by release year
+		order = np.argsort(movieYears, kind="mergesort")
+		self.movieIds = arrays.movieIds[order]
+		self.movieYears = movieYears[order]
+		racialScores = racialScores[order]
+		genderScores = genderScores[order]
+
+		if len(self.movieIds) > 0:
+			self.firstYear = int(self.movieYears[0])
+			self.lastYear = int(self.movieYears[-1])
+		else:
+			self.firstYear, self.lastYear = 0, -1
+		numYears = self.lastYear - self.firstYear + 1
+		yearIndices = self.movieYears - self.firstYear
+
+		# yearOffsets[i] is the index of the first movie released in year i
+		self.yearOffsets = np.zeros(numYears + 1, dtype=np.int64)
+		np.cumsum(np.bincount(yearIndices, minlength=numYears),
+			out=self.yearOffsets[1:])
+
+		castSizes = arrays.castSizes()[order]
+		scored = castSizes > 0
+		budget = arrays.budget[self.movieIds]
+		gross = arrays.gross[self.movieIds]
+		hasProfit = scored & (budget != 0)
+		racial = np.where(scored, racialScores, 0.0)
+		gender = np.where(scored, genderScores, 0.0)
+		profitRatio = np.zeros(len(self.movieIds))
+		profitRatio[hasProfit] = gross[hasProfit] / budget[hasProfit]
+
+		perMovie = {
+			"numMovies": np.ones(len(self.movieIds)),
+			"numScoredMovies": scored,
+			"racialScore": racial,
+			"genderScore": gender,
+			"numAllWhiteMovies": scored & (racial == 0),
+			"numAllMaleMovies": scored & (gender == 0),
+			"numAllFemaleMovies": scored & (gender == 1),
+			"numHalfFemaleMovies": scored & (gender >= 0.5),
+			"castSize": castSizes,
+			"gross": gross,
+			"budget": budget,
+			"numProfitMovies": hasProfit,
+			"profitRatio": profitRatio,
+			"profitRatioSquared": profitRatio ** 2,
+			"racialScoreSquared": np.where(hasProfit, racial ** 2, 0.0),
+			"genderScoreSquared": np.where(hasProfit, gender ** 2, 0.0),
+			"racialScoreWithProfit": np.where(hasProfit, racial, 0.0),
+			"genderScoreWithProfit": np.where(hasProfit, gender, 0.0),
+			"racialProfit": racial * profitRatio,
+			"genderProfit": gender * profitRatio,
+		}
+		self.prefixSums = {}
+		for name, values in perMovie.items():
+			yearTotals = np.bincount(yearIndices, weights=values,
+				minlength=numYears)
+			self.prefixSums[name] = self.prefix(yearTotals)
+
+		# Per-year counts of cast members in each race and gender category.
+		# The last column of each counts unknown races/genders.
+		castYears = (movieYears - self.firstYear)[arrays.castMoviePositions()]
+		self.racePrefixSums = self.categoryPrefixSums(castYears,
+			arrays.race[arrays.castIds], len(ga.Races), numYears)
+		self.genderPrefixSums = self.categoryPrefixSums(castYears,
+			arrays.gender[arrays.castIds], len(ga.Genders), numYears)
+
+	"""
+	CLASS METHOD: fromGraph
+	------------------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph to index
+
+	Returns: a TemporalIndex over every movie in the graph.
+	------------------------
+	"""
+	@classmethod
+	def fromGraph(cls, graph):
+		return cls(ga.GraphArrays.fromGraph(graph))
+
+	"""
+	METHOD: prefix
+	---------------
+	Parameters:
+		yearTotals - an array (or 2D array, by row) of totals for each year
+
+	Returns: the prefix sums of yearTotals, with a leading row of zeros.
+	---------------
+	"""
+	def prefix(self, yearTotals):
+		prefixSums = np.zeros((len(yearTotals) + 1,) + yearTotals.shape[1:])
+		np.cumsum(yearTotals, axis=0, out=prefixSums[1:])
+		return prefixSums
+
+	"""
+	METHOD: categoryPrefixSums
+	---------------------------
+	Parameters:
+		castYears - the year index of each cast member
+		codes - the race or gender code of each cast member
+		numCategories - the number of known codes
+		numYears - the number of years in the index
+
+	Returns: a (numYears + 1) x (numCategories + 1) array of prefix sums of the
+	number of cast members with each code, where the last column counts unknown
+	codes.
+	---------------------------
+	"""
+	def categoryPrefixSums(self, castYears, codes, numCategories, numYears):
+		codes = np.where(codes == ga.UnknownCode, numCategories, codes)
+		counts = np.bincount(castYears * (numCategories + 1) + codes,
+			minlength=numYears * (numCategories + 1))
+		return self.prefix(counts.reshape(numYears, numCategories + 1))
+
+	"""
+	METHOD: yearBounds
+	-------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: the (start, end) rows of the prefix sum arrays for the given
+	range, clamped to the years covered by the index.
+	-------------------
+	"""
+	def yearBounds(self, startYear, endYear):
+		numYears = self.lastYear - self.firstYear + 1
+		start = min(max(startYear - self.firstYear, 0), numYears)
+		end = min(max(endYear - self.firstYear + 1, start), numYears)
+		return start, end
+
+	"""
+	METHOD: rangeSum
+	-----------------
+	Parameters:
+		name - the name of one of the indexed sums (see the class description)
+		startYear, endYear - an inclusive range of release years
+
+	Returns: the total of the given quantity over movies released in the range.
+	-----------------
+	"""
+	def rangeSum(self, name, startYear, endYear):
+		start, end = self.yearBounds(startYear, endYear)
+		prefixSums = self.prefixSums[name]
+		return prefixSums[end] - prefixSums[start]
+
+	"""
+	METHOD: moviesBetween
+	----------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: the node IDs of every movie released in the range, as a slice of
+	the year-sorted movie array.
+	----------------------
+	"""
+	def moviesBetween(self, startYear, endYear):
+		start, end = self.yearBounds(startYear, endYear)
+		return self.movieIds[self.yearOffsets[start]:self.yearOffsets[end]]
+
+	"""
+	METHOD: castCounts
+	-------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: a tuple of (raceCounts, genderCounts) dicts, mapping each race and
+	gender (or None for unknown) to the number of cast members with it in
+	movies released in the range.
+	-------------------
+	"""
+	def castCounts(self, startYear, endYear):
+		start, end = self.yearBounds(startYear, endYear)
+		raceTotals = self.racePrefixSums[end] - self.racePrefixSums[start]
+		genderTotals = self.genderPrefixSums[end] - self.genderPrefixSums[start]
+		raceCounts = dict(zip(ga.Races + [None], raceTotals.astype(int)))
+		genderCounts = dict(zip(ga.Genders + [None], genderTotals.astype(int)))
+		return raceCounts, genderCounts
+
+	"""
+	METHOD: averageMovieScores
+	---------------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: a tuple of (avgRacialDiversityScore, avgGenderDiversityScore) over
+	movies released in the range with a non-empty cast (NaN if there are none).
+	---------------------------
+	"""
+	def averageMovieScores(self, startYear, endYear):
+		numScored = self.rangeSum("numScoredMovies", startYear, endYear)
+		if numScored == 0:
+			return float("nan"), float("nan")
+		return (self.rangeSum("racialScore", startYear, endYear) / numScored,
+			self.rangeSum("genderScore", startYear, endYear) / numScored)
+
+	"""
+	METHOD: meanProfitRatio
+	------------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: the mean gross/budget ratio of movies released in the range (NaN
+	if none have a budget).
+	------------------------
+	"""
+	def meanProfitRatio(self, startYear, endYear):
+		numProfit = self.rangeSum("numProfitMovies", startYear, endYear)
+		if numProfit == 0:
+			return float("nan")
+		return self.rangeSum("profitRatio", startYear, endYear) / numProfit
+
+	"""
+	METHOD: profitCorrelations
+	---------------------------
+	Parameters:
+		startYear, endYear - an inclusive range of release years
+
+	Returns: a tuple of (correlation coefficient for race, correlation
+	coefficient for gender) between movie diversity scores and profit ratios
+	for movies released in the range, as in
+	Analysis.diversityProfitCorrelation.
+	---------------------------
+	"""
+	def profitCorrelations(self, startYear, endYear):
+		def total(name):
+			return self.rangeSum(name, startYear, endYear)
+
+		n = total("numProfitMovies")
+		sumProfit = total("profitRatio")
+		profitVariance = n * total("profitRatioSquared") - sumProfit ** 2
+
+		def correlation(kind):
+			sumScore = total(kind + "ScoreWithProfit")
+			covariance = n * total(kind + "Profit") - sumScore * sumProfit
+			scoreVariance = n * total(kind + "ScoreSquared") - sumScore ** 2
+			with np.errstate(divide="ignore", invalid="ignore"):
+				return covariance / np.sqrt(scoreVariance * profitVariance)
+
+		return correlation("racial"), correlation("gender")
+
+	"""
+	METHOD: averageMovieScoreSeries
+	--------------------------------
+	Parameters:
+		window - optional number of years in a trailing window.  By default,
+				each year's average is over all movies up to that year.
+
+	Returns: a tuple (years, racialScores, genderScores) of arrays giving the
+	average movie diversity scores at every year covered by the index, for
+	plotting.  Computed from the prefix sums in a single vectorized step.
+	--------------------------------
+	"""
+	def averageMovieScoreSeries(self, window=None):
+		years = np.arange(self.firstYear, self.lastYear + 1)
+		ends = np.arange(1, len(years) + 1)
+		starts = np.zeros(len(years), dtype=np.int64) if window is None else \
+			np.maximum(ends - window, 0)
+
+		def windowTotals(name):
+			return self.prefixSums[name][ends] - self.prefixSums[name][starts]
+
+		numScored = windowTotals("numScoredMovies")
+		with np.errstate(divide="ignore", invalid="ignore"):
+			return (years, windowTotals("racialScore") / numScored,
+				windowTotals("genderScore") / numScored)
@@ -1,6 +1,8 @@
 from Analysis import filterNoneActors
+import bisect
 from collections import defaultdict
 from dataset import ReadMovieGraph
+import DiversityScore as ds
 from graphFunctions import avgDirectorGenderDiversityScore as dGDiv
 from graphFunctions import avgDirectorRacialDiversityScore as dRDiv
 from graphFunctions import avgMovieGenderDiversityScore as mGDiv
@@ -9,8 +11,9 @@ from graphFunctions import actorAssortativity
 from graphFunctions import actorDirectorAssortativity
 from graphFunctions import racialDiversityScoreProfitCorrelation
 from graphFunctions import genderDiversityScoreProfitCorrelation
-from matplotlib import pyplot
+import multiprocessing
 import networkx as nx
+import os
 import progressbar
 
 """
@@ -21,12 +24,25 @@ Parameters:
 	timeSeriesFunc - a function that should take the current state of the graph
 					at a given period in time, along with the movie nodeIDs that
 					were added since the last time step, and return the y value
-					to graph for that time step.
+					to graph for that time step.  May instead be an
+					accumulator (see DiversityScoreAccumulator), which is
+					updated with the movies entering and leaving the graph at
+					each time step.
 	title - the title of the graph
 	yLabel - the label for the y axis
 	legendLabels - an array of labels for each plot
+	processes - if given, the number of worker processes to evaluate years on
+				in parallel.  timeSeriesFunc must then be picklable (i.e. a
+				module-level function).
+	window - if given, only movies released in a window ending at each year are
+				included in that year's graph, instead of every movie up to
+				that year.  Either a number of years for a trailing window, or
+				"decade" for a window starting at the beginning of each decade.
+	filename - if given, the plot is saved to this image file instead of being
+				shown (see plotTimeSeries)
 """
-def timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels):
+def timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels,
+	processes=None, window=None, filename=None):
 
 	# Categorize movie nodes by release year
 	movieBuckets = defaultdict(list)
@@ -38,20 +54,67 @@ def timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels):
 	# Get a sorted list of all the years for which we have movies
 	years = movieBuckets.keys()
 	years.sort()
+
+	# Year-sorted snapshot of all movies, used to find the movies in a window
+	sortedYears = []
+	sortedMovieIds = []
+	for year in years:
+		sortedYears.extend([year] * len(movieBuckets[year]))
+		sortedMovieIds.extend(movieBuckets[year])
 	
 	yValues = [[] for i in legendLabels] if legendLabels else [[]]
 
-	# Step through each year and build up our graph and data over time
-	timeSeriesGraph = nx.DiGraph()
-	bar = progressbar.ProgressBar()
-	for i in bar(range(len(years))):
-		year = years[i]
-		timeSeriesGraph = generateNextTimeStep(timeSeriesGraph, graph, 
-												movieBuckets[year], year)
-		stepYValues = timeSeriesFunc(timeSeriesGraph, movieBuckets[year], graphDict)
+	if processes:
+		stepYValuesList = parallelTimeSeriesValues(graph, graphDict,
+			timeSeriesFunc, movieBuckets, sortedYears, sortedMovieIds, years,
+			processes, window)
+	else:
+		# Step through each year and build up our graph and data over time
+		stepYValuesList = evaluateYears(graph, graphDict, timeSeriesFunc,
+			movieBuckets, sortedYears, sortedMovieIds, years, window,
+			showProgress=True)
+
+	for stepYValues in stepYValuesList:
 		for index, y in enumerate(stepYValues):
 			yValues[index].append(y)
 
+	plotTimeSeries(years, yValues, title, yLabel, legendLabels, filename)
+
+"""
+FUNCTION: loadPyplot
+---------------------
+Parameters: NA
+
+Returns: the matplotlib pyplot module.  On machines with no display (no
+$DISPLAY set on Linux), the non-interactive Agg backend is selected first, so
+plots can still be saved to files.
+---------------------
+"""
+def loadPyplot():
+	import matplotlib
+	if os.name == "posix" and not os.environ.get("DISPLAY"):
+		matplotlib.use("Agg")
+	from matplotlib import pyplot
+	return pyplot
+
+"""
+FUNCTION: plotTimeSeries
+-------------------------
+Parameters:
+	years - the x values (years) of every plot
+	yValues - a list of lists of y values, one list (parallel to years) per plot
+	title - the title of the graph
+	yLabel - the label for the y axis
+	legendLabels - an array of labels for each plot, or None
+	filename - if given, the image file to save the plot to.  Otherwise the
+				plot is shown.
+
+Returns: NA
+-------------------------
+"""
+def plotTimeSeries(years, yValues, title, yLabel, legendLabels, filename=None):
+	pyplot = loadPyplot()
+	pyplot.figure()
 	for i, ys in enumerate(yValues):
 		pyplot.plot(years, ys, label=legendLabels[i] if legendLabels else "")
 	pyplot.xlabel("Year")
@@ -59,7 +122,179 @@ def timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels):
 	pyplot.title(title)
 	if legendLabels: pyplot.legend()
 	pyplot.axis([years[0], years[-1], -1 if min([min(l) for l in yValues]) < 0 else 0, 1])
-	pyplot.show()
+	if filename:
+		pyplot.savefig(filename)
+		pyplot.close()
+	else:
+		pyplot.show()
+
+"""
+FUNCTION: windowStart
+----------------------
+Parameters:
+	year - the last year of the window
+	window - a number of years for a trailing window, "decade" for a window
+			starting at the beginning of the decade, or None for no window
+
+Returns: the first year included in the window ending at the given year.
+----------------------
+"""
+def windowStart(year, window):
+	if window is None:
+		return float("-inf")
+	if window == "decade":
+		return year - year % 10
+	return year - window + 1
+
+"""
+FUNCTION: evaluateYears
+------------------------
+Parameters:
+	graph, graphDict, timeSeriesFunc, window - see timeSeries
+	movieBuckets - a map from release year to the movie IDs released that year
+	sortedYears - the release year of every movie, sorted
+	sortedMovieIds - the movie IDs parallel to sortedYears
+	years - a sorted, contiguous run of the years to evaluate
+	showProgress - whether to display a progress bar
+
+Returns: a list parallel to years of timeSeriesFunc's value at each year.
+
+Builds the time series graph for the first year directly from the year-sorted
+snapshot, then steps through the remaining years incrementally.  Each step adds
+the movies released that year and, if there is a window, removes the movies
+that have fallen out of it, so a step costs time proportional to the movies
+entering and leaving rather than to the size of the window.
+------------------------
+"""
+def evaluateYears(graph, graphDict, timeSeriesFunc, movieBuckets, sortedYears,
+	sortedMovieIds, years, window=None, showProgress=False):
+	isAccumulator = hasattr(timeSeriesFunc, "addMovies")
+	if isAccumulator:
+		timeSeriesFunc.reset()
+
+	# Start from every movie in the window released before the first year
+	startIndex = bisect.bisect_left(sortedYears, windowStart(years[0], window))
+	endIndex = bisect.bisect_left(sortedYears, years[0])
+	initialMovieIds = sortedMovieIds[startIndex:endIndex]
+	timeSeriesGraph = generateNextTimeStep(nx.DiGraph(), graph, initialMovieIds,
+		years[0])
+	if isAccumulator:
+		timeSeriesFunc.addMovies(graph, initialMovieIds)
+
+	values = []
+	indices = range(len(years))
+	if showProgress:
+		indices = progressbar.ProgressBar()(indices)
+	for i in indices:
+		year = years[i]
+
+		# Remove movies that are no longer in the window
+		newStartIndex = bisect.bisect_left(sortedYears, windowStart(year, window))
+		expiredMovieIds = sortedMovieIds[startIndex:newStartIndex]
+		startIndex = newStartIndex
+		if expiredMovieIds:
+			timeSeriesGraph = removeExpiredMovies(timeSeriesGraph,
+				expiredMovieIds)
+			if isAccumulator:
+				timeSeriesFunc.removeMovies(graph, expiredMovieIds)
+
+		timeSeriesGraph = generateNextTimeStep(timeSeriesGraph, graph,
+			movieBuckets[year], year)
+		if isAccumulator:
+			timeSeriesFunc.addMovies(graph, movieBuckets[year])
+			values.append(timeSeriesFunc.values())
+		else:
+			values.append(timeSeriesFunc(timeSeriesGraph, movieBuckets[year],
+				graphDict))
+	return values
+
+"""
+FUNCTION: parallelTimeSeriesValues
+-----------------------------------
+Parameters:
+	graph - the NetworkX DiGraph to do the time series on
+	graphDict - a dict from names -> node ids for the given graph
+	timeSeriesFunc - the (picklable) time series function to evaluate
+	movieBuckets - a map from release year to the movie IDs released that year
+	sortedYears - the release year of every movie, sorted
+	sortedMovieIds - the movie IDs parallel to sortedYears
+	years - the sorted list of years to evaluate
+	processes - the number of worker processes to use
+	window - the time series window, if any (see timeSeries)
+
+Returns: a list parallel to years of timeSeriesFunc's return value for the
+graph at each year.
+
+Splits the years into contiguous chunks and evaluates them on a process pool.
+Each worker shares one year-sorted snapshot of the movies, builds the graph for
+the first year of its chunk with a release year cutoff, and then steps through
+the rest of its chunk incrementally.  Results are merged back in year order.
+This is meant for time series functions that are too expensive to run
+serially, like assortativity and modularity.
+-----------------------------------
+"""
+def parallelTimeSeriesValues(graph, graphDict, timeSeriesFunc, movieBuckets,
+	sortedYears, sortedMovieIds, years, processes, window=None):
+	# Use a few chunks per process so that the (more expensive) later years
+	# don't all end up on the same worker
+	numChunks = min(len(years), processes * 4)
+	chunks = [years[len(years) * i // numChunks : len(years) * (i + 1) // numChunks]
+		for i in range(numChunks)]
+
+	pool = multiprocessing.Pool(processes, initializer=initTimeSeriesWorker,
+		initargs=(graph, graphDict, timeSeriesFunc, dict(movieBuckets),
+			sortedYears, sortedMovieIds, window))
+	try:
+		stepYValuesList = []
+		chunkValues = pool.imap(timeSeriesWorker, chunks)
+		bar = progressbar.ProgressBar()
+		for i in bar(range(len(chunks))):
+			stepYValuesList.extend(chunkValues.next())
+	finally:
+		pool.close()
+		pool.join()
+	return stepYValuesList
+
+# Per-process state for parallel time series workers (see initTimeSeriesWorker)
+workerState = {}
+
+"""
+FUNCTION: initTimeSeriesWorker
+-------------------------------
+Parameters:
+	graph, graphDict, timeSeriesFunc, movieBuckets, sortedYears,
+	sortedMovieIds, window - see parallelTimeSeriesValues
+
+Returns: NA
+
+Pool initializer that stores the shared time series snapshot in this worker
+process, so it isn't re-sent with every chunk of years.
+-------------------------------
+"""
+def initTimeSeriesWorker(graph, graphDict, timeSeriesFunc, movieBuckets,
+	sortedYears, sortedMovieIds, window):
+	workerState["graph"] = graph
+	workerState["graphDict"] = graphDict
+	workerState["timeSeriesFunc"] = timeSeriesFunc
+	workerState["movieBuckets"] = movieBuckets
+	workerState["sortedYears"] = sortedYears
+	workerState["sortedMovieIds"] = sortedMovieIds
+	workerState["window"] = window
+
+"""
+FUNCTION: timeSeriesWorker
+---------------------------
+Parameters:
+	years - a sorted, contiguous chunk of the years to evaluate
+
+Returns: a list of timeSeriesFunc's values for each of the given years.
+---------------------------
+"""
+def timeSeriesWorker(years):
+	return evaluateYears(workerState["graph"], workerState["graphDict"],
+		workerState["timeSeriesFunc"], workerState["movieBuckets"],
+		workerState["sortedYears"], workerState["sortedMovieIds"], years,
+		workerState["window"])
 
 """
 FUNCTION: generateNextTimeStep
@@ -95,6 +330,161 @@ def generateNextTimeStep(timeSeriesGraph, graph, releasedMovieIds, year):
 
 	return timeSeriesGraph
 
+"""
+FUNCTION: removeExpiredMovies
+------------------------------
+Parameters:
+	timeSeriesGraph - the current iteration of the time series graph
+	expiredMovieIds - the movies that have fallen out of the time series window
+
+Returns: the timeSeriesGraph updated to remove the given movies, along with any
+people who are no longer involved in a movie in the graph.
+------------------------------
+"""
+def removeExpiredMovies(timeSeriesGraph, expiredMovieIds):
+	for movieId in expiredMovieIds:
+		personIds = timeSeriesGraph.predecessors(movieId)
+		personIds.extend(timeSeriesGraph.successors(movieId))
+		timeSeriesGraph.remove_node(movieId)
+
+		for personId in personIds:
+			if personId in timeSeriesGraph and \
+				timeSeriesGraph.degree(personId) == 0:
+				timeSeriesGraph.remove_node(personId)
+
+	return timeSeriesGraph
+
+"""
+CLASS: DiversityScoreAccumulator
+---------------------------------
+Incrementally maintains the same four values as combine: the average director
+gender and racial diversity scores, and the average movie gender and racial
+diversity scores, over the movies currently in the time series graph.  Adding
+or removing a movie costs time proportional to its cast size.
+
+This is a time series accumulator: instead of rescanning the time series graph
+at every step, timeSeries tells it which movies entered and left the graph, and
+asks it for the y values for that step.  Any object with the same reset,
+addMovies, removeMovies and values methods can be passed to timeSeries or
+MetricSweep.AccumulatorMetric instead.
+---------------------------------
+"""
+class DiversityScoreAccumulator(object):
+
+	def __init__(self):
+		self.reset()
+
+	"""
+	METHOD: reset
+	--------------
+	Parameters: NA
+
+	Returns: NA
+
+	Clears all accumulated state, before the start of a time series.
+	--------------
+	"""
+	def reset(self):
+		self.movieScores = {}
+		self.movieRacialSum = 0.0
+		self.movieGenderSum = 0.0
+
+		# Map from director ID -> [racial score sum, gender score sum, # movies]
+		self.directorSums = {}
+		self.directorRacialSum = 0.0
+		self.directorGenderSum = 0.0
+
+	"""
+	METHOD: addMovies
+	------------------
+	Parameters:
+		graph - the complete graph
+		movieIds - the movies entering the time series graph
+
+	Returns: NA
+	------------------
+	"""
+	def addMovies(self, graph, movieIds):
+		for movieId in movieIds:
+			racialScore = ds.racialScoreForMovie(graph, movieId)
+			genderScore = ds.genderScoreForMovie(graph, movieId)
+			if racialScore is None or genderScore is None:
+				continue
+
+			directorId = graph.predecessors(movieId)[0]
+			self.movieScores[movieId] = (directorId, racialScore, genderScore)
+			self.movieRacialSum += racialScore
+			self.movieGenderSum += genderScore
+			self.updateDirector(directorId, racialScore, genderScore, 1)
+
+	"""
+	METHOD: removeMovies
+	---------------------
+	Parameters:
+		graph - the complete graph
+		movieIds - the movies leaving the time series graph
+
+	Returns: NA
+	---------------------
+	"""
+	def removeMovies(self, graph, movieIds):
+		for movieId in movieIds:
+			if movieId not in self.movieScores:
+				continue
+
+			directorId, racialScore, genderScore = self.movieScores.pop(movieId)
+			self.movieRacialSum -= racialScore
+			self.movieGenderSum -= genderScore
+			self.updateDirector(directorId, -racialScore, -genderScore, -1)
+
+	"""
+	METHOD: updateDirector
+	-----------------------
+	Parameters:
+		directorId - the director whose movie scores changed
+		racialDelta, genderDelta - the change in the sum of their movies' scores
+		countDelta - the change in their number of scored movies
+
+	Returns: NA
+
+	Replaces the director's old average scores with their new averages in the
+	running totals over all directors.
+	-----------------------
+	"""
+	def updateDirector(self, directorId, racialDelta, genderDelta, countDelta):
+		sums = self.directorSums.setdefault(directorId, [0.0, 0.0, 0])
+		if sums[2] > 0:
+			self.directorRacialSum -= sums[0] / sums[2]
+			self.directorGenderSum -= sums[1] / sums[2]
+
+		sums[0] += racialDelta
+		sums[1] += genderDelta
+		sums[2] += countDelta
+		if sums[2] > 0:
+			self.directorRacialSum += sums[0] / sums[2]
+			self.directorGenderSum += sums[1] / sums[2]
+		else:
+			del self.directorSums[directorId]
+
+	"""
+	METHOD: values
+	---------------
+	Parameters: NA
+
+	Returns: the array of y values for the current time step.
+	---------------
+	"""
+	def values(self):
+		def average(total, count):
+			return total / count if count > 0 else float("nan")
+
+		numMovies = len(self.movieScores)
+		numDirectors = len(self.directorSums)
+		return [average(self.directorGenderSum, numDirectors),
+			average(self.directorRacialSum, numDirectors),
+			average(self.movieGenderSum, numMovies),
+			average(self.movieRacialSum, numMovies)]
+
 """
 FUNCTION: filterGraph
 -----------------------
@@ -134,6 +524,10 @@ Parameters:
 	title - the title of the graph
 	yLabel - the y-axis label of the graph
 	legendLabels - an optional array of labels for each plot
+	processes - optional number of worker processes to evaluate the years on in
+				parallel (see parallelTimeSeriesValues)
+	window - optional window of years to include at each step, for a
+				non-cumulative time series (see timeSeries)
 
 Returns: NA
 
@@ -141,10 +535,12 @@ Graphs a time series graph for the movie graph using the given time series
 function.
 --------------------------
 """
-def graphTimeSeries(timeSeriesFunc, title, yLabel, legendLabels=None):
+def graphTimeSeries(timeSeriesFunc, title, yLabel, legendLabels=None,
+	processes=None, window=None):
 	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
 	graph, graphDict = filterGraph(graph, graphDict)
-	g = timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels)
+	g = timeSeries(graph, graphDict, timeSeriesFunc, title, yLabel, legendLabels,
+		processes=processes, window=window)
 
 def combine(graph, ids):
 	return [dGDiv(graph, ids), dRDiv(graph, ids),
@@ -160,6 +556,13 @@ if __name__ == "__main__":
 					["Director gender", "Director racial", "Movie gender", "Movie racial"])
 	"""
 	"""
+	graphTimeSeries(DiversityScoreAccumulator(),
+					"Hollywood Diversity Over Time (Trailing 10 Years)",
+					"Diversity Score",
+					["Director gender", "Director racial", "Movie gender", "Movie racial"],
+					window=10)
+	"""
+	"""
 	graphTimeSeries(dGDiv, "Director Gender Diversity Score", "Gender Diversity Score")
 	graphTimeSeries(dRDiv, "Director Racial Diversity Score", "Racial Diversity Score")
 	graphTimeSeries(mGDiv, "Movie Gender Diversity Score", "Gender Diversity Score")
@@ -0,0 +1,120 @@
+from gevent import monkey
+monkey.patch_all(thread=False, select=False)
+
+from gevent.pool import Pool
+from gevent.queue import Queue
+from imdb import IMDb
+import json
+import utils
+
+"""
+CLASS: IMDbCastBackend
+-----------------------
+Fetches cast lists from IMDb through IMDbPY.  Keeps a fixed set of IMDb client
+instances that are handed out to one fetch at a time and reused, instead of
+creating a new client for every movie.
+-----------------------
+"""
+class IMDbCastBackend(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		numClients - the number of IMDb clients to create.  This also bounds
+					the number of fetches that can be in flight at once.
+
+	Returns: a new IMDbCastBackend.
+	-------------
+	"""
+	def __init__(self, numClients=8):
+		self.numClients = numClients
+		self.clients = Queue()
+		for i in range(numClients):
+			self.clients.put(IMDb())
+
+	"""
+	METHOD: castNames
+	------------------
+	Parameters:
+		movieId - the IMDb ID of the movie (without the leading "tt")
+
+	Returns: the names of (at most) the first six billed cast members.  Raises
+	an exception if the cast could not be fetched.
+	------------------
+	"""
+	def castNames(self, movieId):
+		client = self.clients.get()
+		try:
+			movie = client.get_movie(movieId, info=['main'])
+			return [actor['name'] for actor in movie['cast'][:6]]
+		finally:
+			self.clients.put(client)
+
+
+"""
+CLASS: FixtureCastBackend
+--------------------------
+Serves cast lists from a local JSON file mapping IMDb movie IDs to lists of
+cast names, for testing and for building without network access.  Movies that
+are not in the file fail as if the fetch had failed.
+--------------------------
+"""
+class FixtureCastBackend(object):
+
+	def __init__(self, filename):
+		with open(filename, 'rb') as fixtureFile:
+			self.casts = json.load(fixtureFile)
+		self.numClients = 1
+
+	def castNames(self, movieId):
+		if movieId not in self.casts:
+			raise KeyError("No fixture cast for movie %s" % movieId)
+		return self.casts[movieId][:6]
+
+
+"""
+FUNCTION: enrichCasts
+----------------------
+Parameters:
+	movies - the Movie objects whose casts to enrich
+	backend - the cast backend to fetch casts from.  Defaults to a new
+				IMDbCastBackend.
+	concurrency - the maximum number of casts to fetch at once.  Defaults to
+				the backend's number of clients.
+	cache - an optional ResponseCache to serve casts from and store them in
+
+Returns: a map from movie unique ID to an error message, for every movie whose
+cast could not be fetched.
+
+Adds up to six billed cast members from IMDb to each movie's actorNames, after
+the main actors already listed in the dataset.  Casts are fetched on a bounded
+pool, and movies whose fetch fails keep their dataset actors and are reported
+in the returned map instead of failing silently.
+----------------------
+"""
+def enrichCasts(movies, backend=None, concurrency=None, cache=None):
+	if backend is None:
+		backend = IMDbCastBackend()
+	failures = {}
+
+	def enrich(movie):
+		try:
+			movieId = movie.imdbURL.split('/')[4][2:]
+			if cache:
+				castNames = cache.getValue('imdb-cast:' + movieId,
+					lambda: backend.castNames(movieId))
+				if castNames is None:
+					raise KeyError("Cast for movie %s is not cached" % movieId)
+			else:
+				castNames = backend.castNames(movieId)
+		except Exception as e:
+			failures[movie.uniqueID()] = "%s: %s" % (type(e).__name__, e)
+			return
+		movie.actorNames = utils.mergeCast(movie.actorNames, castNames)
+
+	pool = Pool(concurrency or backend.numClients)
+	for movie in movies:
+		pool.spawn(enrich, movie)
+	pool.join()
+	return failures
@@ -0,0 +1,75 @@
+import cPickle as pickle
+import os
+
+"""
+CLASS: CheckpointStore
+-----------------------
+A directory of named checkpoints for a long-running build, each a pickled
+value in its own file.  Checkpoints are written atomically: the value is
+written to a temporary file that then replaces the checkpoint, so a crash
+while saving leaves the previous checkpoint intact rather than a truncated
+one.
+-----------------------
+"""
+class CheckpointStore(object):
+
+	def __init__(self, directory):
+		self.directory = directory
+
+	def path(self, name):
+		return os.path.join(self.directory, name + ".pickle")
+
+	"""
+	METHOD: load
+	-------------
+	Parameters:
+		name - the name of the checkpoint to load
+		default - the value to return if there is no such checkpoint
+
+	Returns: the value last saved under the given name, or the default.
+	-------------
+	"""
+	def load(self, name, default=None):
+		if not os.path.exists(self.path(name)):
+			return default
+		with open(self.path(name), 'rb') as checkpointFile:
+			return pickle.load(checkpointFile)
+
+	"""
+	METHOD: save
+	-------------
+	Parameters:
+		name - the name of the checkpoint to save
+		value - the (picklable) value to save
+
+	Returns: NA
+
+	Atomically replaces the named checkpoint with the given value.
+	-------------
+	"""
+	def save(self, name, value):
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		tempFilename = self.path(name) + ".tmp"
+		with open(tempFilename, 'wb') as checkpointFile:
+			pickle.dump(value, checkpointFile, pickle.HIGHEST_PROTOCOL)
+			checkpointFile.flush()
+			os.fsync(checkpointFile.fileno())
+		os.rename(tempFilename, self.path(name))
+
+	"""
+	METHOD: clear
+	--------------
+	Parameters: NA
+
+	Returns: NA
+
+	Deletes every checkpoint in the store.
+	--------------
+	"""
+	def clear(self):
+		if not os.path.isdir(self.directory):
+			return
+		for filename in os.listdir(self.directory):
+			if filename.endswith(".pickle") or filename.endswith(".tmp"):
+				os.remove(os.path.join(self.directory, filename))
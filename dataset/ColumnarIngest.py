@@ -0,0 +1,140 @@
+import csv
+from itertools import islice
+import numpy as np
+import unicodedata
+
+# Indices of the columns in the Kaggle movies dataset that hold numbers
+NumericColumns = set([2, 3, 4, 5, 7, 8, 12, 13, 15, 18, 22, 23, 24, 25, 26, 27])
+
+# Indices of the numeric columns that hold decimals rather than integers
+FloatColumns = set([25, 26])
+
+"""
+FUNCTION: normalizeText
+------------------------
+Parameters:
+	entry - a raw text entry from the Kaggle movies dataset
+
+Returns: the entry with non-breaking spaces and surrounding whitespace removed,
+escape sequences decoded, and accents and other non-ASCII characters stripped.
+------------------------
+"""
+def normalizeText(entry):
+	entry = entry.replace("\xc2\xa0", " ").strip()
+	entry = entry.decode('unicode-escape')
+	return unicodedata.normalize('NFKD', entry).encode('ascii', 'ignore')
+
+"""
+FUNCTION: cleanupEntry
+-----------------------
+Parameters:
+	i - the index of the entry's column
+	entry - a raw entry from the Kaggle movies dataset
+
+Returns: the cleaned up entry.  Text entries are normalized (see
+normalizeText), and numeric entries are stripped, with empty entries
+replaced by "0" so that they can always be parsed.
+-----------------------
+"""
+def cleanupEntry(i, entry):
+	if i in NumericColumns:
+		return entry.strip() if len(entry) > 0 else "0"
+	return normalizeText(entry)
+
+
+"""
+CLASS: MovieTable
+------------------
+A chunk of rows from the Kaggle movies dataset, stored by column.  Numeric
+columns are int64 or float64 arrays and text columns are arrays of normalized
+strings, all indexed by row.  Columns can be looked up by their index in the
+file or by their header name (e.g. "country").
+------------------
+"""
+class MovieTable(object):
+
+	def __init__(self, header, columns):
+		self.header = header
+		self.columns = columns
+		self.columnIndices = dict((name, i) for i, name in enumerate(header))
+
+	def __len__(self):
+		return len(self.columns[0]) if self.columns else 0
+
+	"""
+	METHOD: column
+	---------------
+	Parameters:
+		key - the index or header name of a column
+
+	Returns: the array of values in the column.
+	---------------
+	"""
+	def column(self, key):
+		if not isinstance(key, int):
+			key = self.columnIndices[key]
+		return self.columns[key]
+
+	"""
+	METHOD: row
+	------------
+	Parameters:
+		i - the index of a row in this table
+
+	Returns: a list of the cleaned up values in the row, in file column order.
+	------------
+	"""
+	def row(self, i):
+		return [column[i] for column in self.columns]
+
+
+"""
+FUNCTION: parseColumns
+-----------------------
+Parameters:
+	rows - a list of raw rows from the Kaggle movies dataset
+
+Returns: a list of column arrays (see MovieTable) for the given rows.
+
+Each text column is normalized once per distinct value rather than once per
+cell, since values like directors, countries and ratings repeat heavily.
+-----------------------
+"""
+def parseColumns(rows):
+	columns = []
+	for i, rawColumn in enumerate(zip(*rows)):
+		rawColumn = np.array(rawColumn)
+		if i in NumericColumns:
+			column = np.char.strip(rawColumn)
+			column[np.char.str_len(rawColumn) == 0] = "0"
+			columns.append(column.astype(np.float64 if i in FloatColumns
+				else np.int64))
+		else:
+			values, inverse = np.unique(rawColumn, return_inverse=True)
+			normalized = np.array([normalizeText(value) for value in values],
+				dtype=object)
+			columns.append(normalized[inverse])
+	return columns
+
+"""
+FUNCTION: readColumns
+----------------------
+Parameters:
+	filename - the name of the Kaggle movie data file to read
+	chunkSize - the maximum number of rows in each chunk
+
+Returns: a generator of MovieTables, one per chunk of rows in the file (not
+including the header row).
+
+Streams the file, so only one chunk of rows is held in memory at a time.
+----------------------
+"""
+def readColumns(filename, chunkSize=10000):
+	with open(filename, 'rb') as csvFile:
+		reader = csv.reader(csvFile, delimiter=',')
+		header = [name.strip() for name in next(reader)]
+		while True:
+			rows = list(islice(reader, chunkSize))
+			if not rows:
+				break
+			yield MovieTable(header, parseColumns(rows))
@@ -0,0 +1,207 @@
+import csv
+from GraphConstants import NodeTypeMovie, genderMemoFilename
+import networkx as nx
+import os
+import sexmachine.detector as gender
+
+# SexMachine predictions that are certain enough to fill in
+ResolvedGenders = set(["male", "female"])
+
+"""
+CLASS: GenderInferenceStats
+----------------------------
+Counts for a gender inference run.  Names are counted once per distinct first
+name, and people once per person whose gender was filled in.
+----------------------------
+"""
+class GenderInferenceStats(object):
+
+	def __init__(self):
+		self.numPeople = 0
+		self.numFilledIn = 0
+		self.numResolvedNames = 0
+		self.numAmbiguousNames = 0
+		self.numUnknownNames = 0
+		self.numMemoHits = 0
+
+	def __str__(self):
+		return ("%i first names (%i resolved, %i ambiguous, %i unknown, "
+			"%i from memo); filled in %i/%i unknown genders") % (
+			self.numResolvedNames + self.numAmbiguousNames +
+			self.numUnknownNames, self.numResolvedNames, self.numAmbiguousNames,
+			self.numUnknownNames, self.numMemoHits, self.numFilledIn,
+			self.numPeople)
+
+
+"""
+CLASS: GenderMemo
+------------------
+A table of SexMachine predictions by first name, kept in memory and saved to a
+CSV file between builds, so that each first name is only ever run through
+SexMachine once.  Predictions are stored as SexMachine returns them ("male",
+"mostly_female", "andy", ...), with an empty string for unknown names.
+
+The SexMachine detector is slow to load, so it is only created if some name
+is not in the memo yet.
+------------------
+"""
+class GenderMemo(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		filename - the CSV file to load and save the memo from, or None for a
+					memo that is not persisted
+
+	Returns: a GenderMemo with every prediction saved in the file (if any).
+	-------------
+	"""
+	def __init__(self, filename=genderMemoFilename):
+		self.filename = filename
+		self.predictions = {}
+		self.detector = None
+		if filename and os.path.exists(filename):
+			with open(filename, 'rb') as memoFile:
+				for row in csv.reader(memoFile):
+					self.predictions[row[0]] = row[1]
+
+	"""
+	METHOD: predict
+	----------------
+	Parameters:
+		firstNames - the distinct first names to predict genders for
+
+	Returns: the number of names that were already in the memo.
+
+	Runs every name that is not in the memo yet through SexMachine, and adds
+	its prediction to the memo.
+	----------------
+	"""
+	def predict(self, firstNames):
+		missingNames = [name for name in firstNames
+			if not name in self.predictions]
+		if missingNames and self.detector is None:
+			self.detector = gender.Detector(unknown_value=None)
+		for name in missingNames:
+			self.predictions[name] = str(self.detector.get_gender(name) or "")
+		return len(firstNames) - len(missingNames)
+
+	"""
+	METHOD: save
+	-------------
+	Parameters: NA
+
+	Returns: NA
+
+	Saves the memo to its file, replacing the file atomically so that an
+	interrupted build never leaves a truncated memo behind.
+	-------------
+	"""
+	def save(self):
+		if not self.filename:
+			return
+		tempFilename = self.filename + ".tmp"
+		with open(tempFilename, 'wb') as memoFile:
+			csvwriter = csv.writer(memoFile, delimiter=',')
+			for name in sorted(self.predictions):
+				csvwriter.writerow([name, self.predictions[name]])
+		os.rename(tempFilename, self.filename)
+
+
+"""
+FUNCTION: inferGenders
+-----------------------
+Parameters:
+	graph - the movie graph
+	nodeIds - the node IDs to fill in unknown genders for
+	memo - the GenderMemo to predict genders with.  Defaults to the memo saved
+			from previous builds, which is saved again afterwards.
+
+Returns: the GenderInferenceStats for this run.
+
+Fills in the genders of people in the given nodes whose gender is unknown,
+from their first names (see predictGenders), and writes them back to the graph
+at once.
+-----------------------
+"""
+def inferGenders(graph, nodeIds, memo=None):
+	names = {}
+	for nodeId in nodeIds:
+		node = graph.node[nodeId]
+		if node["type"] != NodeTypeMovie and not node["gender"]:
+			names[nodeId] = node["name"]
+
+	genders, stats = predictGenders(names, memo)
+	nx.set_node_attributes(graph, "gender", genders)
+	return stats
+
+"""
+FUNCTION: inferPersonGenders
+-----------------------------
+Parameters:
+	people - the Person objects to fill in unknown genders for
+	memo - the GenderMemo to predict genders with, as in inferGenders
+
+Returns: the GenderInferenceStats for this run.
+
+Fills in the gender of every given Person whose gender is unknown, from their
+first name (see predictGenders).
+-----------------------------
+"""
+def inferPersonGenders(people, memo=None):
+	names = dict((person, person.name) for person in people
+		if not person.gender)
+	genders, stats = predictGenders(names, memo)
+	for person, gender in genders.items():
+		person.gender = gender
+	return stats
+
+"""
+FUNCTION: predictGenders
+-------------------------
+Parameters:
+	names - a map from people (e.g. node IDs) to their full names
+	memo - the GenderMemo to predict genders with.  Defaults to the memo saved
+			from previous builds, which is saved again afterwards.
+
+Returns: a tuple (genders, stats).  genders maps every person whose gender
+SexMachine is certain about to "Male" or "Female", and stats is the
+GenderInferenceStats for the prediction.
+
+The distinct first names are collected first and each is predicted once (see
+GenderMemo), rather than once per person.
+-------------------------
+"""
+def predictGenders(names, memo=None):
+	saveMemo = memo is None
+	if memo is None:
+		memo = GenderMemo()
+
+	stats = GenderInferenceStats()
+	firstNames = {}
+	for person, name in names.items():
+		name = name.split()
+		if name:
+			firstNames[person] = name[0]
+	stats.numPeople = len(firstNames)
+
+	distinctNames = set(firstNames.values())
+	stats.numMemoHits = memo.predict(distinctNames)
+	for name in distinctNames:
+		prediction = memo.predictions[name]
+		if prediction in ResolvedGenders:
+			stats.numResolvedNames += 1
+		elif prediction:
+			stats.numAmbiguousNames += 1
+		else:
+			stats.numUnknownNames += 1
+
+	genders = dict((person, memo.predictions[name].capitalize())
+		for person, name in firstNames.items()
+		if memo.predictions[name] in ResolvedGenders)
+	stats.numFilledIn = len(genders)
+
+	if saveMemo:
+		memo.save()
+	return genders, stats
@@ -1,14 +1,25 @@
+import argparse
+import CastEnrichment
+import Checkpoints
+from collections import defaultdict
+import ColumnarIngest
 import csv
+import gc
+import GenderInference
+import GraphArrays
 from GraphConstants import NodeTypeActor, NodeTypeDirector, NodeTypeMovie
-from GraphConstants import NodeTypeActorDirector, datasetFilename
+from GraphConstants import NodeTypeActorDirector, NodeTypeUncredited
+from GraphConstants import datasetFilename
 from GraphConstants import graphFilename, graphDictFilename
-import grequests
-from lxml import html
+from GraphConstants import buildCheckpointPath
+import NameMatching
 import networkx as nx
+import NNDBFetcher
+import numpy as np
+import os
 import progressbar
-import sexmachine.detector as gender
-import unicodedata
-import utils
+import ReadMovieGraph
+import ResponseCache
 
 """
 CLASS: Movie
@@ -17,10 +28,18 @@ A class representing information about a single movie.  Contains information
 such as title, release year, director, main actors, gross revenue, review
 ratings, Facebook likes, and more.
 
-Created from a single length-28 row in the Kaggle movies dataset.
+Created from a single length-28 row in the Kaggle movies dataset, or from a row
+of a ColumnarIngest.MovieTable.
 --------------
 """
-class Movie:
+class Movie(object):
+
+	__slots__ = ["inColor", "directorName", "numReviewCritics",
+		"durationMinutes", "directorFacebookLikes", "actorNames",
+		"actorsFacebookLikes", "gross", "genres", "title", "numVotingUsers",
+		"castFacebookLikes", "numPosterFaces", "plotKeywords", "imdbURL",
+		"numReviewUsers", "language", "country", "contentRating", "budget",
+		"releaseYear", "imdbScore", "aspectRatio", "movieFacebookLikes"]
 
 	"""
 	METHOD: init
@@ -33,24 +52,39 @@ class Movie:
 	--------------
 	"""
 	def __init__(self, dataRow):
-		numericCols = set([2, 3, 4, 7, 24, 5, 8, 12, 13, 15, 18, 22, 23, 25, 26,
-						   27])
-
-		# Removes trailing whitespace, escape characters, and non-ASCII chars,
-		# and ensures all numerically-parsed cols are non-empty
-		def cleanupRowEntry(args):
-			i, entry = args
-			entry = entry.replace("\xc2\xa0", " ").strip()
-			entry = entry.decode('unicode-escape')
-			entry = unicodedata.normalize('NFKD', entry).encode('ascii', 'ignore')
-			if i in numericCols and len(dataRow[i]) == 0:
-				return "0"
-			else:
-				return entry
-
 		# Cleanup all data before parsing
-		dataRow = map(cleanupRowEntry, enumerate(dataRow))
+		self.setFields([ColumnarIngest.cleanupEntry(i, entry)
+			for i, entry in enumerate(dataRow)])
+
+	"""
+	CLASS METHOD: fromColumns
+	--------------------------
+	Parameters:
+		table - a ColumnarIngest.MovieTable of already cleaned up rows
+		i - the index of the movie's row in the table
 
+	Returns: a Movie object storing all the information in the given row.
+	--------------------------
+	"""
+	@classmethod
+	def fromColumns(cls, table, i):
+		movie = cls.__new__(cls)
+		movie.setFields(table.row(i))
+		return movie
+
+	"""
+	METHOD: setFields
+	------------------
+	Parameters:
+		dataRow - a cleaned up row of the Kaggle movies dataset (see
+				ColumnarIngest.cleanupEntry)
+
+	Returns: NA
+
+	Parses every field of this movie from the given row.
+	------------------
+	"""
+	def setFields(self, dataRow):
 		self.inColor = dataRow[0] == "Color"
 		self.directorName = dataRow[1]
 		self.numReviewCritics = int(dataRow[2])
@@ -232,78 +266,13 @@ class Person:
 	Returns: NA
 
 	Attempts to fetch race/gender info from NNDB for all of the provided Person
-	objects.  Fetches information in parallel, and if it finds info for a Person
-	it updates their race and gender fields.
+	objects.  Fetches information in parallel (see NNDBFetcher), and if it finds
+	info for a Person it updates their race and gender fields.
 	-----------------------------------
 	"""
 	@classmethod
 	def fetchRaceAndGenderFor(cls, people):
-		peopleCopy = list(people)
-
-		# Get the search page for each person
-		urls = list()
-		for person in peopleCopy:
-			url = "http://search.nndb.com/search/?type=unspecified&query="
-			url += "+".join(person.name.split())
-			urls.append(url)
-		requests = [grequests.get(url) for url in urls]
-		responses = grequests.map(requests)
-
-		# Get the profile pages from each search page
-		urls = []
-		notFoundIndices = set()
-		for i in range(len(responses)):
-			response = responses[i]
-			if not response:
-				notFoundIndices.add(i)
-				continue
-
-			name = peopleCopy[i].name.split()
-			if len(name) == 0:
-				notFoundIndices.add(i)
-				continue
-
-			searchTree = html.fromstring(response.content)
-			condition = '[contains(.//text(), "%s")' % name[0]
-			if len(name) > 1:
-				condition += ' and contains(.//text(), "%s")' % name[1]
-			condition += ']'
-
-			personList = searchTree.xpath('//table')[3].xpath('./tr')
-			if len(personList) <= 1:
-				notFoundIndices.add(i)
-				continue
-
-			personList = personList[1].xpath('./td' + condition)
-
-			if not personList or len(personList[0].xpath('.//a/@href')) == 0:
-				notFoundIndices.add(i)
-				continue
-
-			urls.append(personList[0].xpath('.//a/@href')[0])
-
-		# remove the people that we couldn't find info for
-		for i in sorted(list(notFoundIndices), reverse=True):
-			del peopleCopy[i]
-
-		requests = [grequests.get(url) for url in urls]
-		responses = grequests.map(requests)
-
-		# Go through responses and scrape race and gender info
-		for i in range(len(responses)):
-			response = responses[i]
-			person = peopleCopy[i]
-
-			personTree = html.fromstring(response.content)
-
-			raceStr = '//p/b[text()="Race or Ethnicity:"]'
-			raceStr += '/following-sibling::text()'
-			if len(personTree.xpath(raceStr)) > 0:
-				person.race = personTree.xpath(raceStr)[0].strip()
-
-			genderStr = '//p/b[text()="Gender:"]/following-sibling::text()'
-			if len(personTree.xpath(genderStr)) > 0:
-				person.gender = personTree.xpath(genderStr)[0].strip()
+		NNDBFetcher.NNDBFetcher().fetchRaceAndGenderFor(people)
 
 
 """
@@ -312,6 +281,9 @@ FUNCTION: parseMovieFile
 Parameters:
 	filename - the name of the Kaggle movie data file to parse
 	fetchRaceAndGender - whether to fetch each actor's race and gender from NNDB
+	cache - an optional ResponseCache to serve IMDb and NNDB lookups from
+	castBackend - the backend to fetch additional cast members from (see
+				CastEnrichment).  Defaults to IMDb.
 
 Returns: a tuple (movieMap, actorMap, directorMap).  movieMap is a map from a
 		movie unique ID to its Movie object.  Note that a movie's unique ID is
@@ -323,69 +295,120 @@ Returns: a tuple (movieMap, actorMap, directorMap).  movieMap is a map from a
 		directorMap is a map from a director name to a Person object.
 
 Reads in the given graph file and stores all its info in the returned graphs.
-Also fetches race/gender info for all referenced directors and actors.
+Also fetches additional cast members for every movie, and race/gender info for
+all referenced directors and actors.
 -------------------------
 """
-def parseMovieFile(filename, fetchRaceAndGender=True):
-	with open(filename, 'rb') as csvFile:
-		csvFile = csv.reader(csvFile, delimiter=',')
-		firstRow = False
+def parseMovieFile(filename, fetchRaceAndGender=True, cache=None,
+	castBackend=None):
+	movieMap, directorMap = readMovieFile(filename)
 
-		movieMap = {}
-		actorMap = {}
-		directorMap = {}
+	# Get additional actors from IMDB
+	fetchCasts(movieMap.values(), cache, castBackend)
 
-		rows = [row for row in csvFile]
+	actorMap = actorMapFor(movieMap.values())
+	if fetchRaceAndGender:
+		allPeople = actorMap.values()
+		allPeople.extend(directorMap.values())
+		fetchRaceAndGenderFor(allPeople, cache)
 
-		print("Reading in dataset rows/fetching from IMDB...")
-		bar = progressbar.ProgressBar()
-		for i in bar(range(len(rows))):
-			row = rows[i]
-			if not firstRow:
-				firstRow = True
-			else:
-				newMovie = Movie(row)
-				if newMovie.country != 'USA':
-					continue
+	return movieMap, actorMap, directorMap
 
-				if not newMovie.uniqueID() in movieMap:
-					# Add the movie
-					movieMap[newMovie.uniqueID()] = newMovie
+"""
+FUNCTION: actorMapFor
+----------------------
+Parameters:
+	movies - the Movie objects whose actors to collect
 
-					# Get additional actors from IMDB
-					cast = utils.getCast(newMovie.imdbURL, newMovie.actorNames)
-					newMovie.actorNames = cast
+Returns: a map from the name of every actor in the movies to a new Person
+object for them.
+----------------------
+"""
+def actorMapFor(movies):
+	actorMap = {}
+	for movie in movies:
+		for actorName in movie.actorNames:
+			if not actorName in actorMap:
+				actorMap[actorName] = Person(actorName)
+	return actorMap
 
-					for actorName in newMovie.actorNames:
-						if not actorName in actorMap:
-							actorMap[actorName] = Person(actorName)
+"""
+FUNCTION: readMovieFile
+------------------------
+Parameters:
+	filename - the name of the Kaggle movie data file to read
 
-					# Add the director if needed
-					if not newMovie.directorName in directorMap:
-						director = Person(newMovie.directorName)
-						directorMap[director.name] = director
+Returns: a tuple (movieMap, directorMap) of the movies and directors in the
+		file, as in parseMovieFile.  Movie casts are only the main actors listed
+		in the file, and no race/gender info is fetched.
+------------------------
+"""
+def readMovieFile(filename):
+	movieMap = {}
+	directorMap = {}
+
+	print("Reading in dataset rows...")
+	numRows = 0
+	for table in ColumnarIngest.readColumns(filename):
+		numRows += len(table)
+		titles = table.column("movie_title")
+		years = table.column("title_year")
+		directorNames = table.column("director_name")
+
+		# Only build Movie objects for the first row of each USA movie
+		for i in np.flatnonzero(table.column("country") == 'USA'):
+			movieID = "%s%i" % (titles[i], years[i])
+			if movieID in movieMap:
+				continue
+			movieMap[movieID] = Movie.fromColumns(table, i)
 
-		if fetchRaceAndGender:
-			print("Fetching races and genders from NNDB...")
-			allPeople = actorMap.values()
-			allPeople.extend(directorMap.values())
+			# Add the director if needed
+			if not directorNames[i] in directorMap:
+				directorMap[directorNames[i]] = Person(directorNames[i])
 
-			FETCH_BLOCK_SIZE = 200
+	print("Read %i rows (%i movies)" % (numRows, len(movieMap)))
+	return movieMap, directorMap
 
-			# Calculate the number of fetches we make
-			numFetches = len(allPeople) / FETCH_BLOCK_SIZE
-			if len(allPeople) % FETCH_BLOCK_SIZE > 0:
-				numFetches += 1
+"""
+FUNCTION: fetchCasts
+---------------------
+Parameters:
+	movies - the Movie objects to fetch additional cast members for
+	cache - an optional ResponseCache to serve IMDb lookups from
+	castBackend - the backend to fetch cast members from (see CastEnrichment)
 
-			# Perform each fetch for race/gender info
-			bar = progressbar.ProgressBar()
-			for i in bar(range(numFetches)):
-				startIndex = i*FETCH_BLOCK_SIZE
-				endIndex = min((i+1)*FETCH_BLOCK_SIZE, len(allPeople))
-				fetchBlock = allPeople[startIndex : endIndex]
-				Person.fetchRaceAndGenderFor(fetchBlock)
+Returns: NA
+
+Adds cast members from IMDb to each movie's actorNames, and prints any movies
+whose cast could not be fetched.
+---------------------
+"""
+def fetchCasts(movies, cache=None, castBackend=None):
+	print("Fetching casts from IMDB...")
+	failures = CastEnrichment.enrichCasts(movies, backend=castBackend,
+		cache=cache)
+	print("Fetched casts for %i/%i movies" % (len(movies) - len(failures),
+		len(movies)))
+	for movieID in sorted(failures):
+		print("Failed to fetch cast for %s: %s" % (movieID, failures[movieID]))
+
+"""
+FUNCTION: fetchRaceAndGenderFor
+--------------------------------
+Parameters:
+	people - the Person objects to fetch race/gender info for
+	cache - an optional ResponseCache to serve NNDB lookups from
 
-		return movieMap, actorMap, directorMap
+Returns: NA
+
+Fetches race/gender info from NNDB for the given people, printing progress.
+--------------------------------
+"""
+def fetchRaceAndGenderFor(people, cache=None):
+	print("Fetching races and genders from NNDB...")
+	fetcher = NNDBFetcher.NNDBFetcher(cache=cache)
+	stats = fetcher.fetchRaceAndGenderFor(people, reportEvery=30)
+	print(str(stats))
 
 """
 FUNCTION: createGraphForMovieInfo
@@ -397,9 +420,12 @@ Parameters:
 				should be a map from actor names to Person objects.
 	directorMap - a map containing all the directors to add to the graph.  The
 				map should be a map from director names to Person objects.
+	maxNameDistance - the maximum edit distance between two spellings of a
+				person's name for them to be merged (see mergeDuplicatePeople)
 
-Returns: a tuple of (graph, graphDict).  The graph is a tripartite NetworkX
-		directed graph where nodes are either movies, actors or directors.
+Returns: a tuple of (graph, graphDict, arrays).  The graph is a tripartite
+		NetworkX directed graph where nodes are either movies, actors or
+		directors.
 		An edge indicates a relationship (either actor or director or both)
 		to a movie. Edges go from directors to movies and from movies to actors.
 
@@ -408,23 +434,226 @@ Returns: a tuple of (graph, graphDict).  The graph is a tripartite NetworkX
 		are their names (e.g. "Tom Hanks"), the keys for movies are the
 		concatenation of their title and release year (e.g. "Avatar2009") so
 		that movie remakes are uniquely keyed.
+
+		arrays is a GraphArrays snapshot of the graph, built along with it.
+
+Different spellings of the same person's name are merged into one node first.
+The graph is then built in bulk (see assembleGraph).
 -------------------------------
 """		
-def createGraphForMovieInfo(movieMap, actorMap, directorMap):
-	graph = nx.DiGraph()
+def createGraphForMovieInfo(movieMap, actorMap, directorMap, maxNameDistance=0):
+	mergeDuplicatePeople(movieMap, actorMap, directorMap, maxNameDistance)
+	return assembleGraph(movieMap, actorMap, directorMap)
+
+"""
+FUNCTION: assembleGraph
+------------------------
+Parameters:
+	movieMap, actorMap, directorMap - the maps of movies and people to add to
+				the graph, as in createGraphForMovieInfo
+
+Returns: a tuple of (graph, graphDict, arrays).  graph and graphDict are as in
+		createGraphForMovieInfo, and arrays is a GraphArrays snapshot of the
+		graph.
+
+Builds the graph in bulk instead of node by node.  Node IDs are assigned in a
+single pass over the movies, in the same order addMovieToGraph,
+addActorsToGraph and addDirectorToGraph would assign them: each movie, then
+its new actors, then its director if new.  The same pass builds the movie ->
+cast and movie -> director arrays (each movie's cast sorted by actor node ID,
+as in GraphArrays.fromGraph), and people credited both as an actor and as
+a director get the ACTOR-DIRECTOR type by a set intersection.  The array
+snapshot is filled in directly, and the NetworkX graph is built from it with a
+single add_nodes_from and add_edges_from.
+------------------------
+"""
+def assembleGraph(movieMap, actorMap, directorMap):
+	# Building millions of small dicts and lists triggers the cyclic garbage
+	# collector over and over, and none of them are garbage yet
+	gcWasEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		return assembleGraphArrays(movieMap, actorMap, directorMap)
+	finally:
+		if gcWasEnabled:
+			gc.enable()
+
+"""
+FUNCTION: assembleGraphArrays
+------------------------------
+Parameters:
+	movieMap, actorMap, directorMap - the maps of movies and people to add to
+				the graph, as in createGraphForMovieInfo
+
+Returns: a tuple of (graph, graphDict, arrays), as in assembleGraph, which
+runs this with the garbage collector disabled.
+------------------------------
+"""
+def assembleGraphArrays(movieMap, actorMap, directorMap):
 	graphDict = {}
+	nodeTypes = []
+	nodeAttributes = []
+	movieIds = []
+	movies = []
+	casts = []
+	castBilling = []
+	castLikes = []
+	directorIds = []
 
 	for movieID in movieMap:
 		movie = movieMap[movieID]
-		addMovieToGraph(graph, graphDict, movie)
+		movieNodeID = len(nodeTypes)
+		graphDict[movieID] = movieNodeID
+		nodeTypes.append(NodeTypeMovie)
+		nodeAttributes.append(movie.toDict())
+		movieIds.append(movieNodeID)
+		movies.append(movie)
+
+		cast = []
+		billing = []
+		likes = []
+		for position, name in enumerate(movie.actorNames):
+			if not name in graphDict:
+				graphDict[name] = len(nodeTypes)
+				nodeTypes.append(NodeTypeActor)
+				nodeAttributes.append(actorMap[name].toDict())
+			if not graphDict[name] in cast:
+				cast.append(graphDict[name])
+				billing.append(position)
+				likes.append(creditLikes(movie.actorsFacebookLikes, position))
+		order = sorted(range(len(cast)), key=cast.__getitem__)
+		casts.append([cast[i] for i in order])
+		castBilling.append([billing[i] for i in order])
+		castLikes.append([likes[i] for i in order])
+
+		if not movie.directorName in graphDict:
+			graphDict[movie.directorName] = len(nodeTypes)
+			nodeTypes.append(NodeTypeDirector)
+			nodeAttributes.append(directorMap[movie.directorName].toDict())
+		directorIds.append(graphDict[movie.directorName])
+
+	actorNames = set(name for movie in movies for name in movie.actorNames)
+	directorNames = set(movie.directorName for movie in movies)
+	for name in actorNames & directorNames:
+		nodeTypes[graphDict[name]] = NodeTypeActorDirector
+
+	arrays = GraphArrays.GraphArrays(len(nodeTypes))
+	arrays.present[:] = True
+	arrays.nodeType[:] = GraphArrays.encode(nodeTypes, GraphArrays.NodeTypes)
+	arrays.race[:] = GraphArrays.encode((attributes.get("race")
+		for attributes in nodeAttributes), GraphArrays.Races)
+	arrays.gender[:] = GraphArrays.encode((attributes.get("gender")
+		for attributes in nodeAttributes), GraphArrays.Genders)
+	for name, nodeId in graphDict.items():
+		arrays.names[nodeId] = name
+	arrays.setMovies(movieIds, casts, directorIds,
+		releaseYear=[movie.releaseYear for movie in movies],
+		budget=[movie.budget for movie in movies],
+		gross=[movie.gross for movie in movies],
+		imdbScore=[movie.imdbScore for movie in movies],
+		genres=[movie.genres for movie in movies],
+		contentRating=[movie.contentRating for movie in movies],
+		language=[movie.language for movie in movies],
+		castBilling=castBilling, castLikes=castLikes)
 
-		movieNodeID = graphDict[movieID]
-		actors = [actorMap[name] for name in movie.actorNames]
-		addActorsToGraph(graph, graphDict, actors, movieNodeID)
-		addDirectorToGraph(graph, graphDict, directorMap[movie.directorName],
-			movieNodeID)
+	graph = nx.DiGraph()
+	graph.add_nodes_from(range(len(nodeTypes)))
+	for nodeId, attributes in enumerate(nodeAttributes):
+		node = graph.node[nodeId]
+		node["type"] = nodeTypes[nodeId]
+		node.update(attributes)
+	graph.add_edges_from(zip(arrays.directorIds.tolist(),
+		arrays.movieIds.tolist()))
+	graph.add_edges_from((movieId, actorId, {"billing": billing,
+		"facebookLikes": likes}) for movieId, actorId, billing, likes in zip(
+		np.repeat(arrays.movieIds, arrays.castSizes()).tolist(),
+		arrays.castIds.tolist(), arrays.castBilling.tolist(),
+		[likes for movieLikes in castLikes for likes in movieLikes]))
+	return graph, graphDict, arrays
+
+"""
+FUNCTION: creditLikes
+----------------------
+Parameters:
+	actorsFacebookLikes - a movie's actorsFacebookLikes list
+	position - the billing position of one of the movie's actors
+
+Returns: the actor's Facebook likes, or None if the dataset only records
+likes for the leads and the actor is not one of them.
+----------------------
+"""
+def creditLikes(actorsFacebookLikes, position):
+	if position < len(actorsFacebookLikes):
+		return actorsFacebookLikes[position]
+	return None
 
-	return graph, graphDict
+"""
+FUNCTION: mergeDuplicatePeople
+-------------------------------
+Parameters:
+	movieMap, actorMap, directorMap - the maps of movies and people to add to
+				the graph, as in createGraphForMovieInfo
+	maxDistance - the maximum edit distance between the normalized keys of two
+				spellings of a name for them to be merged.  With 0, only
+				spellings that differ in case, accents, periods or whitespace
+				are merged.
+
+Returns: NA
+
+Finds people credited under different spellings of their name (e.g. the
+dataset's and IMDb's spellings), and renames every spelling to the
+best-formed, most common one, in one pass over all credits (see
+NameMatching.dedupeNames).  Movie credits are renamed, and the people maps
+merge each spelling's Person into the renamed one, keeping any race/gender
+info found for either.
+-------------------------------
+"""
+def mergeDuplicatePeople(movieMap, actorMap, directorMap, maxDistance=0):
+	nameCounts = defaultdict(int)
+	for movie in movieMap.values():
+		for name in movie.actorNames + [movie.directorName]:
+			nameCounts[name] += 1
+
+	canonicalNames = NameMatching.dedupeNames(nameCounts, maxDistance)
+	if not canonicalNames:
+		return
+	print("Merging %i duplicate name spellings" % len(canonicalNames))
+	renameCredits(movieMap.values(), canonicalNames)
+
+	for people in [actorMap, directorMap]:
+		for name in people.keys():
+			if name in canonicalNames:
+				person = people.pop(name)
+				canonicalName = canonicalNames[name]
+				if not canonicalName in people:
+					people[canonicalName] = Person(canonicalName)
+				merged = people[canonicalName]
+				merged.race = merged.race or person.race
+				merged.gender = merged.gender or person.gender
+
+"""
+FUNCTION: renameCredits
+------------------------
+Parameters:
+	movies - the Movie objects to rename credits in
+	canonicalNames - a map from names to the names to replace them with
+
+Returns: NA
+
+Renames the director and actors of each movie, dropping actors that become
+duplicates of an earlier actor in the same movie.
+------------------------
+"""
+def renameCredits(movies, canonicalNames):
+	for movie in movies:
+		actorNames = []
+		for name in movie.actorNames:
+			name = canonicalNames.get(name, name)
+			if not name in actorNames:
+				actorNames.append(name)
+		movie.actorNames = actorNames
+		movie.directorName = canonicalNames.get(movie.directorName,
+			movie.directorName)
 
 """
 FUNCTION: addMovieToGraph
@@ -467,7 +696,9 @@ Parameters:
 Returns: NA
 
 Adds the given actors to the graph with edges from their movie, and updates the
-graphDict to record the new actors' node IDs.  Note that nodes might not be
+graphDict to record the new actors' node IDs.  Each edge records the actor's
+billing position (their index in actors) and Facebook likes (see creditLikes)
+as its "billing" and "facebookLikes" attributes.  Note that nodes might not be
 added, and the map might not be updated, if the actor was already added,
 *either as an actor or as a director*. Also adds Person metadata to any new
 nodes (or updates it if an actor is also a director).
@@ -476,7 +707,8 @@ Node IDs are added contiguously to the graph starting at 0.
 --------------------------
 """
 def addActorsToGraph(graph, graphDict, actors, movieNodeID):
-	for actor in actors:
+	actorsFacebookLikes = graph.node[movieNodeID].get("actorsFacebookLikes", [])
+	for position, actor in enumerate(actors):
 		# If we've never seen this actor before, add it to our graph
 		if not actor.name in graphDict:
 			nextNodeID = graph.number_of_nodes()
@@ -493,7 +725,9 @@ def addActorsToGraph(graph, graphDict, actors, movieNodeID):
 			graph.node[graphDict[actor.name]]["type"] = NodeTypeActorDirector
 
 		# Add an edge from the movie to this actor
-		graph.add_edge(movieNodeID, graphDict[actor.name])
+		if not graph.has_edge(movieNodeID, graphDict[actor.name]):
+			graph.add_edge(movieNodeID, graphDict[actor.name], billing=position,
+				facebookLikes=creditLikes(actorsFacebookLikes, position))
 
 """
 FUNCTION: addDirectorToGraph
@@ -538,7 +772,12 @@ def addDirectorToGraph(graph, graphDict, director, movieNodeID):
 """
 FUNCTION: createMovieGraph
 ---------------------------
-Parameters: NA
+Parameters:
+	offline - whether to build the graph only from previously cached IMDb and
+				NNDB responses, without making any network requests
+	resume - whether to resume the last build that did not finish from its
+				checkpoints, instead of starting over
+	castBackend - the backend to fetch cast members from (see CastEnrichment)
 
 Returns: NA
 
@@ -550,31 +789,429 @@ info from the web.  Files saved include:
 graph file - created by NetworkX storing all nodes + edges and metadata
 graph dict csv file - stores actor, director and movie names -> node ID (NOTE:
 	in this file, the map keys are row[0] and the values are row[1])
+
+The build runs in stages: parsing the dataset file, fetching casts from IMDb,
+fetching races and genders from NNDB, inferring missing genders, and
+assembling the graph.  Each stage saves its output to a checkpoint, and the
+two fetching stages also save their progress after every batch.  If the build
+is interrupted, resuming it skips the completed stages and batches.
+Checkpoints are deleted once the graph is saved.
 ---------------------------
 """
-def createMovieGraph():
-	movieMap, actorMap, directorMap = parseMovieFile(datasetFilename,
-		fetchRaceAndGender=True)
-	graph, graphDict = createGraphForMovieInfo(movieMap, actorMap, directorMap)
+def createMovieGraph(offline=False, resume=False, castBackend=None):
+	checkpoints = Checkpoints.CheckpointStore(buildCheckpointPath)
+	if not resume:
+		checkpoints.clear()
+
+	cache = ResponseCache.ResponseCache(offline=offline)
+	try:
+		movieMap, directorMap = readMovieFileStage(checkpoints)
+		fetchCastsStage(movieMap, checkpoints, cache, castBackend)
+		actorMap = actorMapFor(movieMap.values())
+		fetchRaceAndGenderStage(actorMap, directorMap, checkpoints, cache)
+	finally:
+		cache.close()
+	print("Response cache: %s" % cache.stats)
+
+	inferGendersStage(actorMap, directorMap, checkpoints)
+	graph, graphDict, arrays = createGraphForMovieInfo(movieMap, actorMap,
+		directorMap)
+	saveMovieGraph(graph, graphDict)
+	checkpoints.clear()
 
-	# Fill in unknown genders with SexMachine
-	genderDetector = gender.Detector(unknown_value=None)
+"""
+FUNCTION: readMovieFileStage
+-----------------------------
+Parameters:
+	checkpoints - the build's CheckpointStore
 
-	for nodeId in graph.nodes():
-		node = graph.node[nodeId]
-		nodeType = node["type"]
-		if nodeType != "MOVIE" and not node["gender"] and node["name"] != "":
+Returns: a tuple (movieMap, directorMap) of the movies and directors in the
+dataset file (see readMovieFile), from the checkpoint if the file has not
+changed since it was saved.
+-----------------------------
+"""
+def readMovieFileStage(checkpoints):
+	fileStat = os.stat(datasetFilename)
+	datasetVersion = (fileStat.st_size, fileStat.st_mtime)
+	checkpoint = checkpoints.load("parse")
+	if checkpoint and checkpoint["datasetVersion"] == datasetVersion:
+		print("Resuming: read %i movies from checkpoint" % len(
+			checkpoint["movieMap"]))
+		return checkpoint["movieMap"], checkpoint["directorMap"]
+
+	if checkpoint:
+		print("Dataset file changed since the last build; starting over")
+		checkpoints.clear()
+	movieMap, directorMap = readMovieFile(datasetFilename)
+	checkpoints.save("parse", {"datasetVersion": datasetVersion,
+		"movieMap": movieMap, "directorMap": directorMap})
+	return movieMap, directorMap
+
+"""
+FUNCTION: fetchCastsStage
+--------------------------
+Parameters:
+	movieMap - the movies to fetch additional cast members for
+	checkpoints - the build's CheckpointStore
+	cache - an optional ResponseCache to serve IMDb lookups from
+	castBackend - the backend to fetch cast members from (see CastEnrichment)
+	batchSize - the number of movies to fetch casts for between checkpoints
+
+Returns: NA
+
+Adds cast members from IMDb to each movie's actorNames, as in fetchCasts.
+Movies whose casts were fetched before the last checkpoint get their cast from
+the checkpoint instead.  Movies whose casts could not be fetched are left out
+of the checkpoint, so resuming retries them, and are dropped from the recorded
+failures once a retry succeeds.
+--------------------------
+"""
+def fetchCastsStage(movieMap, checkpoints, cache=None, castBackend=None,
+	batchSize=250):
+	checkpoint = checkpoints.load("casts", {"casts": {}, "failures": {}})
+	for movieID, actorNames in checkpoint["casts"].items():
+		movieMap[movieID].actorNames = actorNames
+
+	remaining = [movieMap[movieID] for movieID in sorted(movieMap)
+		if not movieID in checkpoint["casts"]]
+	print("Fetching casts from IMDB (%i/%i from checkpoint)..." % (
+		len(movieMap) - len(remaining), len(movieMap)))
+	bar = progressbar.ProgressBar()
+	for start in bar(range(0, len(remaining), batchSize)):
+		batch = remaining[start:start + batchSize]
+		failures = CastEnrichment.enrichCasts(batch, backend=castBackend,
+			cache=cache)
+		for movie in batch:
+			movieID = movie.uniqueID()
+			if movieID in failures:
+				continue
+			checkpoint["casts"][movieID] = movie.actorNames
+			checkpoint["failures"].pop(movieID, None)
+		checkpoint["failures"].update(failures)
+		if cache:
+			cache.flush()
+		checkpoints.save("casts", checkpoint)
+
+	failures = checkpoint["failures"]
+	print("Fetched casts for %i/%i movies" % (len(movieMap) - len(failures),
+		len(movieMap)))
+	for movieID in sorted(failures):
+		print("Failed to fetch cast for %s: %s" % (movieID, failures[movieID]))
+
+"""
+FUNCTION: fetchRaceAndGenderStage
+----------------------------------
+Parameters:
+	actorMap, directorMap - the people to fetch race/gender info for
+	checkpoints - the build's CheckpointStore
+	cache - an optional ResponseCache to serve NNDB lookups from
+	batchSize - the number of people to fetch between checkpoints
+
+Returns: NA
+
+Fetches race/gender info from NNDB for every distinct name among the actors
+and directors, and fills it in for every Person with that name.  Names fetched
+before the last checkpoint are not fetched again.  Names whose pages could not
+be fetched are left out of the checkpoint, so resuming retries them.
+----------------------------------
+"""
+def fetchRaceAndGenderStage(actorMap, directorMap, checkpoints, cache=None,
+	batchSize=500):
+	fetched = checkpoints.load("racesAndGenders", {})
+	names = sorted(set(actorMap) | set(directorMap))
+	remaining = [Person(name) for name in names if not name in fetched]
+	print("Fetching races and genders from NNDB (%i/%i from checkpoint)..." % (
+		len(names) - len(remaining), len(names)))
+
+	fetcher = NNDBFetcher.NNDBFetcher(cache=cache)
+	for start in range(0, len(remaining), batchSize):
+		batch = remaining[start:start + batchSize]
+		stats = fetcher.fetchRaceAndGenderFor(batch)
+		failedPeople = set(stats.failedPeople)
+		for person in batch:
+			if not person in failedPeople:
+				fetched[person.name] = (person.race, person.gender)
+		if cache:
+			cache.flush()
+		checkpoints.save("racesAndGenders", fetched)
+		print("%i/%i people: %s" % (start + len(batch), len(remaining), stats))
+
+	for people in [actorMap, directorMap]:
+		for name, person in people.items():
+			if name in fetched:
+				person.race, person.gender = fetched[name]
+
+"""
+FUNCTION: inferGendersStage
+----------------------------
+Parameters:
+	actorMap, directorMap - the people to infer missing genders for
+	checkpoints - the build's CheckpointStore
+
+Returns: NA
+
+Uses SexMachine to fill in as many unknown person genders as it can from
+people's first names (see GenderInference), or fills in the genders inferred
+before the last checkpoint.
+----------------------------
+"""
+def inferGendersStage(actorMap, directorMap, checkpoints):
+	people = actorMap.values() + directorMap.values()
+	genders = checkpoints.load("genders")
+	if genders is None:
+		print("Inferring genders from first names...")
+		print(str(GenderInference.inferPersonGenders(people)))
+		genders = dict((person.name, person.gender) for person in people)
+		checkpoints.save("genders", genders)
+
+	for person in people:
+		person.gender = genders.get(person.name, person.gender)
+
+"""
+FUNCTION: updateMovieGraph
+---------------------------
+Parameters:
+	offline - whether to fetch only from previously cached IMDb and NNDB
+				responses, without making any network requests
+	castBackend - the backend to fetch cast members from (see CastEnrichment)
+
+Returns: NA
+
+Incrementally updates the saved movie graph to match the dataset file, instead
+of rebuilding it from scratch.  The dataset's credits are first renamed to
+the spellings already in the graph (see matchExistingPeople), so movies
+crediting a spelling merged by the full build are not seen as changed.  Rows
+are then matched to existing movie nodes by Movie.uniqueID():
+
+	- new movies get their casts fetched and are added to the graph, along
+		with any new actors and directors
+	- movies whose dataset metadata changed have their node metadata updated.
+		If their director changed, their director edge is replaced, and if
+		their listed main actors changed, their cast is fetched again and
+		their actor edges are replaced
+
+Only new people have their race/gender fetched and inferred.  Existing node IDs
+never change, and new nodes get IDs contiguous with the existing ones.  Movies
+removed from the dataset are left in the graph.
+
+People whose credits changed are retyped from the credits they have left (see
+retypePeople), so e.g. a director replaced on their only movie who still acts
+becomes an ACTOR.  People left with no credits at all keep their node and
+graphDict entry, so their ID is reused if they are credited again, but are
+typed UNCREDITED: analyses by node type skip them, GraphArrays snapshots mark
+them as not present, and TimeSeries.filterGraph removes them.
+---------------------------
+"""
+def updateMovieGraph(offline=False, castBackend=None):
+	graph, graphDict = ReadMovieGraph.readMovieGraphFromFile()
+	movieMap, directorMap = readMovieFile(datasetFilename)
+
+	# The graph's credits use the spellings chosen when it was built, so rename
+	# the dataset's credits to match before diffing
+	renameCredits(movieMap.values(), matchExistingPeople(graph, graphDict,
+		movieMap.values()))
+	newMovies, changedMovies, recastMovies = diffMovies(graph, graphDict,
+		movieMap)
+	print("%i new movies, %i changed movies (%i with new casts)" % (
+		len(newMovies), len(changedMovies), len(recastMovies)))
+	if not newMovies and not changedMovies:
+		return
+
+	cache = ResponseCache.ResponseCache(offline=offline)
+	try:
+		fetchCasts(newMovies + recastMovies, cache, castBackend)
+		renameCredits(newMovies + changedMovies, matchExistingPeople(graph,
+			graphDict, newMovies + changedMovies))
+
+		# Only fetch race/gender info for people who aren't in the graph yet
+		newPeople = {}
+		for movie in newMovies + changedMovies:
+			for name in movie.actorNames + [movie.directorName]:
+				if not name in graphDict and not name in newPeople:
+					newPeople[name] = Person(name)
+		fetchRaceAndGenderFor(newPeople.values(), cache)
+	finally:
+		cache.close()
+	print("Response cache: %s" % cache.stats)
+
+	# People already in the graph are only referred to by name when adding
+	def personNamed(name):
+		return newPeople[name] if name in newPeople else Person(name)
+
+	firstNewNodeID = graph.number_of_nodes()
+	recreditedPeople = set()
+	for movie in changedMovies:
+		movieNodeID = graphDict[movie.uniqueID()]
+		node = graph.node[movieNodeID]
+		actorNames = node["actorNames"]
+		directorName = node["directorName"]
+		node.update(movie.toDict())
+
+		if movie.directorName != directorName:
+			recreditedPeople.update(graph.predecessors(movieNodeID))
+			graph.remove_edges_from(graph.in_edges(movieNodeID))
+			addDirectorToGraph(graph, graphDict, personNamed(movie.directorName),
+				movieNodeID)
+
+		if movie in recastMovies:
+			recreditedPeople.update(graph.successors(movieNodeID))
+			graph.remove_edges_from(graph.out_edges(movieNodeID))
+			addActorsToGraph(graph, graphDict,
+				[personNamed(name) for name in movie.actorNames], movieNodeID)
+		else:
+			node["actorNames"] = actorNames
+
+	for movie in newMovies:
+		addMovieToGraph(graph, graphDict, movie)
+		movieNodeID = graphDict[movie.uniqueID()]
+		addActorsToGraph(graph, graphDict,
+			[personNamed(name) for name in movie.actorNames], movieNodeID)
+		addDirectorToGraph(graph, graphDict, personNamed(movie.directorName),
+			movieNodeID)
+
+	for movie in changedMovies + newMovies:
+		movieNodeID = graphDict[movie.uniqueID()]
+		recreditedPeople.update(graph.predecessors(movieNodeID))
+		recreditedPeople.update(graph.successors(movieNodeID))
+	retypePeople(graph, recreditedPeople)
+
+	fillInGenders(graph, range(firstNewNodeID, graph.number_of_nodes()))
+	saveMovieGraph(graph, graphDict)
+
+"""
+FUNCTION: retypePeople
+-----------------------
+Parameters:
+	graph - the movie graph
+	nodeIds - the node IDs of people whose credits changed
+
+Returns: NA
+
+Sets each person's type from the credits they have left, as a full rebuild
+would: ACTOR-DIRECTOR if they both act in and direct movies, ACTOR or DIRECTOR
+if they only do one, and UNCREDITED if they do neither.
+-----------------------
+"""
+def retypePeople(graph, nodeIds):
+	for nodeId in nodeIds:
+		acts = graph.in_degree(nodeId) > 0
+		directs = graph.out_degree(nodeId) > 0
+		if acts and directs:
+			nodeType = NodeTypeActorDirector
+		elif acts:
+			nodeType = NodeTypeActor
+		elif directs:
+			nodeType = NodeTypeDirector
+		else:
+			nodeType = NodeTypeUncredited
+		graph.node[nodeId]["type"] = nodeType
+
+"""
+FUNCTION: matchExistingPeople
+------------------------------
+Parameters:
+	graph - the existing movie graph
+	graphDict - the existing graph's map of names to node IDs
+	movies - the new and changed Movie objects being added to the graph
+
+Returns: a map from names credited in the movies to the names they should be
+renamed to (see renameCredits).  Names that are spellings of a person already
+in the graph are renamed to that person's name, and other spellings of the
+same new person are renamed to the most common one.
+------------------------------
+"""
+def matchExistingPeople(graph, graphDict, movies):
+	nameIndex = NameMatching.FuzzyNameIndex.fromGraphDict(graph, graphDict)
+	canonicalNames = {}
+	nameCounts = defaultdict(int)
+	for movie in movies:
+		for name in movie.actorNames + [movie.directorName]:
+			if name in graphDict or name in canonicalNames:
+				continue
+			nodeIds = nameIndex.lookup(name)
+			if nodeIds:
+				canonicalNames[name] = graph.node[nodeIds[0]]["name"]
+			else:
+				nameCounts[name] += 1
+
+	canonicalNames.update(NameMatching.dedupeNames(nameCounts))
+	return canonicalNames
+
+"""
+FUNCTION: diffMovies
+---------------------
+Parameters:
+	graph - the existing movie graph
+	graphDict - the existing graph's map of names to node IDs
+	movieMap - a map from movie unique IDs to Movie objects read from the
+				dataset file (see readMovieFile), with their credits already
+				renamed to the graph's spellings (see matchExistingPeople)
+
+Returns: a tuple (newMovies, changedMovies, recastMovies) of lists of Movie
+		objects.  newMovies are not in the graph yet.  changedMovies are in the
+		graph, but with different metadata.  recastMovies are the changed movies
+		whose dataset actors are not all in the movie's current cast.
+---------------------
+"""
+def diffMovies(graph, graphDict, movieMap):
+	newMovies = []
+	changedMovies = []
+	recastMovies = []
+	for movieID in sorted(movieMap):
+		movie = movieMap[movieID]
+		if not movieID in graphDict or \
+			graph.node[graphDict[movieID]]["type"] != NodeTypeMovie:
+			newMovies.append(movie)
+			continue
+
+		node = graph.node[graphDict[movieID]]
+		movieDict = movie.toDict()
+		castChanged = not set(movie.actorNames) <= set(node["actorNames"])
+		metadataChanged = any(node.get(key) != movieDict[key]
+			for key in movieDict if key != "actorNames")
+		if castChanged or metadataChanged:
+			changedMovies.append(movie)
+		if castChanged:
+			recastMovies.append(movie)
+	return newMovies, changedMovies, recastMovies
+
+"""
+FUNCTION: fillInGenders
+------------------------
+Parameters:
+	graph - the movie graph
+	nodeIds - the node IDs to fill in unknown genders for
 
-			firstName = graph.node[nodeId]["name"].split()[0]
-			predictedGender = genderDetector.get_gender(firstName)
+Returns: NA
+
+Uses SexMachine to fill in as many unknown person genders as it can from
+people's first names, for the given nodes (see GenderInference), and prints
+how many first names were resolved, ambiguous or unknown.
+------------------------
+"""
+def fillInGenders(graph, nodeIds):
+	print("Inferring genders from first names...")
+	print(str(GenderInference.inferGenders(graph, nodeIds)))
+
+"""
+FUNCTION: saveMovieGraph
+-------------------------
+Parameters:
+	graph - the movie graph to save
+	graphDict - the graph's map of names to node IDs
 
-			# Fill in only genders we're certain about
-			if predictedGender == "male" or predictedGender == "female":
-				node["gender"] = predictedGender.capitalize()
+Returns: NA
 
-	# Save to files
-	nx.write_gpickle(graph, graphFilename)
-	saveDictToFile(graphDict, graphDictFilename, firstRow=["Name", "NodeID"])
+Saves the graph and graphDict to their files (see createMovieGraph).  Each file
+is written in full before it replaces the previous one.
+-------------------------
+"""
+def saveMovieGraph(graph, graphDict):
+	nx.write_gpickle(graph, graphFilename + ".tmp")
+	saveDictToFile(graphDict, graphDictFilename + ".tmp",
+		firstRow=["Name", "NodeID"])
+	os.rename(graphFilename + ".tmp", graphFilename)
+	os.rename(graphDictFilename + ".tmp", graphDictFilename)
 
 """
 FUNCTION: saveDictToFile
@@ -601,4 +1238,16 @@ def saveDictToFile(dictToSave, filename, firstRow=None):
 
 
 if __name__ == "__main__":
-	createMovieGraph()
\ No newline at end of file
+	parser = argparse.ArgumentParser(description="Build the movie graph.")
+	parser.add_argument("--offline", action="store_true",
+		help="build only from cached IMDb/NNDB responses")
+	parser.add_argument("--incremental", action="store_true",
+		help="update the saved graph with new/changed rows instead of "
+			"rebuilding it")
+	parser.add_argument("--resume", action="store_true",
+		help="resume an interrupted build from its checkpoints")
+	args = parser.parse_args()
+	if args.incremental:
+		updateMovieGraph(offline=args.offline)
+	else:
+		createMovieGraph(offline=args.offline, resume=args.resume)
\ No newline at end of file
@@ -0,0 +1,448 @@
+from GraphConstants import NodeTypeActor, NodeTypeDirector, NodeTypeMovie
+from GraphConstants import NodeTypeActorDirector
+import numpy as np
+
+# ------ CODES -------
+
+# Integer codes used for node types, races and genders in the array snapshot.
+# Unknown (None) races and genders are coded as UnknownCode.
+NodeTypes = [NodeTypeMovie, NodeTypeActor, NodeTypeDirector,
+	NodeTypeActorDirector]
+Races = ['White', 'Black', 'Hispanic', 'Multiracial', 'Asian', 'Asian/Indian',
+	'Middle Eastern', 'American Aborigine', 'Other']
+Genders = ['Male', 'Female', 'Transgender']
+UnknownCode = -1
+
+MovieCode = NodeTypes.index(NodeTypeMovie)
+ActorCode = NodeTypes.index(NodeTypeActor)
+DirectorCode = NodeTypes.index(NodeTypeDirector)
+ActorDirectorCode = NodeTypes.index(NodeTypeActorDirector)
+WhiteCode = Races.index('White')
+MaleCode = Genders.index('Male')
+FemaleCode = Genders.index('Female')
+
+"""
+FUNCTION: encode
+-----------------
+Parameters:
+	values - an iterable of strings (or None)
+	vocabulary - the list of known strings, whose indices are their codes
+	dtype - the integer type of the codes
+
+Returns: an int8 (or dtype) numpy array where each value is replaced by its
+index in vocabulary, or UnknownCode if it is None or not in the vocabulary.
+-----------------
+"""
+def encode(values, vocabulary, dtype=np.int8):
+	codes = dict((value, i) for i, value in enumerate(vocabulary))
+	return np.array([codes.get(value, UnknownCode) for value in values],
+		dtype=dtype)
+
+"""
+FUNCTION: decode
+-----------------
+Parameters:
+	codes - an array of codes produced by encode
+	vocabulary - the vocabulary the codes were encoded with
+
+Returns: an object array of the strings for each code (None for UnknownCode).
+-----------------
+"""
+def decode(codes, vocabulary):
+	lookup = np.array(list(vocabulary) + [None], dtype=object)
+	codes = np.asarray(codes)
+	return lookup[np.where(codes == UnknownCode, len(vocabulary), codes)]
+
+"""
+FUNCTION: vocabularyFor
+------------------------
+Parameters:
+	values - an iterable of strings (or None)
+
+Returns: the sorted list of distinct non-empty strings in values, for encoding
+open-ended movie metadata like genres and languages.
+------------------------
+"""
+def vocabularyFor(values):
+	return sorted(set(value for value in values if value))
+
+"""
+FUNCTION: castCredits
+----------------------
+Parameters:
+	graph - the tripartite NetworkX DiGraph
+	movieId - the node ID of a movie
+	movieNode - the movie's node attributes
+
+Returns: a tuple (cast, billing, likes) of parallel lists of the movie's
+actor node IDs in increasing order, their billing positions and their
+Facebook likes (None if unknown), from the "billing" and "facebookLikes"
+attributes of the movie -> actor edges.
+
+Graphs saved before edges had these attributes get them from the movie's
+actorNames and actorsFacebookLikes instead, by actor name.
+----------------------
+"""
+def castCredits(graph, movieId, movieNode):
+	cast = []
+	billing = []
+	likes = []
+	creditIndex = None
+	for actorId, edge in sorted(graph.succ[movieId].items()):
+		cast.append(actorId)
+		if "billing" in edge:
+			billing.append(edge["billing"])
+			likes.append(edge.get("facebookLikes"))
+			continue
+
+		if creditIndex is None:
+			creditIndex = dict((name, i) for i, name in
+				enumerate(movieNode.get("actorNames", [])))
+		position = creditIndex.get(graph.node[actorId].get("name"))
+		billing.append(position)
+		movieLikes = movieNode.get("actorsFacebookLikes", [])
+		likes.append(movieLikes[position] if position is not None and
+			position < len(movieLikes) else None)
+	return cast, billing, likes
+
+
+"""
+CLASS: GraphArrays
+-------------------
+A compact, array-based snapshot of the tripartite movie graph.  Node IDs index
+directly into every per-node array, so the snapshot can be used alongside the
+NetworkX graph it was created from.  IDs missing from the graph (e.g. removed
+by filterGraph), and people left uncredited by an incremental update, have
+present[id] == False.
+
+Per-node arrays:
+	present (bool), nodeType (int8), race (int8), gender (int8),
+	names (object - the graphDict key: name for people, title+year for movies),
+	releaseYear (int32), budget (float64), gross (float64),
+	imdbScore (float64)
+
+Movie arrays:
+	movieIds - sorted node IDs of all movies
+	moviePosition - per-node index into movieIds (-1 for non-movies)
+	castOffsets, castIds - CSR adjacency of movie -> actor edges, where the
+		cast of movieIds[i] is castIds[castOffsets[i]:castOffsets[i + 1]],
+		in increasing order of actor node ID
+	directorIds - per-movie director node ID (-1 if the movie has none)
+	castBilling - per-edge (parallel to castIds) billing position of the actor
+		in their movie's actorNames, from 0 (-1 if unknown)
+	castLikes - per-edge Facebook likes of the actor, as recorded for the
+		movie's leads (NaN for the rest of the cast)
+	genreOffsets, genreCodes - CSR genres of each movie, where the genres of
+		movieIds[i] are genreCodes[genreOffsets[i]:genreOffsets[i + 1]],
+		coded by their index in genreNames
+
+Categorical movie metadata (per-node int16 codes, UnknownCode for non-movies
+and movies without a value), and their vocabularies:
+	contentRating (contentRatingNames), language (languageNames)
+
+Derived per-node labels, filled in by analyses rather than from the graph:
+	community (int32) - co-star community of each actor (UnknownCode for
+		non-actors, or until CommunityDetection.labelCommunities is run)
+-------------------
+"""
+class GraphArrays(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		numNodes - the number of node IDs (max node ID + 1) to allocate
+
+	Returns: an empty GraphArrays with all per-node arrays allocated and all
+	nodes marked as not present.
+	-------------
+	"""
+	def __init__(self, numNodes):
+		self.numNodes = numNodes
+		self.present = np.zeros(numNodes, dtype=bool)
+		self.nodeType = np.full(numNodes, UnknownCode, dtype=np.int8)
+		self.race = np.full(numNodes, UnknownCode, dtype=np.int8)
+		self.gender = np.full(numNodes, UnknownCode, dtype=np.int8)
+		self.names = np.empty(numNodes, dtype=object)
+		self.releaseYear = np.zeros(numNodes, dtype=np.int32)
+		self.budget = np.zeros(numNodes, dtype=np.float64)
+		self.gross = np.zeros(numNodes, dtype=np.float64)
+		self.imdbScore = np.zeros(numNodes, dtype=np.float64)
+
+		self.movieIds = np.zeros(0, dtype=np.int64)
+		self.moviePosition = np.full(numNodes, -1, dtype=np.int64)
+		self.castOffsets = np.zeros(1, dtype=np.int64)
+		self.castIds = np.zeros(0, dtype=np.int64)
+		self.directorIds = np.zeros(0, dtype=np.int64)
+		self.castBilling = np.zeros(0, dtype=np.int32)
+		self.castLikes = np.zeros(0, dtype=np.float64)
+
+		self.genreNames = []
+		self.genreOffsets = np.zeros(1, dtype=np.int64)
+		self.genreCodes = np.zeros(0, dtype=np.int16)
+		self.contentRatingNames = []
+		self.contentRating = np.full(numNodes, UnknownCode, dtype=np.int16)
+		self.languageNames = []
+		self.language = np.full(numNodes, UnknownCode, dtype=np.int16)
+
+		self.community = np.full(numNodes, UnknownCode, dtype=np.int32)
+
+	"""
+	CLASS METHOD: fromGraph
+	------------------------
+	Parameters:
+		graph - the tripartite NetworkX DiGraph to snapshot
+
+	Returns: a GraphArrays snapshot of the given graph, built with a single pass
+	over its nodes.  Cast billing and likes are read from the movie -> actor
+	edges' attributes (see castCredits).
+	------------------------
+	"""
+	@classmethod
+	def fromGraph(cls, graph):
+		nodeIds = graph.nodes()
+		arrays = cls(max(nodeIds) + 1 if nodeIds else 0)
+		if not nodeIds:
+			return arrays
+
+		ids = np.array(nodeIds, dtype=np.int64)
+		nodes = [graph.node[nId] for nId in nodeIds]
+		arrays.nodeType[ids] = encode((n["type"] for n in nodes), NodeTypes)
+		arrays.present[ids] = arrays.nodeType[ids] != UnknownCode
+		arrays.race[ids] = encode((n.get("race") for n in nodes), Races)
+		arrays.gender[ids] = encode((n.get("gender") for n in nodes), Genders)
+
+		movieIds = sorted(nId for nId, n in zip(nodeIds, nodes)
+			if n["type"] == NodeTypeMovie)
+		movieNodes = [graph.node[mId] for mId in movieIds]
+		for nId, n in zip(nodeIds, nodes):
+			if n["type"] == NodeTypeMovie:
+				arrays.names[nId] = "%s%i" % (n["title"], n["releaseYear"])
+			else:
+				arrays.names[nId] = n["name"]
+
+		casts = []
+		castBilling = []
+		castLikes = []
+		for mId, n in zip(movieIds, movieNodes):
+			cast, billing, likes = castCredits(graph, mId, n)
+			casts.append(cast)
+			castBilling.append(billing)
+			castLikes.append(likes)
+		directors = [graph.predecessors(mId) for mId in movieIds]
+		arrays.setMovies(movieIds, casts,
+			[d[0] if d else -1 for d in directors],
+			releaseYear=[n["releaseYear"] for n in movieNodes],
+			budget=[n["budget"] for n in movieNodes],
+			gross=[n["gross"] for n in movieNodes],
+			imdbScore=[n["imdbScore"] for n in movieNodes],
+			genres=[n.get("genres", []) for n in movieNodes],
+			contentRating=[n.get("contentRating") for n in movieNodes],
+			language=[n.get("language") for n in movieNodes],
+			castBilling=castBilling, castLikes=castLikes)
+		return arrays
+
+	"""
+	METHOD: setMovies
+	------------------
+	Parameters:
+		movieIds - sorted node IDs of every movie in the graph
+		casts - casts[i] is the list of actor node IDs for movieIds[i]
+		directorIds - directorIds[i] is the director node ID of movieIds[i]
+		releaseYear, budget, gross, imdbScore - per-movie metadata lists,
+			parallel to movieIds
+		genres - optional list of each movie's list of genres
+		contentRating, language - optional per-movie metadata lists
+		castBilling, castLikes - optional lists parallel to casts of each cast
+			member's billing position and Facebook likes (None if unknown)
+
+	Returns: NA
+
+	Stores the movie metadata and builds the CSR movie -> cast and movie ->
+	genre arrays.
+	------------------
+	"""
+	def setMovies(self, movieIds, casts, directorIds, releaseYear, budget,
+		gross, imdbScore, genres=None, contentRating=None, language=None,
+		castBilling=None, castLikes=None):
+		self.movieIds = np.array(movieIds, dtype=np.int64)
+		self.moviePosition[:] = -1
+		self.moviePosition[self.movieIds] = np.arange(len(self.movieIds))
+		self.directorIds = np.array(directorIds, dtype=np.int64)
+
+		castSizes = np.array([len(cast) for cast in casts], dtype=np.int64)
+		self.castOffsets = np.zeros(len(casts) + 1, dtype=np.int64)
+		np.cumsum(castSizes, out=self.castOffsets[1:])
+		self.castIds = np.fromiter((aId for cast in casts for aId in cast),
+			dtype=np.int64, count=int(self.castOffsets[-1]))
+		self.castBilling = np.full(len(self.castIds), -1, dtype=np.int32)
+		if castBilling is not None:
+			self.castBilling[:] = [-1 if position is None else position
+				for billing in castBilling for position in billing]
+		self.castLikes = np.full(len(self.castIds), np.nan)
+		if castLikes is not None:
+			self.castLikes[:] = [np.nan if numLikes is None else numLikes
+				for likes in castLikes for numLikes in likes]
+
+		self.releaseYear[self.movieIds] = releaseYear
+		self.budget[self.movieIds] = budget
+		self.gross[self.movieIds] = gross
+		self.imdbScore[self.movieIds] = imdbScore
+
+		if genres is not None:
+			genres = [[genre for genre in movieGenres if genre]
+				for movieGenres in genres]
+			self.genreNames = vocabularyFor(genre for movieGenres in genres
+				for genre in movieGenres)
+			genreCounts = np.array([len(movieGenres) for movieGenres in genres],
+				dtype=np.int64)
+			self.genreOffsets = np.zeros(len(genres) + 1, dtype=np.int64)
+			np.cumsum(genreCounts, out=self.genreOffsets[1:])
+			self.genreCodes = encode((genre for movieGenres in genres
+				for genre in movieGenres), self.genreNames, np.int16)
+		else:
+			self.genreNames = []
+			self.genreOffsets = np.zeros(len(self.movieIds) + 1, dtype=np.int64)
+			self.genreCodes = np.zeros(0, dtype=np.int16)
+
+		if contentRating is not None:
+			self.contentRatingNames = vocabularyFor(contentRating)
+			self.contentRating[self.movieIds] = encode(contentRating,
+				self.contentRatingNames, np.int16)
+		if language is not None:
+			self.languageNames = vocabularyFor(language)
+			self.language[self.movieIds] = encode(language, self.languageNames,
+				np.int16)
+
+	"""
+	METHOD: castSizes
+	------------------
+	Parameters: NA
+
+	Returns: an array of cast sizes, parallel to movieIds.
+	------------------
+	"""
+	def castSizes(self):
+		return np.diff(self.castOffsets)
+
+	"""
+	METHOD: castMoviePositions
+	---------------------------
+	Parameters: NA
+
+	Returns: an array parallel to castIds giving, for each movie -> actor edge,
+	the index into movieIds of the edge's movie.
+	---------------------------
+	"""
+	def castMoviePositions(self):
+		return np.repeat(np.arange(len(self.movieIds)), self.castSizes())
+
+	"""
+	METHOD: castIdsFor
+	-------------------
+	Parameters:
+		positions - an array of indices into movieIds
+
+	Returns: the concatenated casts (actor node IDs) of the given movies, in
+	order, gathered from the CSR arrays without a Python loop over movies.
+	-------------------
+	"""
+	def castIdsFor(self, positions):
+		positions = np.asarray(positions, dtype=np.int64)
+		starts = self.castOffsets[positions]
+		sizes = self.castOffsets[positions + 1] - starts
+		total = int(sizes.sum())
+		if total == 0:
+			return np.zeros(0, dtype=np.int64)
+
+		# Offset of each cast member within its movie's run in the result
+		runStarts = np.cumsum(sizes) - sizes
+		withinRun = np.arange(total) - np.repeat(runStarts, sizes)
+		return self.castIds[np.repeat(starts, sizes) + withinRun]
+
+	"""
+	METHOD: genreMoviePositions
+	----------------------------
+	Parameters: NA
+
+	Returns: an array parallel to genreCodes giving, for each (movie, genre)
+	pair, the index into movieIds of the movie.
+	----------------------------
+	"""
+	def genreMoviePositions(self):
+		return np.repeat(np.arange(len(self.movieIds)), np.diff(self.genreOffsets))
+
+	"""
+	METHOD: isDirector
+	-------------------
+	Parameters: NA
+
+	Returns: a per-node boolean mask of DIRECTOR and ACTOR-DIRECTOR nodes.
+	-------------------
+	"""
+	def isDirector(self):
+		return (self.nodeType == DirectorCode) | \
+			(self.nodeType == ActorDirectorCode)
+
+	"""
+	METHOD: isActor
+	----------------
+	Parameters: NA
+
+	Returns: a per-node boolean mask of ACTOR and ACTOR-DIRECTOR nodes.
+	----------------
+	"""
+	def isActor(self):
+		return (self.nodeType == ActorCode) | (self.nodeType == ActorDirectorCode)
+
+
+"""
+CLASS: NameIndex
+-----------------
+A sorted index over graphDict keys (person names and title+year movie keys)
+that resolves whole arrays of names to node IDs with one binary search, and
+reports missing names with a mask instead of raising a KeyError.
+-----------------
+"""
+class NameIndex(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		graphDict - a map from names to node IDs, as returned by
+					ReadMovieGraph.readMovieGraphFromFile
+
+	Returns: a NameIndex over all of graphDict's keys.
+	-------------
+	"""
+	def __init__(self, graphDict):
+		names = np.array(list(graphDict.keys()), dtype=object)
+		order = np.argsort(names, kind="mergesort")
+		self.keys = names[order]
+		self.nodeIds = np.array([graphDict[name] for name in self.keys],
+			dtype=np.int64)
+
+	"""
+	METHOD: resolve
+	----------------
+	Parameters:
+		names - a sequence of names to look up
+
+	Returns: a tuple (nodeIds, found) of arrays parallel to names.  found[i] is
+	whether names[i] is in the index, and nodeIds[i] is its node ID (or -1 if
+	it was not found).
+	----------------
+	"""
+	def resolve(self, names):
+		names = np.array(list(names), dtype=object)
+		nodeIds = np.full(len(names), -1, dtype=np.int64)
+		found = np.zeros(len(names), dtype=bool)
+		if len(self.keys) == 0 or len(names) == 0:
+			return nodeIds, found
+
+		positions = np.searchsorted(self.keys, names)
+		positions = np.minimum(positions, len(self.keys) - 1)
+		found = self.keys[positions] == names
+		nodeIds[found] = self.nodeIds[positions[found]]
+		return nodeIds, found
@@ -5,9 +5,15 @@ NodeTypeActor = "ACTOR"
 NodeTypeDirector = "DIRECTOR"
 NodeTypeMovie = "MOVIE"
 NodeTypeActorDirector = "ACTOR-DIRECTOR"
+# People left with no credits by an incremental update (see updateMovieGraph)
+NodeTypeUncredited = "UNCREDITED"
 
 # Filenames
 filepath = __file__[0:__file__.rfind("/") + 1]
 datasetFilename = filepath + "movie_metadata.csv"
 graphFilename = filepath + "graph.gpickle"
-graphDictFilename = filepath + "graphdict.csv"
\ No newline at end of file
+graphDictFilename = filepath + "graphdict.csv"
+responseCacheFilename = filepath + "responses.sqlite"
+genderMemoFilename = filepath + "genders.csv"
+buildCheckpointPath = filepath + "build/"
+nndbFixturesPath = filepath + "fixtures/nndb/"
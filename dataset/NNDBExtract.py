@@ -0,0 +1,222 @@
+import argparse
+from GraphConstants import nndbFixturesPath
+from lxml import etree
+import multiprocessing
+import os
+import time
+
+# Number of bytes of a page to feed to the parser at a time
+FeedSize = 8192
+
+# Index (from 1) of the table listing search results on an NNDB search page
+SearchResultsTable = 4
+
+# The first result's profile link in the search results table, for a person
+# whose name contains $first and $second (pass "" for single-word names)
+SearchResultLink = etree.XPath('tr[2]/td[contains(.//text(), $first) and '
+	'contains(.//text(), $second)][1]//a/@href')
+
+# The text after each profile field's label, within a paragraph of a profile
+ProfileFields = [
+	("race", etree.XPath('b[text()="Race or Ethnicity:"]'
+		'/following-sibling::text()[1]')),
+	("gender", etree.XPath('b[text()="Gender:"]/following-sibling::text()[1]')),
+]
+
+"""
+FUNCTION: iterParseEvents
+--------------------------
+Parameters:
+	content - the HTML page to parse
+	events - the parser events to generate (e.g. ("end",))
+	tag - the tag to generate events for
+
+Returns: a generator of (event, element) pairs, generated while the page is
+being parsed.  The page is fed to the parser a piece at a time, so a caller
+that stops iterating early skips parsing the rest of the page.
+--------------------------
+"""
+def iterParseEvents(content, events, tag):
+	parser = etree.HTMLPullParser(events=events, tag=tag)
+	for start in range(0, len(content), FeedSize):
+		parser.feed(content[start:start + FeedSize])
+		for event in parser.read_events():
+			yield event
+	try:
+		parser.close()
+	except etree.LxmlError:
+		return
+	for event in parser.read_events():
+		yield event
+
+"""
+FUNCTION: extractProfileURL
+----------------------------
+Parameters:
+	content - the HTML of an NNDB search page
+	name - the name of the person that was searched for
+
+Returns: the (possibly relative) URL of the person's profile page, or None if
+the search page does not list them.
+
+Only the page up to the end of the search results table is parsed.
+----------------------------
+"""
+def extractProfileURL(content, name):
+	name = name.split()
+	if len(name) == 0 or not content:
+		return None
+
+	numTables = 0
+	resultsTable = None
+	for event, element in iterParseEvents(content, ("start", "end"), "table"):
+		if event == "start":
+			numTables += 1
+			if numTables == SearchResultsTable:
+				resultsTable = element
+		elif element is resultsTable:
+			hrefs = SearchResultLink(resultsTable, first=name[0],
+				second=name[1] if len(name) > 1 else "")
+			return hrefs[0] if hrefs else None
+	return None
+
+"""
+FUNCTION: extractRaceAndGender
+-------------------------------
+Parameters:
+	content - the HTML of an NNDB profile page
+
+Returns: a tuple of (race, gender) from the profile page.  Either is None if
+it is not listed on the page.
+
+Each paragraph is checked for the fields as soon as it is parsed, and parsing
+stops once both fields are found.
+-------------------------------
+"""
+def extractRaceAndGender(content):
+	fields = {}
+	if content:
+		for event, paragraph in iterParseEvents(content, ("end",), "p"):
+			for field, xpath in ProfileFields:
+				if field not in fields:
+					values = xpath(paragraph)
+					if values:
+						fields[field] = values[0].strip()
+			if len(fields) == len(ProfileFields):
+				break
+	return fields.get("race"), fields.get("gender")
+
+
+"""
+FUNCTION: extractPage
+----------------------
+Parameters:
+	page - a tuple of (content, name) for a search page, where name is the name
+			that was searched for, or (content, None) for a profile page
+
+Returns: the profile URL for a search page (see extractProfileURL), or the
+(race, gender) tuple for a profile page (see extractRaceAndGender).
+----------------------
+"""
+def extractPage(page):
+	content, name = page
+	if name is None:
+		return extractRaceAndGender(content)
+	return extractProfileURL(content, name)
+
+"""
+FUNCTION: extractPages
+-----------------------
+Parameters:
+	pages - a list of pages to extract, as in extractPage
+	processes - the number of worker processes to extract pages on.  Defaults
+				to one per CPU.  If 1, pages are extracted in this process.
+	chunkSize - the number of pages to send to a worker at a time
+
+Returns: a list of the results of extractPage for every page, in order.
+-----------------------
+"""
+def extractPages(pages, processes=None, chunkSize=64):
+	if processes == 1:
+		return map(extractPage, pages)
+
+	pool = multiprocessing.Pool(processes)
+	try:
+		return pool.map(extractPage, pages, chunkSize)
+	finally:
+		pool.close()
+		pool.join()
+
+
+"""
+FUNCTION: readFixturePages
+---------------------------
+Parameters:
+	directory - a directory of saved NNDB pages (defaults to the pages in
+				fixtures/nndb).  Search pages should be in a "search"
+				subdirectory, named after the person searched for with
+				underscores for spaces (e.g. "Tom_Hanks.html"), and profile
+				pages in a "profile" subdirectory, named after the profile's ID
+				(e.g. "000022027.html" for /people/027/000022027/).
+
+Returns: a list of the saved pages, as in extractPage.
+---------------------------
+"""
+def readFixturePages(directory=nndbFixturesPath):
+	pages = []
+	for kind in ["search", "profile"]:
+		kindDirectory = os.path.join(directory, kind)
+		if not os.path.isdir(kindDirectory):
+			continue
+		for filename in sorted(os.listdir(kindDirectory)):
+			with open(os.path.join(kindDirectory, filename), 'rb') as pageFile:
+				content = pageFile.read()
+			name = None
+			if kind == "search":
+				name = os.path.splitext(filename)[0].replace("_", " ")
+			pages.append((content, name))
+	return pages
+
+"""
+FUNCTION: benchmark
+--------------------
+Parameters:
+	directory - a directory of saved NNDB pages (see readFixturePages)
+	processes - the numbers of worker processes to benchmark extractPages with
+	repeat - the number of times to extract every page in each run
+
+Returns: a list of (processes, pagesPerSecond) tuples, one per run.
+
+Measures extraction throughput over the saved pages, and prints each run's
+pages per second.
+--------------------
+"""
+def benchmark(directory=nndbFixturesPath, processes=[1, None], repeat=10):
+	pages = readFixturePages(directory) * repeat
+	if not pages:
+		print("No fixture pages found in %s" % directory)
+		return []
+
+	results = []
+	for numProcesses in processes:
+		start = time.time()
+		extractPages(pages, processes=numProcesses)
+		pagesPerSecond = len(pages) / (time.time() - start)
+		results.append((numProcesses, pagesPerSecond))
+		print("%s processes: %i pages, %.1f pages/s" % (
+			numProcesses or multiprocessing.cpu_count(), len(pages),
+			pagesPerSecond))
+	return results
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Benchmark NNDB page extraction on saved pages.")
+	parser.add_argument("directory", nargs="?", default=nndbFixturesPath,
+		help="directory of saved NNDB pages (default: fixtures/nndb)")
+	parser.add_argument("--processes", type=int, nargs="+", default=[1, None],
+		help="numbers of worker processes to benchmark")
+	parser.add_argument("--repeat", type=int, default=10,
+		help="number of times to extract each page")
+	args = parser.parse_args()
+	benchmark(args.directory, args.processes, args.repeat)
@@ -0,0 +1,316 @@
+from gevent import monkey
+monkey.patch_all(thread=False, select=False)
+
+import gevent
+from gevent.pool import Pool
+import NNDBExtract
+import random
+import requests
+import time
+import urlparse
+
+# Search URL template; %s is replaced with the '+'-joined person name
+NNDBSearchURL = "http://search.nndb.com/search/?type=unspecified&query=%s"
+
+# HTTP statuses worth retrying after a backoff
+RetryableStatuses = set([429, 500, 502, 503, 504])
+
+"""
+CLASS: FetchError
+------------------
+Raised when a page could not be fetched, even after retrying.
+------------------
+"""
+class FetchError(Exception):
+	pass
+
+
+"""
+CLASS: FetchStats
+------------------
+Live counters for a running fetch.  Updated by the fetcher as each request and
+person finishes, so they can be printed while the fetch is in progress.  Also
+lists the people whose pages could not be fetched, so they can be retried.
+------------------
+"""
+class FetchStats(object):
+
+	def __init__(self, numPeople):
+		self.numPeople = numPeople
+		self.numCompleted = 0
+		self.numFound = 0
+		self.numNotFound = 0
+		self.numFailed = 0
+		self.numRequests = 0
+		self.numRetries = 0
+		self.failedPeople = []
+		self.startTime = time.time()
+
+	"""
+	METHOD: peoplePerSecond
+	------------------------
+	Parameters: NA
+
+	Returns: the number of people completed per second since the fetch started.
+	------------------------
+	"""
+	def peoplePerSecond(self):
+		elapsed = time.time() - self.startTime
+		return self.numCompleted / elapsed if elapsed > 0 else 0.0
+
+	"""
+	METHOD: requestsPerSecond
+	--------------------------
+	Parameters: NA
+
+	Returns: the number of HTTP requests made per second since the fetch
+	started.
+	--------------------------
+	"""
+	def requestsPerSecond(self):
+		elapsed = time.time() - self.startTime
+		return self.numRequests / elapsed if elapsed > 0 else 0.0
+
+	def __str__(self):
+		return ("%i/%i people (%i found, %i not found, %i failed), "
+			"%i requests (%i retries), %.1f people/s, %.1f requests/s") % (
+			self.numCompleted, self.numPeople, self.numFound, self.numNotFound,
+			self.numFailed, self.numRequests, self.numRetries,
+			self.peoplePerSecond(), self.requestsPerSecond())
+
+
+"""
+CLASS: HostRateLimiter
+-----------------------
+Spaces out requests to each host so that no host receives more than a given
+number of requests per second, across all greenlets sharing the limiter.
+-----------------------
+"""
+class HostRateLimiter(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		requestsPerSecond - the maximum request rate per host, or None for no
+							limit
+
+	Returns: a new HostRateLimiter.
+	-------------
+	"""
+	def __init__(self, requestsPerSecond):
+		self.interval = 1.0 / requestsPerSecond if requestsPerSecond else 0.0
+		self.nextSlot = {}
+
+	"""
+	METHOD: wait
+	-------------
+	Parameters:
+		url - the URL about to be requested
+
+	Returns: NA
+
+	Reserves the next free request slot for the URL's host, and sleeps the
+	calling greenlet until that slot.
+	-------------
+	"""
+	def wait(self, url):
+		if not self.interval:
+			return
+		host = urlparse.urlparse(url).netloc
+		now = time.time()
+		slot = max(now, self.nextSlot.get(host, now))
+		self.nextSlot[host] = slot + self.interval
+		if slot > now:
+			gevent.sleep(slot - now)
+
+
+"""
+CLASS: NNDBFetcher
+-------------------
+Fetches race and gender info for people from NNDB.  Each person is fetched by
+its own greenlet, which requests their search page and then immediately their
+profile page, so a slow response only holds up the one person waiting on it.
+The number of people in flight is bounded by a pool, requests to each host are
+rate limited, and failed requests are retried with exponential backoff.
+
+The search URL is configurable, so the fetcher can be pointed at a local server
+serving saved NNDB pages instead of the real site (see NNDBFixtureServer).
+-------------------
+"""
+class NNDBFetcher(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		concurrency - the maximum number of people to fetch at once
+		requestsPerSecond - the maximum request rate per host (None for no
+							limit)
+		maxRetries - the number of times to retry a failed request
+		backoff - the delay in seconds before the first retry.  The delay
+					doubles (with jitter) for every retry after that.
+		timeout - the timeout in seconds for each request
+		searchURL - the search URL template, with a %s for the query
+		cache - an optional ResponseCache to serve pages from and store fetched
+				pages in
+
+	Returns: a new NNDBFetcher.
+	-------------
+	"""
+	def __init__(self, concurrency=50, requestsPerSecond=20, maxRetries=3,
+		backoff=0.5, timeout=10, searchURL=NNDBSearchURL, cache=None):
+		self.cache = cache
+		self.concurrency = concurrency
+		self.maxRetries = maxRetries
+		self.backoff = backoff
+		self.timeout = timeout
+		self.searchURL = searchURL
+		self.rateLimiter = HostRateLimiter(requestsPerSecond)
+		self.stats = FetchStats(0)
+
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency,
+			pool_maxsize=concurrency)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+	"""
+	METHOD: fetchRaceAndGenderFor
+	------------------------------
+	Parameters:
+		people - the Person objects to fetch race and gender info for
+		reportEvery - if given, print the live fetch stats every this many
+						seconds while fetching
+
+	Returns: the FetchStats for this fetch.
+
+	Fetches race and gender info for all of the given people, and updates the
+	race and gender fields of every Person that info is found for.
+	------------------------------
+	"""
+	def fetchRaceAndGenderFor(self, people, reportEvery=None):
+		self.stats = FetchStats(len(people))
+		reporter = None
+		if reportEvery:
+			reporter = gevent.spawn(self.reportStats, reportEvery)
+
+		pool = Pool(self.concurrency)
+		for person in people:
+			pool.spawn(self.fetchPerson, person)
+		pool.join()
+
+		if reporter:
+			reporter.kill()
+		return self.stats
+
+	"""
+	METHOD: reportStats
+	--------------------
+	Parameters:
+		interval - the number of seconds between reports
+
+	Returns: NA
+
+	Prints the live fetch stats every interval seconds, until killed.
+	--------------------
+	"""
+	def reportStats(self, interval):
+		while True:
+			gevent.sleep(interval)
+			print(str(self.stats))
+
+	"""
+	METHOD: fetchPerson
+	--------------------
+	Parameters:
+		person - the Person to fetch race and gender info for
+
+	Returns: NA
+
+	Fetches the person's search page and then their profile page, and fills in
+	their race and gender if found.  A person counts as found only if their
+	profile lists a race or a gender.
+	--------------------
+	"""
+	def fetchPerson(self, person):
+		try:
+			found = False
+			query = "+".join(person.name.split())
+			if query:
+				searchURL = self.searchURL % query
+				searchResponse = self.get(searchURL)
+				profileURL = None
+				if searchResponse is not None:
+					profileURL = NNDBExtract.extractProfileURL(
+						searchResponse.content, person.name)
+
+				if profileURL:
+					profileURL = urlparse.urljoin(searchURL, profileURL)
+					profileResponse = self.get(profileURL)
+					if profileResponse is not None:
+						race, gender = NNDBExtract.extractRaceAndGender(
+							profileResponse.content)
+						person.race = race or person.race
+						person.gender = gender or person.gender
+						found = bool(race or gender)
+
+			if found:
+				self.stats.numFound += 1
+			else:
+				self.stats.numNotFound += 1
+		except FetchError:
+			self.stats.numFailed += 1
+			self.stats.failedPeople.append(person)
+		finally:
+			self.stats.numCompleted += 1
+
+	"""
+	METHOD: get
+	------------
+	Parameters:
+		url - the URL to get
+
+	Returns: the response for the given URL, from the cache if there is one and
+	it has the page, or None if the page does not exist.  Raises a FetchError if
+	the request fails even after retrying.
+	------------
+	"""
+	def get(self, url):
+		if self.cache:
+			return self.cache.get(url, self.fetch)
+		return self.fetch(url)
+
+	"""
+	METHOD: fetch
+	--------------
+	Parameters:
+		url - the URL to fetch
+		headers - optional extra request headers
+
+	Returns: the response for the given URL, or None if the page does not exist.
+	Raises a FetchError if the request fails even after retrying.
+	--------------
+	"""
+	def fetch(self, url, headers=None):
+		for attempt in range(self.maxRetries + 1):
+			if attempt > 0:
+				self.stats.numRetries += 1
+				delay = self.backoff * 2 ** (attempt - 1)
+				gevent.sleep(delay * (1 + random.random()))
+
+			self.rateLimiter.wait(url)
+			try:
+				self.stats.numRequests += 1
+				response = self.session.get(url, headers=headers,
+					timeout=self.timeout)
+			except requests.RequestException:
+				continue
+
+			if response.status_code in RetryableStatuses:
+				continue
+			if response.status_code >= 400:
+				return None
+			return response
+
+		raise FetchError("Failed to fetch %s" % url)
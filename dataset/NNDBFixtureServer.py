@@ -0,0 +1,179 @@
+import argparse
+from GenerateMovieGraph import Person
+import gevent
+from gevent import pywsgi
+from GraphConstants import nndbFixturesPath
+import NNDBFetcher
+import os
+import urlparse
+
+# Host the stand-in server listens on
+FixtureHost = "127.0.0.1"
+
+"""
+CLASS: NNDBFixtureServer
+-------------------------
+A minimal local stand-in for NNDB that serves saved pages (see
+NNDBExtract.readFixturePages), so that NNDBFetcher can be run end to end
+without the real site.  Search requests (/search/?query=Tom+Hanks) are served
+the search page saved for the query, and profile requests
+(/people/027/000022027/) the profile page saved for the profile ID.  Anything
+else, including searches and profiles with no saved page, is a 404.
+
+The server runs on gevent, like the fetcher, so both can run in one process.
+-------------------------
+"""
+class NNDBFixtureServer(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		directory - the directory of saved NNDB pages to serve
+		port - the port to listen on (0 picks a free port)
+		latency - the number of seconds to wait before each response, to
+					stand in for the real site's response times
+
+	Returns: a new NNDBFixtureServer, not yet started.
+	-------------
+	"""
+	def __init__(self, directory=nndbFixturesPath, port=0, latency=0):
+		self.directory = directory
+		self.latency = latency
+		self.numRequests = 0
+		self.server = pywsgi.WSGIServer((FixtureHost, port), self.application,
+			log=None)
+
+	"""
+	METHOD: start
+	--------------
+	Parameters: NA
+
+	Returns: the search URL template of the running server, to pass to
+	NNDBFetcher as its searchURL.
+
+	Starts serving in the background, on this process's gevent hub.
+	--------------
+	"""
+	def start(self):
+		self.server.start()
+		return self.searchURL()
+
+	"""
+	METHOD: stop
+	-------------
+	Parameters: NA
+
+	Returns: NA
+	-------------
+	"""
+	def stop(self):
+		self.server.stop()
+
+	"""
+	METHOD: searchURL
+	------------------
+	Parameters: NA
+
+	Returns: the search URL template of the server, with a %s for the query, as
+	in NNDBFetcher.NNDBSearchURL.
+	------------------
+	"""
+	def searchURL(self):
+		return "http://%s:%i/search/?type=unspecified&query=%%s" % (
+			FixtureHost, self.server.server_port)
+
+	"""
+	METHOD: pagePath
+	-----------------
+	Parameters:
+		path - the path of a request
+		query - the request's query string
+
+	Returns: the filename of the saved page for the request, or None if the
+	request is not for a search or profile page.
+	-----------------
+	"""
+	def pagePath(self, path, query):
+		parts = [part for part in path.split("/") if part]
+		if parts == ["search"]:
+			names = urlparse.parse_qs(query).get("query")
+			if not names:
+				return None
+			return os.path.join(self.directory, "search",
+				"_".join(names[0].split()) + ".html")
+		if len(parts) == 3 and parts[0] == "people":
+			return os.path.join(self.directory, "profile", parts[2] + ".html")
+		return None
+
+	"""
+	METHOD: application
+	--------------------
+	Parameters:
+		environ, startResponse - the WSGI request environment and callback
+
+	Returns: the response body, as a WSGI application.
+	--------------------
+	"""
+	def application(self, environ, startResponse):
+		self.numRequests += 1
+		if self.latency:
+			gevent.sleep(self.latency)
+		filename = self.pagePath(environ.get("PATH_INFO", ""),
+			environ.get("QUERY_STRING", ""))
+		if filename is None or not os.path.isfile(filename):
+			startResponse("404 Not Found", [("Content-Type", "text/plain")])
+			return ["Not found"]
+		with open(filename, 'rb') as pageFile:
+			content = pageFile.read()
+		startResponse("200 OK", [("Content-Type", "text/html"),
+			("Content-Length", str(len(content)))])
+		return [content]
+
+"""
+FUNCTION: fixtureNames
+-----------------------
+Parameters:
+	directory - a directory of saved NNDB pages
+
+Returns: the names of every person with a saved search page, in order.
+-----------------------
+"""
+def fixtureNames(directory=nndbFixturesPath):
+	searchDirectory = os.path.join(directory, "search")
+	return [os.path.splitext(filename)[0].replace("_", " ") for filename in
+		sorted(os.listdir(searchDirectory))]
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Run NNDBFetcher against a " +
+		"local server serving saved NNDB pages.")
+	parser.add_argument("directory", nargs="?", default=nndbFixturesPath,
+		help="directory of saved NNDB pages (default: fixtures/nndb)")
+	parser.add_argument("--port", type=int, default=0,
+		help="port to serve on (default: any free port)")
+	parser.add_argument("--latency", type=float, default=0,
+		help="seconds to wait before each response")
+	parser.add_argument("--repeat", type=int, default=1,
+		help="number of times to fetch each saved person")
+	parser.add_argument("--serve", action="store_true",
+		help="only serve the pages until interrupted, without fetching")
+	args = parser.parse_args()
+
+	server = NNDBFixtureServer(args.directory, args.port, args.latency)
+	searchURL = server.start()
+	print("Serving %s at %s" % (args.directory, searchURL % ""))
+	try:
+		if args.serve:
+			server.server.serve_forever()
+		else:
+			people = [Person(name) for name in fixtureNames(args.directory)
+				for i in range(args.repeat)]
+			fetcher = NNDBFetcher.NNDBFetcher(requestsPerSecond=None,
+				searchURL=searchURL)
+			stats = fetcher.fetchRaceAndGenderFor(people)
+			for person in people[::args.repeat]:
+				print(str(person))
+			print(str(stats))
+	finally:
+		server.stop()
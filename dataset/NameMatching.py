@@ -0,0 +1,302 @@
+import bisect
+from collections import defaultdict
+import re
+import unicodedata
+
+# A capital letter inside a word (e.g. "McAvoy", or "DemiAn" for "Demian")
+MidWordCapital = re.compile(r"(?<=[A-Za-z])[A-Z]")
+
+# A word that is lowercase but for its initial and one capital right after a
+# lowercase letter, as left by a mis-decoded accent ("DemiAn" for "Demi\xe1n")
+MojibakeWord = re.compile(r"^[A-Z]?[a-z]+[A-Z][a-z]*$")
+
+"""
+FUNCTION: normalizeName
+------------------------
+Parameters:
+	name - a person's name, as a UTF-8 string or unicode
+
+Returns: the name's matching key: accents and other non-ASCII characters
+stripped, lowercased, periods removed and whitespace collapsed.  Spellings of a
+name from the dataset and from IMDb (e.g. "Demian Bichir", "DemiAn Bichir" and
+"Demian Bichir ") share the same key.
+------------------------
+"""
+def normalizeName(name):
+	if isinstance(name, str):
+		name = name.decode('utf-8', 'ignore')
+	name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore')
+	return " ".join(name.lower().replace(".", " ").split())
+
+"""
+FUNCTION: trigrams
+-------------------
+Parameters:
+	key - a normalized name
+
+Returns: the set of 3-character substrings of the key, padded with two spaces
+on either side so that short keys and key ends have trigrams too.
+-------------------
+"""
+def trigrams(key):
+	padded = "  " + key + "  "
+	return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+"""
+FUNCTION: boundedEditDistance
+------------------------------
+Parameters:
+	a, b - the strings to compare
+	maxDistance - the largest distance of interest
+
+Returns: the Levenshtein edit distance between a and b, or None if it is more
+than maxDistance.  Only the diagonal band of width 2 * maxDistance + 1 is
+computed, and computation stops as soon as every entry in a row exceeds
+maxDistance.
+------------------------------
+"""
+def boundedEditDistance(a, b, maxDistance):
+	if abs(len(a) - len(b)) > maxDistance:
+		return None
+	tooFar = maxDistance + 1
+	previous = [j if j <= maxDistance else tooFar for j in range(len(b) + 1)]
+	for i in range(1, len(a) + 1):
+		current = [tooFar] * (len(b) + 1)
+		if i <= maxDistance:
+			current[0] = i
+		for j in range(max(1, i - maxDistance), min(len(b), i + maxDistance) + 1):
+			cost = 0 if a[i - 1] == b[j - 1] else 1
+			current[j] = min(previous[j - 1] + cost, previous[j] + 1,
+				current[j - 1] + 1, tooFar)
+		if min(current) > maxDistance:
+			return None
+		previous = current
+	return previous[len(b)] if previous[len(b)] <= maxDistance else None
+
+
+"""
+CLASS: FuzzyNameIndex
+----------------------
+An index of people's names by normalized key (see normalizeName), for
+spelling-insensitive lookups.  Every name added is stored under its key along
+with a value (e.g. its node ID), so different spellings of one name find the
+same entries.
+
+Supports exact lookups by key, prefix lookups (over the keys in sorted order)
+and fuzzy lookups within a bounded edit distance (over a trigram index of the
+keys, which narrows the candidates to keys sharing enough trigrams before
+computing any edit distances).
+----------------------
+"""
+class FuzzyNameIndex(object):
+
+	def __init__(self):
+		self.values = defaultdict(list)
+		self.sortedKeys = []
+		self.trigramKeys = defaultdict(set)
+
+	"""
+	CLASS METHOD: fromGraphDict
+	----------------------------
+	Parameters:
+		graph - the movie graph
+		graphDict - the graph's map of names to node IDs
+
+	Returns: a FuzzyNameIndex of every actor and director in the graph, mapping
+	their names to their node IDs.
+	----------------------------
+	"""
+	@classmethod
+	def fromGraphDict(cls, graph, graphDict):
+		index = cls()
+		index.addAll((name, nodeId) for name, nodeId in graphDict.items()
+			if graph.node[nodeId]["type"] != "MOVIE")
+		return index
+
+	"""
+	METHOD: addAll
+	---------------
+	Parameters:
+		namesAndValues - an iterable of (name, value) pairs to add
+
+	Returns: NA
+	---------------
+	"""
+	def addAll(self, namesAndValues):
+		newKeys = []
+		for name, value in namesAndValues:
+			key = normalizeName(name)
+			if key not in self.values:
+				newKeys.append(key)
+				for trigram in trigrams(key):
+					self.trigramKeys[trigram].add(key)
+			self.values[key].append(value)
+		self.sortedKeys = sorted(self.sortedKeys + newKeys)
+
+	def add(self, name, value):
+		self.addAll([(name, value)])
+
+	"""
+	METHOD: lookup
+	---------------
+	Parameters:
+		name - the name to look up, in any spelling
+
+	Returns: the list of values added under the name's key (empty if none).
+	---------------
+	"""
+	def lookup(self, name):
+		return self.values.get(normalizeName(name), [])
+
+	"""
+	METHOD: prefixLookup
+	---------------------
+	Parameters:
+		prefix - the start of a name, in any spelling
+		limit - the maximum number of keys to return, or None for all
+
+	Returns: a list of (key, values) pairs for the keys starting with the
+	normalized prefix, in sorted key order.
+	---------------------
+	"""
+	def prefixLookup(self, prefix, limit=None):
+		prefix = normalizeName(prefix)
+		results = []
+		for i in range(bisect.bisect_left(self.sortedKeys, prefix),
+			len(self.sortedKeys)):
+			key = self.sortedKeys[i]
+			if not key.startswith(prefix) or len(results) == limit:
+				break
+			results.append((key, self.values[key]))
+		return results
+
+	"""
+	METHOD: fuzzyLookup
+	--------------------
+	Parameters:
+		name - the name to look up, in any spelling
+		maxDistance - the maximum edit distance between normalized keys
+
+	Returns: a list of (distance, key, values) tuples for the keys within
+	maxDistance edits of the name's key, closest first.
+
+	Each edit changes at most 3 of a key's trigrams, so only keys sharing at
+	least (number of trigrams - 3 * maxDistance) trigrams with the name's key
+	are compared.
+	--------------------
+	"""
+	def fuzzyLookup(self, name, maxDistance=1):
+		key = normalizeName(name)
+		keyTrigrams = trigrams(key)
+		numShared = defaultdict(int)
+		for trigram in keyTrigrams:
+			for candidate in self.trigramKeys.get(trigram, ()):
+				numShared[candidate] += 1
+
+		minShared = len(keyTrigrams) - 3 * maxDistance
+		results = []
+		for candidate, shared in numShared.items():
+			if shared < minShared:
+				continue
+			distance = boundedEditDistance(key, candidate, maxDistance)
+			if distance is not None:
+				results.append((distance, candidate, self.values[candidate]))
+
+		# With enough edits, keys sharing no trigrams can still be close
+		if minShared <= 0:
+			for candidate in self.values:
+				if candidate not in numShared:
+					distance = boundedEditDistance(key, candidate, maxDistance)
+					if distance is not None:
+						results.append((distance, candidate,
+							self.values[candidate]))
+		return sorted(results)
+
+
+"""
+FUNCTION: spellingDefects
+--------------------------
+Parameters:
+	name - a spelling of a person's name
+	hasAccentedSpelling - whether another spelling of the same name has
+				accents or other non-ASCII characters
+
+Returns: a tuple ranking how malformed the spelling is, smallest for the
+best-formed: whether it has leading, trailing or repeated whitespace, then
+(only if hasAccentedSpelling) its number of words that look like a
+mis-decoded accent.  The IMDb spelling of a name and its accent-stripped form
+(e.g. "Demian Bichir") rank ahead of spellings mangled by a bad decoding
+(e.g. "DemiAn Bichir" or "Jordi MollA ").  Without an accented spelling, a
+capital inside a word is taken to be real (e.g. "McAvoy" or "DiCaprio").
+--------------------------
+"""
+def spellingDefects(name, hasAccentedSpelling=False):
+	mojibakeWords = 0
+	if hasAccentedSpelling:
+		mojibakeWords = sum(1 for word in name.split()
+			if MojibakeWord.match(word))
+	return (name != " ".join(name.split()), mojibakeWords)
+
+"""
+FUNCTION: isAccented
+---------------------
+Parameters:
+	name - a spelling of a person's name, as a UTF-8 string or unicode
+
+Returns: whether the spelling has any non-ASCII characters.
+---------------------
+"""
+def isAccented(name):
+	return any(ord(character) > 127 for character in name)
+
+"""
+FUNCTION: dedupeNames
+----------------------
+Parameters:
+	nameCounts - a map from every spelling of every name to the number of
+				times it appears (e.g. number of credits)
+	maxDistance - the maximum edit distance between the normalized keys of two
+				spellings of the same name.  With 0, only spellings with the
+				same key are merged.
+
+Returns: a map from every spelling that should be merged into another to the
+spelling it should be merged into.  Spellings are grouped by key (and, if
+maxDistance > 0, keys within maxDistance edits are grouped together), and
+each group is merged into its best-formed spelling (see spellingDefects).
+Ties go to the most common spelling, then to the spelling with the fewest
+capitals inside a word, then to the first in order.
+----------------------
+"""
+def dedupeNames(nameCounts, maxDistance=0):
+	index = FuzzyNameIndex()
+	index.addAll((name, name) for name in nameCounts)
+
+	# Union keys within maxDistance of each other into groups
+	groupOf = dict((key, key) for key in index.values)
+	def findGroup(key):
+		while groupOf[key] != key:
+			groupOf[key] = groupOf[groupOf[key]]
+			key = groupOf[key]
+		return key
+
+	if maxDistance > 0:
+		for key in index.sortedKeys:
+			for distance, other, names in index.fuzzyLookup(key, maxDistance):
+				groupOf[findGroup(other)] = findGroup(key)
+
+	groups = defaultdict(list)
+	for key, names in index.values.items():
+		groups[findGroup(key)].extend(names)
+
+	canonicalNames = {}
+	for names in groups.values():
+		if len(names) < 2:
+			continue
+		hasAccentedSpelling = any(isAccented(name) for name in names)
+		canonical = min(names, key=lambda name: spellingDefects(name,
+			hasAccentedSpelling) + (-nameCounts[name],
+			len(MidWordCapital.findall(name)), name))
+		for name in names:
+			if name != canonical:
+				canonicalNames[name] = canonical
+	return canonicalNames
@@ -15,7 +15,8 @@ Edges go from directors to movies, and from movies to actors.  Each node in the
 graph also has associated metadata.  Specifically, each node has:
 
 	- a "type" field which can be one of: "ACTOR", "DIRECTOR", "ACTOR-DIRECTOR", 
-		"MOVIE"
+		"MOVIE", or "UNCREDITED" for people whose movies were all recast or
+		given new directors by an incremental update (see updateMovieGraph)
 
 	- various metadata fields.  These differ for people and movies:
 
@@ -0,0 +1,267 @@
+from GraphConstants import responseCacheFilename
+import json
+import sqlite3
+import time
+import urllib
+import urlparse
+
+# Default number of seconds a cached response is considered fresh (30 days)
+DefaultTTL = 30 * 24 * 60 * 60
+
+# Number of writes to batch up before committing them to disk
+CommitInterval = 100
+
+"""
+FUNCTION: normalizeURL
+-----------------------
+Parameters:
+	url - the URL to normalize
+
+Returns: a canonical form of the URL to use as a cache key, with a lowercase
+scheme and host, sorted query parameters and no fragment, so that equivalent
+requests share a cache entry.
+-----------------------
+"""
+def normalizeURL(url):
+	parts = urlparse.urlsplit(url)
+	query = urllib.urlencode(sorted(urlparse.parse_qsl(parts.query,
+		keep_blank_values=True)))
+	return urlparse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+		parts.path or "/", query, ""))
+
+
+"""
+CLASS: CacheStats
+------------------
+Hit/miss counters for a ResponseCache.
+------------------
+"""
+class CacheStats(object):
+
+	def __init__(self):
+		self.numHits = 0
+		self.numMisses = 0
+		self.numRevalidated = 0
+		self.numOfflineMisses = 0
+
+	def __str__(self):
+		total = self.numHits + self.numMisses + self.numRevalidated + \
+			self.numOfflineMisses
+		hitRate = (self.numHits + self.numRevalidated) / float(total) \
+			if total else 0.0
+		return ("%i hits, %i revalidated, %i misses, %i offline misses "
+			"(%.1f%% served from cache)") % (self.numHits, self.numRevalidated,
+			self.numMisses, self.numOfflineMisses, 100 * hitRate)
+
+
+"""
+CLASS: CachedResponse
+----------------------
+A response served from the cache.  Has the same content, status_code, url and
+headers fields as the requests responses it stands in for.
+----------------------
+"""
+class CachedResponse(object):
+
+	def __init__(self, url, statusCode, content, headers):
+		self.url = url
+		self.status_code = statusCode
+		self.content = content
+		self.headers = headers
+
+
+"""
+CLASS: ResponseCache
+---------------------
+A persistent store of HTTP responses (and other fetched values, like IMDb
+casts) in a local SQLite database, keyed by normalized request.
+
+Entries younger than the TTL are served without touching the network.  Stale
+entries are revalidated with a conditional request (If-None-Match /
+If-Modified-Since) when the server gave an ETag or Last-Modified header, so an
+unchanged page costs a 304 instead of a full download.  In offline mode the
+network is never used: every request is replayed from the cache, regardless of
+age, and requests that were never cached are misses.
+
+Pages that do not exist (4xx responses) are cached too, so known misses are
+not re-requested on every build.
+---------------------
+"""
+class ResponseCache(object):
+
+	"""
+	METHOD: init
+	-------------
+	Parameters:
+		filename - the SQLite file to store responses in
+		ttl - the number of seconds cached entries stay fresh, or None for
+				entries that never go stale
+		offline - whether to serve only from the cache, without any network
+					requests
+
+	Returns: a ResponseCache backed by the given file (created if needed).
+	-------------
+	"""
+	def __init__(self, filename=responseCacheFilename, ttl=DefaultTTL,
+		offline=False):
+		self.ttl = ttl
+		self.offline = offline
+		self.stats = CacheStats()
+		self.numPendingWrites = 0
+		self.db = sqlite3.connect(filename)
+		self.db.text_factory = str
+		self.db.execute("""CREATE TABLE IF NOT EXISTS responses (
+			key TEXT PRIMARY KEY, url TEXT, status INTEGER, body BLOB,
+			etag TEXT, lastModified TEXT, fetchedAt REAL)""")
+		self.db.commit()
+
+	"""
+	METHOD: get
+	------------
+	Parameters:
+		url - the URL to get
+		fetch - a function taking (url, headers) that makes the request with
+				the given extra headers, and returns its response, or None if
+				the page does not exist
+
+	Returns: the (possibly cached) response for the URL, or None if the page
+	does not exist, or is not cached in offline mode.
+	------------
+	"""
+	def get(self, url, fetch):
+		key = "GET " + normalizeURL(url)
+		entry = self.lookup(key)
+
+		if entry and (self.offline or self.isFresh(entry)):
+			self.stats.numHits += 1
+			return self.responseFor(entry)
+		if self.offline:
+			self.stats.numOfflineMisses += 1
+			return None
+
+		# Revalidate stale entries with a conditional request
+		headers = {}
+		if entry and entry["etag"]:
+			headers["If-None-Match"] = entry["etag"]
+		if entry and entry["lastModified"]:
+			headers["If-Modified-Since"] = entry["lastModified"]
+
+		response = fetch(url, headers)
+		if response is not None and response.status_code == 304 and entry:
+			self.stats.numRevalidated += 1
+			self.touch(key)
+			return self.responseFor(entry)
+
+		self.stats.numMisses += 1
+		if response is None:
+			self.store(key, url, 404, "", None, None)
+		else:
+			self.store(key, url, response.status_code, response.content,
+				response.headers.get("ETag"),
+				response.headers.get("Last-Modified"))
+		return response
+
+	"""
+	METHOD: getValue
+	-----------------
+	Parameters:
+		key - a unique key for the value (e.g. "imdb-cast:0499549")
+		compute - a function taking no arguments that computes the value.  The
+				value must be JSON-serializable.  If compute raises, nothing
+				is cached and the exception propagates.
+
+	Returns: the cached value for the key if it is fresh (or we are offline),
+	otherwise the newly computed value.  Returns None for keys that are not
+	cached in offline mode.
+	-----------------
+	"""
+	def getValue(self, key, compute):
+		entry = self.lookup(key)
+		if entry and (self.offline or self.isFresh(entry)):
+			self.stats.numHits += 1
+			return json.loads(entry["body"])
+		if self.offline:
+			self.stats.numOfflineMisses += 1
+			return None
+
+		value = compute()
+		self.stats.numMisses += 1
+		self.store(key, None, 200, json.dumps(value), None, None)
+		return value
+
+	"""
+	METHOD: lookup
+	---------------
+	Parameters:
+		key - the cache key to look up
+
+	Returns: a dict of the cached entry's columns, or None if it isn't cached.
+	---------------
+	"""
+	def lookup(self, key):
+		row = self.db.execute("""SELECT url, status, body, etag, lastModified,
+			fetchedAt FROM responses WHERE key = ?""", (key,)).fetchone()
+		if not row:
+			return None
+		entry = dict(zip(["url", "status", "body", "etag", "lastModified",
+			"fetchedAt"], row))
+		entry["body"] = str(entry["body"])
+		return entry
+
+	def isFresh(self, entry):
+		return self.ttl is None or time.time() - entry["fetchedAt"] < self.ttl
+
+	def responseFor(self, entry):
+		if entry["status"] >= 400:
+			return None
+		headers = {}
+		if entry["etag"]:
+			headers["ETag"] = entry["etag"]
+		if entry["lastModified"]:
+			headers["Last-Modified"] = entry["lastModified"]
+		return CachedResponse(entry["url"], entry["status"], entry["body"],
+			headers)
+
+	def store(self, key, url, status, body, etag, lastModified):
+		self.db.execute("""INSERT OR REPLACE INTO responses VALUES
+			(?, ?, ?, ?, ?, ?, ?)""", (key, url, status, sqlite3.Binary(body),
+			etag, lastModified, time.time()))
+		self.wrote()
+
+	def touch(self, key):
+		self.db.execute("UPDATE responses SET fetchedAt = ? WHERE key = ?",
+			(time.time(), key))
+		self.wrote()
+
+	def wrote(self):
+		self.numPendingWrites += 1
+		if self.numPendingWrites >= CommitInterval:
+			self.flush()
+
+	"""
+	METHOD: flush
+	--------------
+	Parameters: NA
+
+	Returns: NA
+
+	Commits all pending writes to disk.
+	--------------
+	"""
+	def flush(self):
+		self.db.commit()
+		self.numPendingWrites = 0
+
+	"""
+	METHOD: close
+	--------------
+	Parameters: NA
+
+	Returns: NA
+
+	Commits all pending writes and closes the database.
+	--------------
+	"""
+	def close(self):
+		self.flush()
+		self.db.close()